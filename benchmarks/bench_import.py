@@ -0,0 +1,72 @@
+"""Benchmark the cost of importing the Swift facility module.
+
+The TOM imports tom_swift.swift (via settings.TOM_FACILITY_CLASSES) at startup in every
+web worker and management command. This measures, in a fresh interpreter each time:
+
+  * import: the time to import tom_swift.swift after django.setup();
+  * import+choices: the same, plus building the SwiftObservationForm choices that come
+    from swifttools. This is what importing tom_swift.swift used to cost, when the choices
+    were built (and swifttools imported) at class-definition time.
+
+Run it from the repository root:
+
+    python -m benchmarks.bench_import --repeat 10
+"""
+import argparse
+import json
+import statistics
+import subprocess
+import sys
+
+SAMPLE = '''
+import json, os, sys, time
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'benchmarks.settings')
+import django
+django.setup()
+start = time.perf_counter()
+import tom_swift.swift
+imported = time.perf_counter()
+swifttools_imported = 'swifttools' in sys.modules
+if {build_choices}:
+    from tom_swift import swift_api
+    swift_api.get_observation_type_choices()
+    swift_api.get_grb_detector_choices()
+    swift_api.get_monitoring_unit_choices()
+finished = time.perf_counter()
+print(json.dumps({{'seconds': finished - start, 'swifttools_imported': swifttools_imported}}))
+'''
+
+
+def sample(build_choices: bool) -> dict:
+    """Run one measurement in a fresh interpreter and return its result."""
+    output = subprocess.run([sys.executable, '-c', SAMPLE.format(build_choices=build_choices)],
+                            check=True, capture_output=True, text=True).stdout
+    return json.loads(output.splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--repeat', type=int, default=5, help='number of fresh interpreters per measurement')
+    parser.add_argument('--json', action='store_true', help='print the results as JSON')
+    args = parser.parse_args()
+
+    results = {}
+    for name, build_choices in [('import', False), ('import+choices', True)]:
+        samples = [sample(build_choices) for _ in range(args.repeat)]
+        seconds = [s['seconds'] for s in samples]
+        results[name] = {
+            'median_ms': 1000 * statistics.median(seconds),
+            'min_ms': 1000 * min(seconds),
+            'swifttools_imported': samples[0]['swifttools_imported'],
+        }
+
+    if args.json:
+        print(json.dumps(results, indent=2))
+    else:
+        for name, result in results.items():
+            print(f"{name:>16}: median {result['median_ms']:8.1f} ms  min {result['min_ms']:8.1f} ms"
+                  f"  (swifttools imported by import: {result['swifttools_imported']})")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,167 @@
+"""Benchmark the observation form -> payload -> Swift_TOO -> validate/submit pipeline.
+
+This is the submission hot path: what a TOM does, and how long the user waits, each time
+the Swift observation form is rendered, validated, and submitted. It measures:
+
+  * form: constructing a SwiftObservationForm (which builds its crispy-forms layout);
+  * layout: SwiftObservationForm.layout() alone;
+  * payload: SwiftObservationForm.observation_payload() (including its Target lookup);
+  * configure_too: SwiftFacility._configure_too();
+  * validate: SwiftFacility.validate_observation(), with the server validation cache cleared;
+  * validate_cached: SwiftFacility.validate_observation(), with the server validation remembered;
+  * submit: SwiftFacility.submit_observation() of a payload that hasn't been validated;
+  * validate+submit: what the form's is_valid() and the view's form_valid() do, in turn.
+
+The Swift TOO API is a local, in-process fake (see tom_swift.fake_swift_api), so the results
+are of tom_swift and swifttools alone, and comparable from one commit to the next. Save the
+results of one commit, and compare those of another with them:
+
+    python -m benchmarks.bench_submission --json > before.json
+    python -m benchmarks.bench_submission --compare before.json
+
+With --compare, the exit status is 1 if any benchmark got more than --threshold slower.
+"""
+import argparse
+import json
+import logging
+import os
+import platform
+import statistics
+import sys
+import time
+import warnings
+
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'benchmarks.settings')
+import django  # noqa: E402
+django.setup()
+
+from django.core.management import call_command  # noqa: E402
+
+from tom_targets.models import Target  # noqa: E402
+
+from tom_swift import swift_api  # noqa: E402
+from tom_swift.fake_swift_api import FakeSwiftTOOAPI, install_fake_swift_api  # noqa: E402
+from tom_swift.swift import SwiftFacility, SwiftObservationForm  # noqa: E402
+from tom_swift.testing import FORM_DATA  # noqa: E402
+
+
+def measure(function, number, repeat) -> list[float]:
+    """Return the seconds per call of function, from repeat runs of number calls each."""
+    seconds = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for _ in range(number):
+            function()
+        seconds.append((time.perf_counter() - start) / number)
+    return seconds
+
+
+def setup():
+    """Create the database and the Target, and point tom_swift at the fake Swift TOO API."""
+    call_command('migrate', verbosity=0)
+    target = Target.objects.create(name='NGC 1566', type=Target.SIDEREAL, ra=65.0017, dec=-54.9379)
+    install_fake_swift_api(FakeSwiftTOOAPI())
+    return target
+
+
+def benchmarks(target) -> dict:
+    """Return {name: function} of the benchmarks."""
+    facility = SwiftFacility()
+    form_data = {**FORM_DATA, 'target_id': target.id}
+
+    def bound_form():
+        form = SwiftObservationForm(form_data, facility=facility)
+        form.full_clean()
+        return form
+
+    form = bound_form()
+    payload = form.observation_payload()
+    # make sure that what is measured is a valid observation being accepted, not an early rejection
+    errors = facility.validate_observation(payload)
+    if errors or form.errors:
+        sys.exit(f'bench_submission: the benchmark observation is invalid: {errors or form.errors}')
+    if facility.submit_observation(payload) == [None]:
+        sys.exit('bench_submission: the benchmark observation was not accepted')
+
+    def payload_uncached():
+        form._observation_payload = None
+        form.observation_payload()
+
+    def validate():
+        swift_api._server_validate_cache = None
+        facility.validate_observation(payload)
+
+    def validate_and_submit():
+        facility.validate_observation(payload)
+        facility.submit_observation(payload)
+
+    def submit():
+        facility._validated_toos.clear()
+        facility.submit_observation(payload)
+
+    return {
+        'form': lambda: SwiftObservationForm(initial={'target_id': target.id, 'facility': 'Swift'}),
+        'layout': form.layout,
+        'payload': payload_uncached,
+        'configure_too': lambda: facility._configure_too(payload),
+        'validate': validate,
+        'validate_cached': lambda: facility.validate_observation(payload),
+        'submit': submit,
+        'validate+submit': validate_and_submit,
+    }
+
+
+def compare(results, baseline, threshold) -> list[str]:
+    """Return the names of the benchmarks more than threshold (a fraction) slower than in the baseline."""
+    regressions = []
+    for name, result in results.items():
+        before = baseline.get('benchmarks', {}).get(name)
+        if before is not None and result['median_us'] > before['median_us'] * (1 + threshold):
+            regressions.append(name)
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--number', type=int, default=20, help='calls per run')
+    parser.add_argument('--repeat', type=int, default=5, help='runs per benchmark')
+    parser.add_argument('--only', nargs='*', help='the benchmarks to run (default: all)')
+    parser.add_argument('--json', action='store_true', help='print the results as JSON')
+    parser.add_argument('--compare', metavar='JSON', help='compare with the (--json) results in this file')
+    parser.add_argument('--threshold', type=float, default=0.2,
+                        help='with --compare, the slowdown (as a fraction) that counts as a regression')
+    args = parser.parse_args()
+    logging.disable(logging.CRITICAL)  # tom_swift logs every TOO it configures
+    warnings.filterwarnings('ignore', message='The HMAC key')  # the benchmark credentials are short
+
+    target = setup()
+    results = {}
+    for name, function in benchmarks(target).items():
+        if args.only and name not in args.only:
+            continue
+        function()  # warm up (imports, caches of choices, ...)
+        seconds = measure(function, args.number, args.repeat)
+        results[name] = {'median_us': 1e6 * statistics.median(seconds), 'min_us': 1e6 * min(seconds)}
+
+    if args.json:
+        print(json.dumps({'python': platform.python_version(), 'benchmarks': results}, indent=2))
+    else:
+        for name, result in results.items():
+            print(f"{name:>16}: median {result['median_us']:10.1f} us  min {result['min_us']:10.1f} us")
+
+    if args.compare:
+        with open(args.compare) as baseline_file:
+            baseline = json.load(baseline_file)
+        regressions = compare(results, baseline, args.threshold)
+        for name in results:
+            before = baseline.get('benchmarks', {}).get(name)
+            if before is not None:
+                change = results[name]['median_us'] / before['median_us'] - 1
+                print(f"{name:>16}: {change:+7.1%}{'  REGRESSION' if name in regressions else ''}",
+                      file=sys.stderr)
+        if regressions:
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,135 @@
+"""A local stand-in for the Swift TOO API, with configurable latency and error injection.
+
+It answers the Swift TOO API requests that a TOM makes (target resolution, TOO validation
+and submission, and TOORequests status queries) with tom_swift.fake_swift_api, over HTTP,
+so a TOM can be load tested without going near the real Swift TOO API. Each request can be
+made to take a while (--latency, --jitter), to fail with an HTTP 500 (--error-rate), or to
+hang (--hang-rate, --hang-seconds), as the real API does when it is overloaded.
+
+Run it, and point the TOM at it with the API_URL setting:
+
+    python -m benchmarks.fake_swift_server --port 8765 --latency 0.5 --error-rate 0.05
+
+    FACILITIES = {'SWIFT': {..., 'API_URL': 'http://127.0.0.1:8765/toop/submit_json.php'}}
+
+benchmarks.load_observation_create runs one of these itself, unless it is given --api-url.
+"""
+import argparse
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import json
+import random
+import threading
+import time
+from urllib.parse import parse_qs, urlparse
+
+from tom_swift.fake_swift_api import FakeSwiftTOOAPI
+
+API_PATH = '/toop/submit_json.php'
+
+
+class FakeSwiftTOOAPIHandler(BaseHTTPRequestHandler):
+    """Answers Swift TOO API requests (JWTs, POSTed or in the query string) with the server's FakeSwiftTOOAPI."""
+    protocol_version = 'HTTP/1.1'  # keep connections alive, as the Swift TOO API does
+
+    def do_POST(self):
+        body = self.rfile.read(int(self.headers.get('Content-Length', 0))).decode()
+        self.answer(parse_qs(body).get('jwt', [None])[0])
+
+    def do_GET(self):
+        self.answer(parse_qs(urlparse(self.path).query).get('jwt', [None])[0])
+
+    def answer(self, token):
+        if urlparse(self.path).path != API_PATH or token is None:
+            self.send_error(404)
+            return
+        status_code, body = self.server.answer(token)
+        content = json.dumps(body).encode() if body is not None else b''
+        self.send_response(status_code)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(content)))
+        self.end_headers()
+        self.wfile.write(content)
+
+    def log_message(self, format, *args):
+        if self.server.verbose:
+            super().log_message(format, *args)
+
+
+class FakeSwiftTOOAPIServer(ThreadingHTTPServer):
+    """Serves a FakeSwiftTOOAPI at API_PATH, with the given latency (seconds) and rates of errors and hangs."""
+    daemon_threads = True
+
+    def __init__(self, address, api=None, latency=0.0, jitter=0.0, error_rate=0.0, hang_rate=0.0,
+                 hang_seconds=120.0, seed=None, verbose=False):
+        super().__init__(address, FakeSwiftTOOAPIHandler)
+        self.api = api or FakeSwiftTOOAPI()
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.hang_rate = hang_rate
+        self.hang_seconds = hang_seconds
+        self.verbose = verbose
+        self._random = random.Random(seed)
+        self._random_lock = threading.Lock()
+
+    @property
+    def url(self):
+        host, port = self.server_address[:2]
+        return f'http://{host}:{port}{API_PATH}'
+
+    def answer(self, token) -> (int, dict):
+        """Return the (HTTP status code, JSON body) of the answer to the request JWT, after the injected delay."""
+        with self._random_lock:
+            delay = max(0.0, self._random.gauss(self.latency, self.jitter)) if self.jitter else self.latency
+            fate = self._random.random()
+        if fate < self.hang_rate:
+            time.sleep(self.hang_seconds)
+        else:
+            time.sleep(delay)
+        if fate < self.hang_rate + self.error_rate:
+            return 500, None
+        return self.api.answer(token)
+
+
+def start_server(host='127.0.0.1', port=0, **kwargs) -> FakeSwiftTOOAPIServer:
+    """Start a FakeSwiftTOOAPIServer in a background thread and return it (call its shutdown() to stop it)."""
+    server = FakeSwiftTOOAPIServer((host, port), **kwargs)
+    threading.Thread(target=server.serve_forever, daemon=True, name='fake_swift_server').start()
+    return server
+
+
+def add_injection_arguments(parser):
+    """Add the latency and error injection arguments of FakeSwiftTOOAPIServer to the parser."""
+    parser.add_argument('--latency', type=float, default=0.0, help='seconds each request takes')
+    parser.add_argument('--jitter', type=float, default=0.0,
+                        help='standard deviation (seconds) of the time each request takes')
+    parser.add_argument('--error-rate', type=float, default=0.0,
+                        help='fraction of requests answered with an HTTP 500')
+    parser.add_argument('--hang-rate', type=float, default=0.0,
+                        help='fraction of requests that hang for --hang-seconds (and then get an HTTP 500)')
+    parser.add_argument('--hang-seconds', type=float, default=120.0, help='how long hanging requests hang')
+    parser.add_argument('--seed', type=int, help='seed of the latency and error injection')
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--verbose', action='store_true', help='log each request')
+    add_injection_arguments(parser)
+    args = parser.parse_args()
+
+    server = FakeSwiftTOOAPIServer((args.host, args.port), latency=args.latency, jitter=args.jitter,
+                                   error_rate=args.error_rate, hang_rate=args.hang_rate,
+                                   hang_seconds=args.hang_seconds, seed=args.seed, verbose=args.verbose)
+    print(f'Serving a stand-in for the Swift TOO API at {server.url}')
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,276 @@
+"""Load test the Swift observation-create view, as N concurrent users submitting Swift TOO requests.
+
+Each simulated user, in its own thread, repeatedly does what a user does in an alert storm:
+GETs the Swift observation form of a target (--validate-only: and POSTs it to be validated),
+then POSTs it to be submitted. Each user's requests differ (in exposure), so the server
+validation cache doesn't hide the Swift TOO API. The throughput, and the p50/p95/p99 latency
+of each step, are reported at the end.
+
+By default, the TOM is run in-process (with benchmarks/settings.py, a temporary SQLite
+database, and Django's test Client), against a local stand-in for the Swift TOO API (see
+benchmarks.fake_swift_server) whose latency and errors can be set:
+
+    python -m benchmarks.load_observation_create --users 20 --iterations 10 --latency 0.5 --error-rate 0.02
+
+To load test a running TOM instead, give its URL and a user to log in as. Point that TOM at a
+stand-in (see its API_URL setting) unless you mean to submit TOOs to Swift:
+
+    python -m benchmarks.load_observation_create --tom-url http://localhost:8000 --username alice \\
+        --password secret --target-id 1 --users 20
+"""
+import argparse
+from collections import defaultdict
+import json
+import logging
+import math
+import os
+import sys
+import tempfile
+import threading
+import time
+import warnings
+
+import requests
+
+OBSERVATION_TYPE = 'Swift TOO Observation'
+
+
+def percentile(sorted_values, fraction):
+    """Return the nearest-rank percentile (fraction of 1) of the sorted values."""
+    if not sorted_values:
+        return float('nan')
+    return sorted_values[max(0, math.ceil(fraction * len(sorted_values)) - 1)]
+
+
+class Results:
+    """The latencies (seconds) and failures of each step of the simulated users, collected from their threads."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.latencies = defaultdict(list)
+        self.failures = defaultdict(int)
+        self.iterations = 0
+
+    def record(self, step, seconds, ok):
+        with self._lock:
+            self.latencies[step].append(seconds)
+            if not ok:
+                self.failures[step] += 1
+
+    def iteration(self):
+        with self._lock:
+            self.iterations += 1
+
+    def summary(self, elapsed) -> dict:
+        steps = {}
+        for step, latencies in self.latencies.items():
+            latencies = sorted(latencies)
+            steps[step] = {
+                'requests': len(latencies),
+                'failures': self.failures[step],
+                'p50_ms': 1000 * percentile(latencies, 0.50),
+                'p95_ms': 1000 * percentile(latencies, 0.95),
+                'p99_ms': 1000 * percentile(latencies, 0.99),
+                'max_ms': 1000 * latencies[-1],
+            }
+        requests_made = sum(step['requests'] for step in steps.values())
+        return {
+            'elapsed_s': elapsed,
+            'iterations': self.iterations,
+            'iterations_per_s': self.iterations / elapsed,
+            'requests_per_s': requests_made / elapsed,
+            'steps': steps,
+        }
+
+
+def form_data(target_id, user, iteration):
+    """Return the POST data of a valid Swift observation form, unique to the user and iteration."""
+    return {
+        'facility': 'Swift', 'target_id': target_id, 'observation_type': OBSERVATION_TYPE,
+        'target_classification_choices': 'AGN', 'target_classification': '', 'poserr': 0.0,
+        'instrument': 'XRT', 'urgency': 1, 'obs_type': 'Light Curve',
+        'optical_magnitude': 18.0, 'optical_filter': 'u', 'other_brightness': '',
+        'grb_detector_choices': 'Swift/BAT', 'grb_detector': '',
+        'immediate_objective': 'Follow up the alert.', 'science_just': 'Load test.',
+        'exposure': 1000 + 10 * user + iteration / 100, 'exp_time_just': 'Load test.',
+        'num_of_visits': 1, 'monitoring_freq': 1, 'monitoring_units': 'day',
+        'xrt_mode': 6, 'uvot_mode_choices': 0x01aa, 'uvot_mode': '', 'uvot_just': '',
+        'debug': 'on',
+    }
+
+
+class SimulatedUser(threading.Thread):
+    """Makes iterations of (GET the form, [validate it,] submit it), timing each request."""
+
+    def __init__(self, number, client, create_url, target_id, results, iterations, deadline, validate_only):
+        super().__init__(name=f'user-{number}', daemon=True)
+        self.number = number
+        self.client = client
+        self.create_url = create_url
+        self.target_id = target_id
+        self.results = results
+        self.iterations = iterations
+        self.deadline = deadline
+        self.validate_only = validate_only
+
+    def timed(self, step, request, ok):
+        start = time.perf_counter()
+        try:
+            response = request()
+            succeeded = ok(response)
+        except Exception as err:  # the load test goes on; the failure is counted
+            logging.getLogger(__name__).debug(f'{self.name} {step}: {err!r}')
+            succeeded = False
+        self.results.record(step, time.perf_counter() - start, succeeded)
+        return succeeded
+
+    def run(self):
+        for iteration in range(self.iterations):
+            if self.deadline and time.monotonic() > self.deadline:
+                break
+            data = form_data(self.target_id, self.number, iteration)
+            query = {'target_id': self.target_id, 'observation_type': OBSERVATION_TYPE}
+            self.timed('form', lambda: self.client.get(self.create_url, query),
+                       lambda response: response.status_code == 200)
+            if self.validate_only:
+                # a valid observation gets the form back with the validation message, and no errors
+                self.timed('validate', lambda: self.client.post(self.create_url, {**data, 'validate': 'Validate'}),
+                           lambda response: response.status_code == 200 and b'alert-danger' not in response.content)
+            else:
+                # a submitted observation redirects to the target's page
+                self.timed('submit', lambda: self.client.post(self.create_url, data),
+                           lambda response: response.status_code == 302)
+            self.results.iteration()
+
+
+class HTTPClient:
+    """A logged-in user of a running TOM, with the get() and post() of Django's test Client."""
+
+    def __init__(self, tom_url, username, password):
+        self.tom_url = tom_url.rstrip('/')
+        self.session = requests.Session()
+        login_url = f'{self.tom_url}/accounts/login/'
+        self.session.get(login_url)
+        response = self.session.post(login_url, data={'username': username, 'password': password,
+                                                      'csrfmiddlewaretoken': self.session.cookies.get('csrftoken')},
+                                     headers={'Referer': login_url}, allow_redirects=False)
+        if response.status_code != 302:
+            sys.exit(f'load_observation_create: could not log in to {self.tom_url} as {username}')
+
+    def get(self, path, params=None):
+        return self.session.get(self.tom_url + path, params=params, allow_redirects=False)
+
+    def post(self, path, data):
+        data = {**data, 'csrfmiddlewaretoken': self.session.cookies.get('csrftoken')}
+        return self.session.post(self.tom_url + path, data=data, headers={'Referer': self.tom_url + path},
+                                 allow_redirects=False)
+
+
+class ContentResponse:
+    """Gives a Django test Client response the content (bytes) that a requests.Response has."""
+    def __init__(self, response):
+        self.status_code = response.status_code
+        self.content = response.content if not getattr(response, 'streaming', False) else b''
+
+
+class InProcessClient:
+    """A logged-in user of the in-process TOM: a Django test Client, with get() and post() like HTTPClient's."""
+
+    def __init__(self, user):
+        from django.test import Client
+        self.client = Client()
+        self.client.force_login(user)
+
+    def get(self, path, params=None):
+        return ContentResponse(self.client.get(path, params))
+
+    def post(self, path, data):
+        return ContentResponse(self.client.post(path, data))
+
+
+def setup_in_process_tom(api_url):
+    """Set up the in-process TOM (database, user, and target), pointed at api_url; return (user, target_id)."""
+    os.environ.setdefault('TOM_SWIFT_BENCHMARK_DB', os.path.join(tempfile.mkdtemp(prefix='tom_swift_load_'),
+                                                                 'db.sqlite3'))
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'benchmarks.settings')
+    import django
+    django.setup()
+    from django.conf import settings
+    from django.contrib.auth.models import User
+    from django.core.management import call_command
+    from tom_targets.models import Target
+
+    settings.FACILITIES['SWIFT']['API_URL'] = api_url
+    call_command('migrate', verbosity=0)
+    user = User.objects.create_user('loadtest', password='loadtest', is_staff=True)
+    target = Target.objects.create(name='NGC 1566', type=Target.SIDEREAL, ra=65.0017, dec=-54.9379)
+    return user, target.id
+
+
+def main():
+    from benchmarks.fake_swift_server import add_injection_arguments, start_server
+
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--users', type=int, default=10, help='concurrent simulated users')
+    parser.add_argument('--iterations', type=int, default=5, help='form submissions per user')
+    parser.add_argument('--duration', type=float, help='stop starting iterations after this many seconds')
+    parser.add_argument('--validate-only', action='store_true', help='validate the form instead of submitting it')
+    parser.add_argument('--json', action='store_true', help='print the results as JSON')
+    parser.add_argument('--api-url', help='URL of a running Swift TOO API stand-in (default: start one)')
+    parser.add_argument('--tom-url', help='URL of a running TOM to load test (default: an in-process TOM)')
+    parser.add_argument('--username', help='with --tom-url, the user to log in as')
+    parser.add_argument('--password', help='with --tom-url, the password of the user')
+    parser.add_argument('--target-id', type=int, help='with --tom-url, the id of the target to observe')
+    add_injection_arguments(parser)
+    args = parser.parse_args()
+    logging.disable(logging.CRITICAL)  # tom_swift logs every TOO it configures
+    warnings.filterwarnings('ignore', message='The HMAC key')  # the benchmark credentials are short
+
+    server = None
+    if args.tom_url:
+        if not (args.username and args.password and args.target_id):
+            parser.error('--tom-url needs --username, --password, and --target-id')
+        clients = [HTTPClient(args.tom_url, args.username, args.password) for _ in range(args.users)]
+        target_id = args.target_id
+    else:
+        api_url = args.api_url
+        if api_url is None:
+            server = start_server(latency=args.latency, jitter=args.jitter, error_rate=args.error_rate,
+                                  hang_rate=args.hang_rate, hang_seconds=args.hang_seconds, seed=args.seed)
+            api_url = server.url
+        user, target_id = setup_in_process_tom(api_url)
+        clients = [InProcessClient(user) for _ in range(args.users)]
+
+    create_url = '/observations/Swift/create/'
+    results = Results()
+    start = time.monotonic()
+    deadline = start + args.duration if args.duration else None
+    users = [SimulatedUser(number, client, create_url, target_id, results, args.iterations, deadline,
+                           args.validate_only)
+             for number, client in enumerate(clients)]
+    for user in users:
+        user.start()
+    for user in users:
+        user.join()
+    summary = results.summary(time.monotonic() - start)
+    summary['users'] = args.users
+    if server is not None:
+        summary['swift_api_requests'] = server.api.requests
+        server.shutdown()
+
+    if args.json:
+        print(json.dumps(summary, indent=2))
+        return
+    print(f"{args.users} users, {summary['iterations']} iterations in {summary['elapsed_s']:.1f} s: "
+          f"{summary['iterations_per_s']:.2f} iterations/s, {summary['requests_per_s']:.2f} requests/s")
+    for step, result in summary['steps'].items():
+        print(f"{step:>10}: {result['requests']:6d} requests {result['failures']:5d} failed  "
+              f"p50 {result['p50_ms']:8.1f} ms  p95 {result['p95_ms']:8.1f} ms  p99 {result['p99_ms']:8.1f} ms  "
+              f"max {result['max_ms']:8.1f} ms")
+    if 'swift_api_requests' in summary:
+        print('Swift TOO API requests: ' + ', '.join(f'{name} {count}'
+                                                     for name, count in summary['swift_api_requests'].items()))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,13 @@
+"""Minimal Django settings for running the tom_swift benchmarks outside of a TOM: those of the tests.
+
+These are not suitable for anything else.
+"""
+import os
+
+from tom_swift.test_settings import *  # noqa: F401,F403
+from tom_swift.test_settings import DATABASES
+
+SECRET_KEY = 'tom_swift benchmarks'
+
+# the load harness's simulated users each have a thread (and a connection), so they need a file
+DATABASES['default']['NAME'] = os.environ.get('TOM_SWIFT_BENCHMARK_DB', ':memory:')
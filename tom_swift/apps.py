@@ -0,0 +1,37 @@
+from django.apps import AppConfig
+from django.urls import path, include
+
+
+class TomSwiftConfig(AppConfig):
+    default_auto_field = 'django.db.models.BigAutoField'
+    name = 'tom_swift'
+
+    def ready(self):
+        from django.db.models.signals import post_save
+        from tom_observations.models import ObservationRecord
+        from tom_swift.submission import link_observation_record
+
+        # the ObservationRecords of queued TOOs are created after they are queued (see tom_swift.submission)
+        post_save.connect(link_observation_record, sender=ObservationRecord,
+                          dispatch_uid='tom_swift.submission.link_observation_record')
+
+    def include_url_paths(self):
+        """Integration point for adding URL patterns to the Tom Common URL configuration.
+        """
+        urlpatterns = [
+            path('swift/', include(f'{self.name}.urls', namespace='tom_swift'))
+        ]
+        return urlpatterns
+
+    def target_detail_tabs(self):
+        """Integration point for adding tabs to the target detail page.
+
+        The Swift Visibility tab shows when Swift can observe the target (see tom_swift.visibility),
+        and the Swift Timeline tab what Swift has observed and plans to observe of it (see tom_swift.timeline).
+        """
+        return [{'partial': f'{self.name}/partials/visibility_windows.html',
+                 'context': f'{self.name}.templatetags.swift_extras.target_visibility_tab',
+                 'label': 'Swift Visibility'},
+                {'partial': f'{self.name}/partials/swift_timeline.html',
+                 'context': f'{self.name}.templatetags.swift_extras.target_timeline_tab',
+                 'label': 'Swift Timeline'}]
@@ -0,0 +1,104 @@
+"""An asyncio interface to the Swift TOO API, for TOMs served by ASGI.
+
+swifttools talks to the Swift TOO API synchronously (and a submission can take minutes, as
+swifttools polls the queued job every second), so every SwiftAPI operation blocks the thread
+it runs in. In an ASGI-served TOM, the sync parts of a request all run in one thread, so a
+few slow Swift calls hold up everything else.
+
+AsyncSwiftAPI has awaitable versions of the SwiftAPI operations. Each runs the SwiftAPI
+operation in tom_swift's own pool of ASYNC_MAX_WORKERS threads (see get_swift_executor()),
+not in the event loop or in the threads that Django runs sync code in, so a view can await many
+Swift calls at once:
+
+    api = AsyncSwiftAPI()
+    resolved_targets = await asyncio.gather(*(api.resolve_target(target) for target in targets))
+
+Operations that don't need the Swift TOO API (cached target resolutions and server
+validations) are answered in the event loop, without a thread. The timeout budgets, the
+circuit breaker, and the metrics of swift_api.swift_api_call() apply as they do to SwiftAPI.
+See also SwiftFacility.avalidate_observation() and SwiftFacility.asubmit_observation().
+"""
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+import functools
+import threading
+
+from tom_swift.swift_api import (SwiftAPI, get_resolver_cache, get_server_validate_cache, get_swift_setting,
+                                 normalize_target_name)
+
+#
+# Settings (in settings.FACILITIES['SWIFT']):
+#   'ASYNC_MAX_WORKERS': threads that run the Swift TOO API operations of AsyncSwiftAPI, i.e. how
+#                        many can be in progress at once, per process (default 16)
+#
+ASYNC_MAX_WORKERS = 16
+
+_swift_executor = None
+_swift_executor_lock = threading.Lock()
+
+
+def get_swift_executor() -> ThreadPoolExecutor:
+    """Return the process-wide pool of threads that AsyncSwiftAPI runs Swift TOO API operations in."""
+    global _swift_executor
+    with _swift_executor_lock:
+        if _swift_executor is None:
+            _swift_executor = ThreadPoolExecutor(max_workers=get_swift_setting('ASYNC_MAX_WORKERS', ASYNC_MAX_WORKERS),
+                                                 thread_name_prefix='tom_swift')
+    return _swift_executor
+
+
+def _close_old_connections_after(function, *args, **kwargs):
+    """Call function, then close the database connections of this (pool) thread that have expired.
+
+    The pool's threads outlive any request, so Django doesn't close their connections (to the
+    cache database, say) for them.
+    """
+    from django.db import close_old_connections
+    try:
+        return function(*args, **kwargs)
+    finally:
+        close_old_connections()
+
+
+async def run_in_swift_executor(function, *args, **kwargs):
+    """Await function(*args, **kwargs), called in a thread of get_swift_executor()."""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(get_swift_executor(),
+                                      functools.partial(_close_old_connections_after, function, *args, **kwargs))
+
+
+class AsyncSwiftAPI:
+    """The awaitable operations of a SwiftAPI (see the module docstring)."""
+
+    def __init__(self, swift_api: SwiftAPI = None):
+        self.swift_api = swift_api or SwiftAPI()
+
+    async def resolve_target(self, target):
+        """Await SwiftAPI.resolve_target()."""
+        resolved_target = get_resolver_cache().get(normalize_target_name(target.name))
+        if resolved_target is not None:
+            return resolved_target if resolved_target.is_resolved else None
+        return await run_in_swift_executor(self.swift_api.resolve_target, target)
+
+    async def server_validate(self, too, fingerprint: str) -> bool:
+        """Await SwiftAPI.server_validate()."""
+        if get_server_validate_cache().get(fingerprint) is not None:
+            return self.swift_api.server_validate(too, fingerprint)  # remembered: no need for a thread
+        return await run_in_swift_executor(self.swift_api.server_validate, too, fingerprint)
+
+    async def submit(self, too) -> bool:
+        """Await SwiftAPI.submit()."""
+        return await run_in_swift_executor(self.swift_api.submit, too)
+
+    async def get_too_request_status(self, too_id: int) -> dict:
+        """Await SwiftAPI.get_too_request_status()."""
+        return await run_in_swift_executor(self.swift_api.get_too_request_status, too_id)
+
+    async def get_too_request_statuses(self, too_ids, since: datetime) -> dict:
+        """Await SwiftAPI.get_too_request_statuses()."""
+        return await run_in_swift_executor(self.swift_api.get_too_request_statuses, too_ids, since)
+
+    async def get_too_data_files(self, too_id: int) -> list:
+        """Await SwiftAPI.get_too_data_files()."""
+        return await run_in_swift_executor(self.swift_api.get_too_data_files, too_id)
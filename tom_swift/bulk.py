@@ -0,0 +1,165 @@
+"""Submitting Swift TOO requests for many targets at once (for a GW counterpart campaign, say).
+
+submit_bulk() takes the observation form's data (the same for every target, except for the
+target) and, for each target:
+
+  1. makes its observation payload with SwiftObservationForm, as the observation form does
+     (so a target whose form data is invalid is reported, and not submitted);
+  2. configures its Swift_TOO (see SwiftFacility._configure_too()) and validates it locally;
+  3. submits it to the Swift TOO API (or, with the SUBMISSION_QUEUE setting on, puts it in the
+     submission queue; see tom_swift.submission), and makes its ObservationRecord.
+
+Steps 2 and 3 are done for many targets at once, in threads, with at most max_in_flight
+(the BULK_MAX_IN_FLIGHT setting) Swift TOO API operations in progress at a time, so as not to
+overwhelm the API. Each target gets a BulkResult. `./manage.py swiftbulksubmit` does this for
+the targets of a target list.
+"""
+from concurrent.futures import ThreadPoolExecutor
+import json
+import logging
+from typing import NamedTuple
+
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import transaction
+from guardian.shortcuts import assign_perm
+
+from tom_observations.models import ObservationGroup, ObservationRecord
+
+from tom_swift import metrics, submission
+from tom_swift.polling import FACILITY_NAME, get_facility
+from tom_swift.swift import SwiftObservationForm
+from tom_swift.swift_api import get_swift_setting
+
+logger = logging.getLogger(__name__)
+
+#
+# Settings (in settings.FACILITIES['SWIFT']):
+#   'BULK_MAX_IN_FLIGHT': Swift TOO API operations that submit_bulk() has in progress at once (default 4)
+#
+BULK_MAX_IN_FLIGHT = 4
+
+# BulkResult outcomes
+SUBMITTED = 'submitted'  # the Swift TOO API accepted the TOO request
+QUEUED = 'queued'  # the TOO request is in the submission queue
+VALID = 'valid'  # (validate_only) the TOO request would be submitted
+INVALID = 'invalid'  # the form data or the TOO request is invalid; it wasn't submitted
+REJECTED = 'rejected'  # the Swift TOO API didn't accept the TOO request
+
+
+class BulkResult(NamedTuple):
+    target: object  # the Target
+    outcome: str
+    observation_id: str = None
+    errors: tuple = ()
+    observation_record: ObservationRecord = None
+
+
+def _serializable(parameters) -> dict:
+    """Return the parameters (form.serialize_parameters()) as the JSON an ObservationRecord can save."""
+    return json.loads(json.dumps(parameters, cls=DjangoJSONEncoder))
+
+
+def bulk_payloads(targets, form_data, facility) -> dict:
+    """Return {target: (observation payload, parameters to record, errors)} of the form_data for each target.
+
+    The payload and parameters are None if the form_data is invalid for the target.
+    """
+    payloads = {}
+    for target in targets:
+        form = SwiftObservationForm({**form_data, 'facility': FACILITY_NAME, 'target_id': target.id},
+                                    facility=facility)
+        if form.errors:  # the form's own (local) validation; the Swift TOO API is asked later
+            payloads[target] = (None, None, [f'{field}: {" ".join(errors)}' if field != '__all__' else ' '.join(errors)
+                                             for field, errors in form.errors.items()])
+        else:
+            payloads[target] = (form.observation_payload(), _serializable(form.serialize_parameters()), [])
+    return payloads
+
+
+def _validate(facility, payload):
+    """Return the locally validated Swift_TOO of the payload, and its errors."""
+    too = facility._configure_too(payload)
+    with metrics.timed('validate_local', urgency=too.urgency, instrument=too.instrument):
+        too_is_valid = too.validate()
+    return too, [] if too_is_valid else list(too.status.errors)
+
+
+def _submit(facility, too):
+    """Submit the Swift_TOO, and return (too_id or None, errors)."""
+    if facility.swift_api.submit(too):
+        return too.status.too_id, []
+    return None, list(too.status.errors) or [f'TOO request status: {too.status.status}']
+
+
+def submit_bulk(targets, form_data, user=None, max_in_flight=None, validate_only=False, group_name=None,
+                facility=None, groups=()) -> list[BulkResult]:
+    """Submit a Swift TOO request, made from form_data, for each of the targets; return their BulkResults.
+
+    form_data is the data of the Swift observation form (less the target_id and facility). The
+    ObservationRecords made are the user's, and are put in an ObservationGroup called group_name
+    (if one is given). As ObservationCreateView does, the user is given permission to the
+    ObservationGroup, and (unless TARGET_PERMISSIONS_ONLY) the groups, as if chosen on the
+    observation form, to the ObservationRecords. With validate_only, the TOO requests are only
+    validated (locally).
+    """
+    facility = facility or get_facility()
+    max_in_flight = max_in_flight or get_swift_setting('BULK_MAX_IN_FLIGHT', BULK_MAX_IN_FLIGHT)
+    targets = list(targets)
+    results = {}
+
+    payloads = bulk_payloads(targets, form_data, facility)
+    valid_targets = []
+    for target, (payload, _, errors) in payloads.items():
+        if errors:
+            results[target] = BulkResult(target, INVALID, errors=tuple(errors))
+        else:
+            valid_targets.append(target)
+
+    with ThreadPoolExecutor(max_workers=max_in_flight, thread_name_prefix='tom_swift_bulk') as executor:
+        # configuring the Swift_TOO of a target without a position resolves its source name with the
+        # Swift TOO API (see SwiftAPI.new_too()), so configure and validate them all at once
+        validated = dict(zip(valid_targets, executor.map(lambda target: _validate(facility, payloads[target][0]),
+                                                         valid_targets)))
+        to_submit = []
+        for target in valid_targets:
+            too, errors = validated[target]
+            if errors:
+                results[target] = BulkResult(target, INVALID, errors=tuple(errors))
+            elif validate_only:
+                results[target] = BulkResult(target, VALID)
+            else:
+                to_submit.append(target)
+
+        if submission.submission_queue_enabled():
+            submitted = {target: (submission.enqueue_submission(payloads[target][0]), []) for target in to_submit}
+        else:
+            submitted = dict(zip(to_submit, executor.map(lambda target: _submit(facility, validated[target][0]),
+                                                         to_submit)))
+
+    records = []
+    with transaction.atomic():
+        for target, (observation_id, errors) in submitted.items():
+            if observation_id is None:
+                results[target] = BulkResult(target, REJECTED, errors=tuple(errors))
+                continue
+            record = ObservationRecord.objects.create(target=target, user=user, facility=FACILITY_NAME,
+                                                      parameters=payloads[target][1],
+                                                      observation_id=str(observation_id))
+            records.append(record)
+            if groups and not settings.TARGET_PERMISSIONS_ONLY:
+                for permission in ('view', 'change', 'delete'):
+                    assign_perm(f'tom_observations.{permission}_observationrecord', list(groups), record)
+            outcome = QUEUED if submission.is_queued_observation_id(observation_id) else SUBMITTED
+            results[target] = BulkResult(target, outcome, str(observation_id), observation_record=record)
+        if records and group_name:
+            observation_group = ObservationGroup.objects.create(name=group_name)
+            observation_group.observation_records.add(*records)
+            if user is not None:
+                for permission in ('view', 'change', 'delete'):
+                    assign_perm(f'tom_observations.{permission}_observationgroup', user, observation_group)
+
+    logger.info(f'submit_bulk - {len(targets)} targets: '
+                + ', '.join(f'{sum(result.outcome == outcome for result in results.values())} {outcome}'
+                            for outcome in (SUBMITTED, QUEUED, VALID, INVALID, REJECTED)))
+    return [results[target] for target in targets]
@@ -0,0 +1,97 @@
+"""Small in-process caches used to avoid repeating calls to the Swift TOO API.
+
+These are deliberately free of Django so that they can be used (and tested)
+anywhere in tom_swift.
+"""
+from collections import OrderedDict
+import threading
+import time
+
+
+_MISSING = object()
+
+
+class TTLCache:
+    """A thread-safe, size-bounded mapping whose entries expire after a time-to-live.
+
+    When the cache is full, its expired entries are dropped to make room, and only if that isn't
+    enough is the least-recently-used (live) entry evicted. Otherwise, expired entries are dropped
+    lazily, when they are looked up.
+
+    >>> cache = TTLCache(maxsize=2, ttl=60)
+    >>> cache.set('a', 1)
+    >>> cache.get('a')
+    1
+    """
+    def __init__(self, maxsize=128, ttl=3600, timer=time.monotonic):
+        if maxsize < 1:
+            raise ValueError(f'TTLCache maxsize must be at least 1, not {maxsize}')
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._timer = timer
+        self._entries = OrderedDict()  # key -> (expires_at, value)
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key, default=None):
+        """Return the cached value for key, or default if it is missing or has expired."""
+        with self._lock:
+            entry = self._entries.get(key, _MISSING)
+            if entry is not _MISSING:
+                expires_at, value = entry
+                if expires_at > self._timer():
+                    self._entries.move_to_end(key)  # mark as most recently used
+                    self.hits += 1
+                    return value
+                del self._entries[key]
+            self.misses += 1
+            return default
+
+    def set(self, key, value, ttl=None):
+        """Cache value under key for ttl seconds (or the cache's default ttl)."""
+        ttl = self.ttl if ttl is None else ttl
+        with self._lock:
+            now = self._timer()
+            self._entries[key] = (now + ttl, value)
+            self._entries.move_to_end(key)
+            if len(self._entries) > self.maxsize:
+                # entries can have different ttls, so the expired ones aren't necessarily the least recently used
+                for expired_key in [k for k, (expires_at, _) in self._entries.items() if expires_at <= now]:
+                    del self._entries[expired_key]
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)  # least recently used
+
+    def pop(self, key, default=None):
+        """Remove key from the cache and return its value (or default if it is missing or has expired)."""
+        with self._lock:
+            entry = self._entries.pop(key, _MISSING)
+            if entry is not _MISSING and entry[0] > self._timer():
+                self.hits += 1
+                return entry[1]
+            self.misses += 1
+            return default
+
+    def delete(self, key):
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.hits = 0
+            self.misses = 0
+
+    def stats(self) -> dict:
+        """Return the hit/miss counters and current size of the cache."""
+        with self._lock:
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'size': len(self._entries),
+                'maxsize': self.maxsize,
+            }
+
+    def __len__(self):
+        with self._lock:
+            return len(self._entries)
@@ -0,0 +1,103 @@
+"""Streaming, resumable downloads of Swift data files.
+
+Swift XRT event files and UVOT images can be large, so they are never read into
+memory whole: each file is streamed in chunks to a partial file next to its
+destination, and renamed into place when it is complete. If a download is
+interrupted, the next attempt asks the server for the rest of the file (with an
+HTTP Range request) rather than starting again.
+
+Like tom_swift.cache, this module is free of Django.
+"""
+from concurrent.futures import ThreadPoolExecutor
+import logging
+import os
+from typing import NamedTuple, Optional
+
+import requests
+
+logger = logging.getLogger(__name__)
+
+DOWNLOAD_CHUNK_SIZE = 1024 * 1024  # bytes
+DOWNLOAD_TIMEOUT = (10, 60)  # (connect, read) seconds
+DOWNLOAD_WORKERS = 4
+
+PARTIAL_SUFFIX = '.part'
+
+
+class Download(NamedTuple):
+    """A file to download from url to path, and what became of it."""
+    url: str
+    path: str
+    error: Optional[str] = None
+
+    @property
+    def ok(self):
+        return self.error is None
+
+
+def download_file(url, path, session=None, chunk_size=DOWNLOAD_CHUNK_SIZE, timeout=DOWNLOAD_TIMEOUT) -> int:
+    """Download url to path, a chunk at a time, and return the size of the file.
+
+    The file is written to path + '.part' and renamed to path when it is complete. If
+    path + '.part' already exists (from an interrupted download), only the rest of the file is
+    requested. Raises requests.RequestException if the download fails; what has been
+    downloaded so far is kept for the next attempt.
+    """
+    partial_path = path + PARTIAL_SUFFIX
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    offset = os.path.getsize(partial_path) if os.path.exists(partial_path) else 0
+
+    # byte ranges are of the file as stored, so don't let the server compress it in transit
+    headers = {'Accept-Encoding': 'identity'}
+    if offset:
+        headers['Range'] = f'bytes={offset}-'
+    get = session.get if session is not None else requests.get
+    with get(url, headers=headers, stream=True, allow_redirects=True, timeout=timeout) as response:
+        if offset and response.status_code == 416:
+            # Range Not Satisfiable: the partial file is already complete (or larger than the file now is)
+            content_range = response.headers.get('Content-Range', '')  # e.g. 'bytes */12345'
+            if content_range.rpartition('/')[2] == str(offset):
+                os.replace(partial_path, path)
+                return offset
+            logger.warning(f'download_file - discarding {partial_path}: it does not match {url}')
+            os.remove(partial_path)
+            return download_file(url, path, session=session, chunk_size=chunk_size, timeout=timeout)
+        response.raise_for_status()
+
+        if offset and response.status_code != 206:
+            # the server ignored the Range header and is sending the whole file
+            logger.debug(f'download_file - {url} cannot be resumed; downloading it again')
+            offset = 0
+        elif offset:
+            logger.debug(f'download_file - resuming {url} from byte {offset}')
+
+        with open(partial_path, 'ab' if offset else 'wb') as partial_file:
+            for chunk in response.iter_content(chunk_size=chunk_size):
+                partial_file.write(chunk)
+            size = partial_file.tell()
+
+    os.replace(partial_path, path)
+    return size
+
+
+def download_files(downloads, max_workers=DOWNLOAD_WORKERS, **kwargs) -> list[Download]:
+    """Download each (url, path) in downloads, max_workers at a time, with download_file().
+
+    kwargs are passed on to download_file(). Returns a Download for each of the downloads, in
+    the same order; its error is None if the file was downloaded, or says why it wasn't.
+    """
+    def download(url_and_path):
+        url, path = url_and_path
+        try:
+            download_file(url, path, **kwargs)
+        except (requests.RequestException, OSError) as err:
+            logger.error(f'download_files - failed to download {url}: {err}')
+            return Download(url, path, str(err))
+        return Download(url, path)
+
+    downloads = list(downloads)
+    if not downloads:
+        return []
+    with ThreadPoolExecutor(max_workers=min(max_workers, len(downloads)),
+                            thread_name_prefix='tom_swift_download') as executor:
+        return list(executor.map(download, downloads))
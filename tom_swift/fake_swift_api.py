@@ -0,0 +1,119 @@
+"""A local fake of the Swift TOO API, for the tests and the benchmarks.
+
+swifttools sends each Swift TOO API request as a JWT, POSTed to the API's submit_json.php.
+FakeSwiftTOOAPI decodes the JWT and answers the requests that the observation form makes
+(Swift_Resolve, Swift_TOO_Request, and Swift_TOO_Requests) the way the Swift TOO API does,
+with the answer at once (no "Queued" job to poll for).
+
+FakeSession stands in for the pooled requests.Session of tom_swift.swift_api (see
+get_swift_session()), so the tests and benchmarks exercise tom_swift and swifttools, not the network:
+
+    install_fake_swift_api(FakeSwiftTOOAPI())
+"""
+import itertools
+import json
+import threading
+from types import SimpleNamespace
+from urllib.parse import parse_qs, urlparse
+
+import jwt
+
+
+class FakeSwiftTOOAPI:
+    """Answers Swift TOO API requests (JWTs) like the Swift TOO API, remembering the TOOs submitted to it."""
+
+    def __init__(self, api_version=None, first_too_id=20000):
+        if api_version is None:
+            from swifttools.swift_too.api_common import api_version
+        self.api_version = api_version
+        self._lock = threading.Lock()
+        self._too_ids = itertools.count(first_too_id)
+        self._jobnumbers = itertools.count(1)
+        self.toos = {}  # {too_id: api_data of the submitted Swift_TOO_Request}
+        self.requests = {}  # {api_name: count}
+
+    def answer(self, token) -> (int, dict):
+        """Return the (HTTP status code, JSON body) of the answer to the request JWT."""
+        request = jwt.decode(token, options={'verify_signature': False})
+        api_name = request['api_name']
+        with self._lock:
+            self.requests[api_name] = self.requests.get(api_name, 0) + 1
+        handler = {
+            'Swift_Resolve': self.resolve,
+            'Swift_TOO_Request': self.too_request,
+            'Swift_TOO_Requests': self.too_requests,
+        }.get(api_name)
+        if handler is None:
+            return 200, self._response('Swift_TOO_Status', self._status('Rejected', [f'Unknown API: {api_name}']))
+        return 200, handler(request['api_data'])
+
+    def _response(self, api_name, api_data):
+        return {'api_name': api_name, 'api_version': self.api_version, 'api_data': api_data}
+
+    def _status(self, status='Accepted', errors=(), too_id=None):
+        with self._lock:
+            jobnumber = next(self._jobnumbers)
+        return {'status': status, 'errors': list(errors), 'warnings': [], 'too_id': too_id, 'jobnumber': jobnumber}
+
+    def resolve(self, data):
+        # every name resolves, to a position made from its characters (so the same name always gives the same one)
+        name = data.get('name', '')
+        ra = sum(ord(character) * (index + 1) for index, character in enumerate(name)) % 36000 / 100
+        dec = (sum(ord(character) for character in name) % 18000) / 100 - 90
+        return self._response('Swift_Resolve', {
+            'ra': ra, 'dec': dec, 'resolver': 'Fake',
+            'status': {'api_name': 'Swift_TOO_Status', 'api_data': self._status()},
+        })
+
+    def too_request(self, data):
+        if data.get('validate_only'):
+            return self._response('Swift_TOO_Status', self._status())
+        with self._lock:
+            too_id = next(self._too_ids)
+            self.toos[too_id] = data
+        return self._response('Swift_TOO_Status', self._status(too_id=too_id))
+
+    def too_requests(self, data):
+        with self._lock:
+            too_ids = [data['too_id']] if data.get('too_id') else list(self.toos)
+            too_ids = [too_id for too_id in too_ids if too_id in self.toos][:data.get('limit') or 10]
+        entries = [{'api_name': 'Swift_TOO_Request',
+                    'api_data': {'too_id': too_id, 'decision': 'Approved', 'done': False}}
+                   for too_id in too_ids]
+        return self._response('Swift_TOO_Requests', {
+            'entries': entries,
+            'status': {'api_name': 'Swift_TOO_Status', 'api_data': self._status()},
+        })
+
+
+class FakeResponse(SimpleNamespace):
+    """The parts of a requests.Response that swifttools uses."""
+    def json(self):
+        return json.loads(self.text)
+
+
+class FakeSession:
+    """Stands in for a requests.Session, sending the Swift TOO API requests to a FakeSwiftTOOAPI."""
+
+    def __init__(self, api: FakeSwiftTOOAPI):
+        self.api = api
+
+    def post(self, url, data=None, **kwargs):
+        status_code, body = self.api.answer(data['jwt'])
+        return FakeResponse(status_code=status_code, text=json.dumps(body))
+
+    def get(self, url, **kwargs):
+        status_code, body = self.api.answer(parse_qs(urlparse(url).query)['jwt'][0])
+        return FakeResponse(status_code=status_code, text=json.dumps(body))
+
+
+def install_fake_swift_api(api: FakeSwiftTOOAPI):
+    """Make all of tom_swift's Swift TOO API requests go to the api (see swift_api.get_swift_session())."""
+    from swifttools.swift_too import api_common, swift_data
+    from tom_swift import swift_api
+
+    swift_api._swift_session = FakeSession(api)
+    for module in (api_common, swift_data):
+        if isinstance(module.requests, swift_api._SessionRequests):
+            module.requests.session = swift_api._swift_session
+    swift_api._swift_too()  # installs the session into swifttools, if it isn't already
@@ -0,0 +1,35 @@
+from django.core.management.base import BaseCommand
+
+from tom_swift import polling
+
+
+class Command(BaseCommand):
+    """
+    Updates the status of the Swift observation requests that are due to be polled. Run this frequently (every few
+    minutes, say): urgent requests are polled often, less urgent requests less and less often while their status
+    doesn't change, and finished requests not at all. See tom_swift.polling for details.
+    """
+
+    help = 'Updates the status of the Swift observation requests that are due to be polled'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--limit',
+            type=int,
+            help='Poll at most this many observation requests (the most urgent first)'
+        )
+        parser.add_argument(
+            '--queue',
+            action='store_true',
+            help='Show the polling queue instead of polling'
+        )
+
+    def handle(self, *args, **options):
+        if not options['queue']:
+            failed_records = polling.poll_due_observations(limit=options['limit'])
+            if failed_records:
+                self.stderr.write(f'Update completed with errors: {failed_records}')
+
+        for urgency, urgency_queue in polling.poll_queue().items():
+            self.stdout.write(f'urgency {urgency}: {urgency_queue["scheduled"]} scheduled, {urgency_queue["due"]} due, '
+                              f'next poll at {urgency_queue["next_poll"]:%Y-%m-%d %H:%M:%S}')
@@ -0,0 +1,58 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from tom_swift import submission
+
+
+class Command(BaseCommand):
+    """
+    Submits the queued Swift TOO requests that are due, the most urgent first. With the SUBMISSION_QUEUE setting on,
+    the observation form queues the TOO requests rather than submitting them; run this frequently (every minute,
+    say), or continuously with --loop. See tom_swift.submission for details.
+    """
+
+    help = 'Submits the queued Swift TOO requests that are due, the most urgent first'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--limit',
+            type=int,
+            help='Submit at most this many TOO requests (the most urgent first)'
+        )
+        parser.add_argument(
+            '--loop',
+            action='store_true',
+            help='Keep looking for queued TOO requests to submit, until interrupted'
+        )
+        parser.add_argument(
+            '--interval',
+            type=float,
+            default=5.0,
+            help='With --loop, how many seconds to wait when there is nothing to submit (default 5)'
+        )
+        parser.add_argument(
+            '--queue',
+            action='store_true',
+            help='Show the submission queue instead of submitting'
+        )
+
+    def handle(self, *args, **options):
+        if options['queue']:
+            for urgency, urgency_queue in submission.submission_queue_state().items():
+                self.stdout.write(f'urgency {urgency}: {urgency_queue["queued"]} queued, {urgency_queue["due"]} due, '
+                                  f'next attempt at {urgency_queue["next_attempt"]:%Y-%m-%d %H:%M:%S}')
+            return
+
+        while True:
+            counts = submission.process_submission_queue(limit=options['limit'])
+            if any(counts.values()):
+                self.stdout.write(f'{counts["submitted"]} submitted, {counts["retrying"]} to be retried, '
+                                  f'{counts["failed"]} failed')
+            if not options['loop']:
+                break
+            if not any(counts.values()):
+                try:
+                    time.sleep(options['interval'])
+                except KeyboardInterrupt:
+                    break
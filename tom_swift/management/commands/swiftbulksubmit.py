@@ -0,0 +1,110 @@
+import json
+
+from django.contrib.auth.models import Group, User
+from django.core.management.base import BaseCommand, CommandError
+
+from tom_targets.models import Target, TargetList
+
+from tom_swift import bulk
+
+
+class Command(BaseCommand):
+    """
+    Submits a Swift TOO request for each target of a target list (or of the named targets), all made from the same
+    Swift observation form data, and reports the outcome for each target. The TOO requests are validated and then
+    submitted many at once, with at most --max_in_flight Swift TOO API operations in progress. See tom_swift.bulk.
+    """
+
+    help = 'Submits a Swift TOO request, made from the same form data, for each of the targets of a target list'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'parameters',
+            help='A JSON file of the Swift observation form data (field name: value) to submit for every target'
+        )
+        parser.add_argument(
+            '--target_list',
+            help='The name of the target list whose targets to submit TOO requests for'
+        )
+        parser.add_argument(
+            '--targets',
+            nargs='+',
+            help='The names of the targets to submit TOO requests for'
+        )
+        parser.add_argument(
+            '--set',
+            nargs='+',
+            default=[],
+            metavar='FIELD=VALUE',
+            help='Form data that overrides that of the parameters file, e.g. --set urgency=1 exposure=2000'
+        )
+        parser.add_argument(
+            '--max_in_flight',
+            type=int,
+            help=f'How many Swift TOO API operations to have in progress at once '
+                 f'(default: the BULK_MAX_IN_FLIGHT setting, or {bulk.BULK_MAX_IN_FLIGHT})'
+        )
+        parser.add_argument(
+            '--username',
+            help='The user to record the observation requests as made by'
+        )
+        parser.add_argument(
+            '--group',
+            help='Put the observation requests in an observation group with this name'
+        )
+        parser.add_argument(
+            '--permission_groups',
+            nargs='+',
+            default=[],
+            help='The names of the (user) groups to give permission to the observation requests, as the '
+                 'observation form\'s groups do (unless TARGET_PERMISSIONS_ONLY)'
+        )
+        parser.add_argument(
+            '--validate_only',
+            action='store_true',
+            help='Only validate the TOO requests (locally); do not submit them'
+        )
+
+    def handle(self, *args, **options):
+        try:
+            with open(options['parameters']) as parameters_file:
+                form_data = json.load(parameters_file)
+        except (OSError, ValueError) as err:
+            raise CommandError(f'Could not read the form data from {options["parameters"]}: {err}')
+        for field_value in options['set']:
+            field, _, value = field_value.partition('=')
+            form_data[field] = value
+
+        if options['target_list']:
+            try:
+                targets = TargetList.objects.get(name=options['target_list']).targets.all()
+            except TargetList.DoesNotExist:
+                raise CommandError(f'There is no target list named {options["target_list"]}')
+        elif options['targets']:
+            targets = Target.objects.filter(name__in=options['targets'])
+            missing = set(options['targets']) - set(targets.values_list('name', flat=True))
+            if missing:
+                raise CommandError(f'There are no targets named {", ".join(sorted(missing))}')
+        else:
+            raise CommandError('Give the targets with --target_list or --targets')
+
+        user = None
+        if options['username']:
+            try:
+                user = User.objects.get(username=options['username'])
+            except User.DoesNotExist:
+                raise CommandError(f'There is no user named {options["username"]}')
+        groups = Group.objects.filter(name__in=options['permission_groups'])
+        missing = set(options['permission_groups']) - set(groups.values_list('name', flat=True))
+        if missing:
+            raise CommandError(f'There are no groups named {", ".join(sorted(missing))}')
+
+        results = bulk.submit_bulk(targets.order_by('name'), form_data, user=user,
+                                   max_in_flight=options['max_in_flight'], validate_only=options['validate_only'],
+                                   group_name=options['group'], groups=groups)
+        for result in results:
+            observation_id = f' {result.observation_id}' if result.observation_id else ''
+            errors = f': {"; ".join(result.errors)}' if result.errors else ''
+            self.stdout.write(f'{result.target.name}: {result.outcome}{observation_id}{errors}')
+        outcomes = [result.outcome for result in results]
+        self.stdout.write(', '.join(f'{outcomes.count(outcome)} {outcome}' for outcome in dict.fromkeys(outcomes)))
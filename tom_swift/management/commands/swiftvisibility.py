@@ -0,0 +1,69 @@
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+from django.template.defaultfilters import pluralize
+from django.utils.timesince import timesince
+
+from tom_targets.models import Target, TargetList
+
+from tom_swift import visibility
+
+
+class Command(BaseCommand):
+    """
+    Shows when Swift can observe each of a list of targets (all of them, or those of a target list) in the coming
+    days. The targets are done in bulk, in one vectorized pass per chunk of targets, with the chunks shared among a
+    pool of processes for long lists. See tom_swift.visibility for details.
+    """
+
+    help = 'Shows when Swift can observe each of the targets (or those of a target list) in the coming days'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--target_list',
+            help='The name of the target list whose targets to show (default: all targets)'
+        )
+        parser.add_argument(
+            '--days',
+            type=int,
+            default=visibility.BULK_VISIBILITY_DAYS,
+            help='How many days ahead to look'
+        )
+        parser.add_argument(
+            '--processes',
+            type=int,
+            help='The number of processes to share long target lists among (default: one per CPU)'
+        )
+        parser.add_argument(
+            '--observable',
+            action='store_true',
+            help='Only show the targets Swift can observe'
+        )
+
+    def handle(self, *args, **options):
+        if options['target_list']:
+            try:
+                targets = TargetList.objects.get(name=options['target_list']).targets.all()
+            except TargetList.DoesNotExist:
+                raise CommandError(f'There is no target list named {options["target_list"]}')
+        else:
+            targets = Target.objects.all()
+        targets = targets.filter(type=Target.SIDEREAL).only('id', 'name', 'type', 'ra', 'dec').order_by('name')
+
+        targets_windows = visibility.get_targets_visibility_windows(targets, days=options['days'],
+                                                                    processes=options['processes'])
+        observable = 0
+        for target, windows in targets_windows.items():
+            if windows:
+                observable += 1
+                first = windows[0]
+                observable_time = sum((window.duration for window in windows), timedelta())
+                self.stdout.write(f'{target.name}: observable for '
+                                  f'{timesince(first.start, first.start + observable_time)} '
+                                  f'in {len(windows)} window{pluralize(len(windows))} '
+                                  f'from {first.start:%Y-%m-%d %H:%M} UTC '
+                                  f'({first.orbit_fraction:.0%} of each orbit)')
+            elif not options['observable']:
+                self.stdout.write(f'{target.name}: not observable')
+        self.stdout.write(f'{observable} of {len(targets_windows)} sidereal targets are observable by Swift '
+                          f'in the next {options["days"]} days')
@@ -0,0 +1,47 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from tom_targets.models import Target
+
+from tom_swift import timeline
+from tom_swift.swift_api import SwiftAPIError
+from tom_swift.visibility import is_sidereal
+
+
+class Command(BaseCommand):
+    """
+    Brings Swift's planned and as-flown timeline of the targets with Swift observation requests up to date, asking
+    the Swift TOO API only for what was observed since the last sync (and for the current plan). The observation form
+    and the Swift Timeline tab of the target page show the timeline; run this frequently (every 15 minutes, say).
+    See tom_swift.timeline for details.
+    """
+
+    help = "Brings Swift's planned and as-flown timeline of the targets with Swift observation requests up to date"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--limit',
+            type=int,
+            help='Sync the timelines of at most this many targets (those synced longest ago first)'
+        )
+        parser.add_argument(
+            '--target',
+            help='Sync the timeline of the target with this name now, whether or not it is due'
+        )
+
+    def handle(self, *args, **options):
+        if options['target']:
+            target = Target.objects.filter(name=options['target']).first()
+            if target is None:
+                raise CommandError(f'No target named {options["target"]}')
+            if not is_sidereal(target):
+                raise CommandError(f'{target} has no fixed position, so Swift observations of it cannot be found')
+            try:
+                sync = timeline.sync_timeline(target)
+            except SwiftAPIError as err:
+                raise CommandError(f'Could not sync the Swift timeline of {target}: {err}')
+            self.stdout.write(f'{sync}')
+            return
+
+        failed_targets = timeline.sync_due_timelines(limit=options['limit'])
+        if failed_targets:
+            self.stderr.write(f'Sync completed with errors: {failed_targets}')
@@ -0,0 +1,44 @@
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from tom_swift import mirror
+from tom_swift.swift_api import SwiftAPIError
+
+
+class Command(BaseCommand):
+    """
+    Brings the local mirror of the recent Swift TOO requests (anyone's) up to date, asking the Swift TOO API only
+    for those made since the last sync. The observation form warns about TOO requests recently made for its target
+    from the mirror; run this frequently (every 15 minutes, say). See tom_swift.mirror for details.
+    """
+
+    help = 'Brings the local mirror of the recent Swift TOO requests up to date'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--target',
+            help='Show the mirrored TOO requests made recently for this source name instead of syncing'
+        )
+        parser.add_argument(
+            '--hours',
+            type=float,
+            default=mirror.MIRROR_WARN_HOURS,
+            help=f'With --target, how many hours to look back (default {mirror.MIRROR_WARN_HOURS})'
+        )
+
+    def handle(self, *args, **options):
+        if options['target']:
+            since = timezone.now() - timedelta(hours=options['hours'])
+            for too_request in mirror.too_requests_named(options['target'], since):
+                self.stdout.write(f'{too_request}: {too_request.decision or "no decision yet"}')
+            return
+
+        try:
+            synced = mirror.sync_too_requests()
+        except SwiftAPIError as err:
+            raise CommandError(f'Could not sync the Swift TOO requests: {err}')
+        newest = mirror.high_water_mark()
+        self.stdout.write(f'{synced} TOO requests synced'
+                          + (f'; the newest was made at {newest:%Y-%m-%d %H:%M:%S}' if newest else ''))
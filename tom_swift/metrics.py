@@ -0,0 +1,137 @@
+"""Latency and outcome metrics of the Swift TOO API operations.
+
+Every Swift TOO API operation (see swift_api.swift_api_call()), and the local validation of
+each Swift_TOO, is recorded here: a count of calls by outcome, and a histogram of how long
+they took, labelled by operation, urgency and instrument. The metrics of a process can be
+scraped by Prometheus from the tom_swift:metrics view (see render_prometheus()).
+
+To send them anywhere else (statsd, say, or a log), connect a receiver to the
+swift_api_call_finished signal, which is sent after every call with the same labels and the
+duration. Like tom_swift.cache, this module does not need Django settings.
+"""
+from contextlib import contextmanager
+import logging
+import threading
+import time
+
+from django.dispatch import Signal
+
+logger = logging.getLogger(__name__)
+
+# sent with operation, outcome, duration (seconds), urgency, and instrument keyword arguments
+swift_api_call_finished = Signal()
+
+# operation outcomes
+SUCCESS = 'success'  # the API answered (even if the answer was "invalid" or "rejected")
+ERROR = 'error'  # something went wrong other than reaching the API
+UNAVAILABLE = 'unavailable'  # the API failed to answer (see swift_api.SwiftAPIUnavailable)
+CIRCUIT_OPEN = 'circuit_open'  # the circuit breaker didn't let the call through
+
+LABELS = ('operation', 'outcome', 'urgency', 'instrument')
+# histogram bucket upper bounds (seconds): the TOO API takes from a fraction of a second to minutes
+DURATION_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0)
+
+
+class Histogram:
+    """The cumulative bucket counts, sum, and count of a set of observations (as Prometheus has them)."""
+    def __init__(self, buckets=DURATION_BUCKETS):
+        self.buckets = tuple(buckets)
+        self.counts = [0] * len(self.buckets)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        for index, upper_bound in enumerate(self.buckets):
+            if value <= upper_bound:
+                self.counts[index] += 1
+        self.sum += value
+        self.count += 1
+
+
+class MetricsRegistry:
+    """The call counters and duration histograms of the Swift TOO API operations in this process.
+
+    Thread-safe: one registry (see get_metrics_registry()) is shared by all of the threads of a process.
+    """
+    def __init__(self, buckets=DURATION_BUCKETS):
+        self.buckets = buckets
+        self._lock = threading.Lock()
+        self._calls = {}  # {(operation, outcome, urgency, instrument): count}
+        self._durations = {}  # {(operation, outcome, urgency, instrument): Histogram}
+
+    def record(self, operation, outcome, duration, urgency='', instrument=''):
+        key = (operation, outcome, str(urgency), str(instrument))
+        with self._lock:
+            self._calls[key] = self._calls.get(key, 0) + 1
+            histogram = self._durations.get(key)
+            if histogram is None:
+                histogram = self._durations[key] = Histogram(self.buckets)
+            histogram.observe(duration)
+
+    def calls(self, **labels) -> int:
+        """Return the number of calls with the given labels (e.g. operation='submit', outcome='success')."""
+        with self._lock:
+            return sum(count for key, count in self._calls.items()
+                       if all(dict(zip(LABELS, key))[label] == str(value) for label, value in labels.items()))
+
+    def render_prometheus(self) -> str:
+        """Return the metrics in the Prometheus text exposition format."""
+        lines = [
+            '# HELP tom_swift_api_calls_total Swift TOO API calls, by outcome.',
+            '# TYPE tom_swift_api_calls_total counter',
+        ]
+        with self._lock:
+            for key, count in sorted(self._calls.items()):
+                lines.append(f'tom_swift_api_calls_total{{{_labels(key)}}} {count}')
+            lines += [
+                '# HELP tom_swift_api_call_duration_seconds How long Swift TOO API calls took.',
+                '# TYPE tom_swift_api_call_duration_seconds histogram',
+            ]
+            for key, histogram in sorted(self._durations.items()):
+                labels = _labels(key)
+                for upper_bound, count in zip(histogram.buckets, histogram.counts):
+                    lines.append(f'tom_swift_api_call_duration_seconds_bucket{{{labels},le="{upper_bound}"}} {count}')
+                lines.append(f'tom_swift_api_call_duration_seconds_bucket{{{labels},le="+Inf"}} {histogram.count}')
+                lines.append(f'tom_swift_api_call_duration_seconds_sum{{{labels}}} {histogram.sum}')
+                lines.append(f'tom_swift_api_call_duration_seconds_count{{{labels}}} {histogram.count}')
+        return '\n'.join(lines) + '\n'
+
+
+def _labels(key) -> str:
+    """Return the Prometheus labels of a (operation, outcome, urgency, instrument) key."""
+    def escape(value):
+        return value.replace('\\', r'\\').replace('"', r'\"').replace('\n', r'\n')
+    return ','.join(f'{label}="{escape(value)}"' for label, value in zip(LABELS, key))
+
+
+_metrics_registry = MetricsRegistry()
+
+
+def get_metrics_registry() -> MetricsRegistry:
+    """Return this process's MetricsRegistry."""
+    return _metrics_registry
+
+
+def record_call(operation, outcome, duration, urgency='', instrument=''):
+    """Record a Swift TOO API call in the MetricsRegistry, and send swift_api_call_finished."""
+    urgency = '' if urgency is None else urgency
+    instrument = instrument or ''
+    get_metrics_registry().record(operation, outcome, duration, urgency=urgency, instrument=instrument)
+    # a broken receiver mustn't break the call it is told about
+    for receiver, response in swift_api_call_finished.send_robust(
+            sender=None, operation=operation, outcome=outcome, duration=duration,
+            urgency=urgency, instrument=instrument):
+        if isinstance(response, Exception):
+            logger.error(f'record_call - swift_api_call_finished receiver {receiver} failed: {response}')
+
+
+@contextmanager
+def timed(operation, urgency='', instrument=''):
+    """Record how long the block took, and whether it succeeded (didn't raise), as a call of operation."""
+    start = time.monotonic()
+    outcome = ERROR
+    try:
+        yield
+        outcome = SUCCESS
+    finally:
+        record_call(operation, outcome, time.monotonic() - start, urgency=urgency, instrument=instrument)
@@ -0,0 +1,30 @@
+# Generated by Django 5.2.18 on 2026-10-18 12:25
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+        ('tom_observations', '0016_alter_facility_options'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SwiftPollState',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('urgency', models.PositiveSmallIntegerField(default=3)),
+                ('next_poll', models.DateTimeField(db_index=True)),
+                ('last_polled', models.DateTimeField(blank=True, null=True)),
+                ('unchanged_polls', models.PositiveIntegerField(default=0)),
+                ('observation_record', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='swift_poll_state', to='tom_observations.observationrecord')),
+            ],
+            options={
+                'ordering': ['next_poll'],
+            },
+        ),
+    ]
@@ -0,0 +1,57 @@
+# Generated by Django 5.2.18 on 2026-10-18 12:31
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tom_swift', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SwiftDataFile',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('product_id', models.CharField(max_length=255, unique=True)),
+                ('obsid', models.CharField(db_index=True, max_length=11)),
+                ('instrument', models.CharField(db_index=True, max_length=16)),
+                ('path', models.CharField(max_length=200)),
+                ('filename', models.CharField(max_length=200)),
+                ('url', models.URLField(max_length=1024)),
+                ('type', models.CharField(blank=True, max_length=200)),
+                ('begin', models.DateTimeField(blank=True, null=True)),
+                ('sha256', models.CharField(blank=True, db_index=True, max_length=64)),
+                ('size', models.BigIntegerField(blank=True, null=True)),
+            ],
+            options={
+                'ordering': ['obsid', 'path', 'filename'],
+            },
+        ),
+        migrations.CreateModel(
+            name='SwiftStoredFile',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('sha256', models.CharField(max_length=64, unique=True)),
+                ('size', models.BigIntegerField()),
+                ('created', models.DateTimeField(auto_now_add=True)),
+                ('last_used', models.DateTimeField(db_index=True)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='SwiftDataFileListing',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('too_id', models.IntegerField(unique=True)),
+                ('listed', models.DateTimeField()),
+                ('data_files', models.ManyToManyField(related_name='listings', to='tom_swift.swiftdatafile')),
+            ],
+        ),
+        migrations.AddField(
+            model_name='swiftdatafile',
+            name='stored_file',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='data_files', to='tom_swift.swiftstoredfile'),
+        ),
+    ]
@@ -0,0 +1,36 @@
+# Generated by Django 5.2.18 on 2026-10-18 12:55
+
+import django.core.serializers.json
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tom_observations', '0016_alter_facility_options'),
+        ('tom_swift', '0002_data_file_store'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SwiftSubmission',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('observation_id', models.CharField(max_length=64, unique=True)),
+                ('payload', models.JSONField(encoder=django.core.serializers.json.DjangoJSONEncoder)),
+                ('urgency', models.PositiveSmallIntegerField(default=3)),
+                ('state', models.CharField(choices=[('queued', 'Queued'), ('submitting', 'Submitting'), ('submitted', 'Submitted'), ('failed', 'Failed')], db_index=True, default='queued', max_length=16)),
+                ('attempts', models.PositiveIntegerField(default=0)),
+                ('next_attempt', models.DateTimeField(db_index=True)),
+                ('created', models.DateTimeField(auto_now_add=True)),
+                ('submitted', models.DateTimeField(blank=True, null=True)),
+                ('too_id', models.IntegerField(blank=True, null=True)),
+                ('errors', models.JSONField(blank=True, default=list)),
+                ('observation_record', models.OneToOneField(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='swift_submission', to='tom_observations.observationrecord')),
+            ],
+            options={
+                'ordering': ['urgency', 'created'],
+            },
+        ),
+    ]
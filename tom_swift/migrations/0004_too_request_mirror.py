@@ -0,0 +1,33 @@
+# Generated by Django 5.2.18 on 2026-10-18 13:00
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tom_swift', '0003_submission_queue'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SwiftTOORequestMirror',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('too_id', models.IntegerField(unique=True)),
+                ('timestamp', models.DateTimeField(db_index=True)),
+                ('source_name', models.CharField(blank=True, max_length=200)),
+                ('normalized_name', models.CharField(blank=True, db_index=True, max_length=200)),
+                ('ra', models.FloatField(blank=True, null=True)),
+                ('dec', models.FloatField(blank=True, db_index=True, null=True)),
+                ('instrument', models.CharField(blank=True, max_length=16)),
+                ('urgency', models.PositiveSmallIntegerField(blank=True, null=True)),
+                ('decision', models.CharField(blank=True, max_length=64)),
+                ('done', models.BooleanField(default=False)),
+                ('synced', models.DateTimeField()),
+            ],
+            options={
+                'ordering': ['-timestamp'],
+            },
+        ),
+    ]
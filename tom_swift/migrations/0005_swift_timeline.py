@@ -0,0 +1,48 @@
+# Generated by Django 5.2.18 on 2026-10-18 13:04
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tom_swift', '0004_too_request_mirror'),
+        ('tom_targets', '0031_basetarget_shared_by_basetarget_shared_from'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SwiftTimelineSync',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('flown_from', models.DateTimeField()),
+                ('flown_until', models.DateTimeField()),
+                ('planned_until', models.DateTimeField(blank=True, null=True)),
+                ('synced', models.DateTimeField(db_index=True)),
+                ('target', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='swift_timeline_sync', to='tom_targets.basetarget')),
+            ],
+        ),
+        migrations.CreateModel(
+            name='SwiftTimelineEntry',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(choices=[('planned', 'Planned'), ('flown', 'As-flown')], max_length=8)),
+                ('obsid', models.CharField(db_index=True, max_length=11)),
+                ('targname', models.CharField(blank=True, max_length=200)),
+                ('begin', models.DateTimeField(db_index=True)),
+                ('end', models.DateTimeField()),
+                ('exposure', models.FloatField(blank=True, null=True)),
+                ('ra', models.FloatField(blank=True, null=True)),
+                ('dec', models.FloatField(blank=True, null=True)),
+                ('roll', models.FloatField(blank=True, null=True)),
+                ('xrt_mode', models.CharField(blank=True, max_length=32)),
+                ('uvot_mode', models.CharField(blank=True, max_length=32)),
+                ('target', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='swift_timeline', to='tom_targets.basetarget')),
+            ],
+            options={
+                'ordering': ['begin'],
+                'constraints': [models.UniqueConstraint(fields=('target', 'kind', 'obsid', 'begin'), name='unique_swift_timeline_entry')],
+            },
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-18 13:17
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tom_swift', '0005_swift_timeline'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='swiftsubmission',
+            name='claimed',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+    ]
@@ -0,0 +1,155 @@
+"""A local mirror of the recent Swift TOO requests (everyone's, not just this TOM's).
+
+Before requesting a TOO, it is worth knowing whether someone has just requested one for the
+same source: a duplicate wastes Swift's time, and ours. Asking the Swift TOO API each time the
+observation form is shown would be slow, so the recent TOO requests are mirrored in the
+database (as SwiftTOORequestMirrors), indexed by source name and declination, and the
+observation form warns about those made in the last MIRROR_WARN_HOURS for its target (see
+recent_too_requests()).
+
+sync_too_requests() brings the mirror up to date incrementally: it asks for the TOO requests
+made since the newest one it has (the high-water mark), less MIRROR_OVERLAP (so that the
+decisions on the most recent requests are brought up to date too). The first sync goes back
+MIRROR_DAYS, and requests older than that are dropped. Run it frequently: by
+`./manage.py syncswifttoos` (from cron, say), or as the tom_swift.tasks.sync_swift_too_requests
+background task.
+"""
+from datetime import timedelta
+import logging
+import math
+
+from django.db import transaction
+from django.db.models import Max
+from django.utils import timezone
+
+from tom_swift.models import SwiftTOORequestMirror
+from tom_swift.swift_api import SwiftAPI, as_utc, get_swift_setting, normalize_target_name
+
+logger = logging.getLogger(__name__)
+
+#
+# Settings (in settings.FACILITIES['SWIFT']):
+#   'MIRROR_DAYS': days of TOO requests to keep in the mirror (default 30)
+#   'MIRROR_OVERLAP': hours before the high-water mark that each sync asks for again (default 24)
+#   'MIRROR_QUERY_LIMIT': maximum number of TOO requests to ask for in one query (default 1000)
+#   'MIRROR_RADIUS': degrees within which a TOO request is for the same position (default 11.6 arcminutes,
+#                    the XRT field of view, as the Swift TOO API has it)
+#   'MIRROR_WARN_HOURS': the observation form warns about TOO requests made this many hours ago (default 48)
+#
+MIRROR_DAYS = 30
+MIRROR_OVERLAP = 24
+MIRROR_QUERY_LIMIT = 1000
+MIRROR_RADIUS = 11.6 / 60
+MIRROR_WARN_HOURS = 48
+
+# the mirrored fields that a sync updates (the others don't change)
+SYNCED_FIELDS = ['timestamp', 'source_name', 'normalized_name', 'ra', 'dec', 'instrument', 'urgency', 'decision',
+                 'done', 'synced']
+
+
+def high_water_mark():
+    """Return when the newest mirrored TOO request was made (or None, if the mirror is empty)."""
+    return SwiftTOORequestMirror.objects.aggregate(Max('timestamp'))['timestamp__max']
+
+
+def _mirror(entry, now) -> SwiftTOORequestMirror:
+    """Return the SwiftTOORequestMirror of a swifttools Swift_TOORequest."""
+    source_name = getattr(entry, 'source_name', None) or ''
+    return SwiftTOORequestMirror(
+        too_id=entry.too_id,
+        timestamp=as_utc(entry.timestamp),
+        source_name=source_name[:200],
+        normalized_name=normalize_target_name(source_name)[:200],
+        ra=getattr(entry, 'ra', None),
+        dec=getattr(entry, 'dec', None),
+        instrument=getattr(entry, 'instrument', None) or '',
+        urgency=getattr(entry, 'urgency', None),
+        decision=getattr(entry, 'decision', None) or '',
+        done=bool(getattr(entry, 'done', False)),
+        synced=now,
+    )
+
+
+def _fetch(swift_api, begin, end, limit) -> list:
+    """Return the TOO requests made between begin and end, halving the time range until no query hits the limit."""
+    entries = swift_api.get_too_requests(begin, end, limit)
+    if len(entries) < limit or end - begin <= timedelta(minutes=1):
+        return entries
+    middle = begin + (end - begin) / 2
+    return _fetch(swift_api, begin, middle, limit) + _fetch(swift_api, middle, end, limit)
+
+
+def sync_too_requests(swift_api=None, now=None) -> int:
+    """Bring the mirror up to date with the TOO requests made since its high-water mark.
+
+    Returns the number of TOO requests added or updated. Raises swift_api.SwiftAPIError if the
+    Swift TOO API couldn't be asked.
+    """
+    swift_api = swift_api or SwiftAPI()
+    now = now or timezone.now()
+    oldest = now - timedelta(days=get_swift_setting('MIRROR_DAYS', MIRROR_DAYS))
+    overlap = timedelta(hours=get_swift_setting('MIRROR_OVERLAP', MIRROR_OVERLAP))
+    mark = high_water_mark()
+    begin = oldest if mark is None else max(oldest, mark - overlap)
+    # (end an hour from now, to allow for clock differences)
+    entries = _fetch(swift_api, begin, now + timedelta(hours=1),
+                     get_swift_setting('MIRROR_QUERY_LIMIT', MIRROR_QUERY_LIMIT))
+    mirrors = {entry.too_id: _mirror(entry, now) for entry in entries
+               if entry.too_id is not None and entry.timestamp is not None}
+
+    with transaction.atomic():
+        SwiftTOORequestMirror.objects.bulk_create(mirrors.values(), update_conflicts=True, unique_fields=['too_id'],
+                                                  update_fields=SYNCED_FIELDS)
+        dropped, _ = SwiftTOORequestMirror.objects.filter(timestamp__lt=oldest).delete()
+    logger.info(f'sync_too_requests - synced {len(mirrors)} TOO requests made since {begin:%Y-%m-%d %H:%M}; '
+                f'dropped {dropped}')
+    return len(mirrors)
+
+
+def angular_separation(ra1, dec1, ra2, dec2) -> float:
+    """Return the angle, in degrees, between two (RA, Dec) positions (in degrees).
+
+    >>> round(angular_separation(10, 0, 11, 0), 6), round(angular_separation(0, 89, 180, 89), 6)
+    (1.0, 2.0)
+    """
+    ra1, dec1, ra2, dec2 = map(math.radians, (ra1, dec1, ra2, dec2))
+    # the haversine formula, which is accurate for small angles
+    haversine = (math.sin((dec2 - dec1) / 2) ** 2
+                 + math.cos(dec1) * math.cos(dec2) * math.sin((ra2 - ra1) / 2) ** 2)
+    return math.degrees(2 * math.asin(min(1.0, math.sqrt(haversine))))
+
+
+def too_requests_near(ra, dec, radius=None, since=None):
+    """Return the mirrored TOO requests (made since the given time) within radius degrees of (ra, dec), newest first."""
+    radius = get_swift_setting('MIRROR_RADIUS', MIRROR_RADIUS) if radius is None else radius
+    too_requests = SwiftTOORequestMirror.objects.filter(dec__range=(dec - radius, dec + radius), ra__isnull=False)
+    if since is not None:
+        too_requests = too_requests.filter(timestamp__gte=since)
+    return [too_request for too_request in too_requests
+            if angular_separation(ra, dec, too_request.ra, too_request.dec) <= radius]
+
+
+def too_requests_named(name, since=None):
+    """Return the mirrored TOO requests (made since the given time) for the source name, newest first.
+
+    Names are compared as the resolver cache compares them (see swift_api.normalize_target_name()).
+    """
+    too_requests = SwiftTOORequestMirror.objects.filter(normalized_name=normalize_target_name(name))
+    if since is not None:
+        too_requests = too_requests.filter(timestamp__gte=since)
+    return list(too_requests)
+
+
+def recent_too_requests(target, hours=None, now=None) -> list:
+    """Return the mirrored TOO requests made in the last hours (MIRROR_WARN_HOURS) for the target, newest first.
+
+    A TOO request is for the target if it has the target's name, or (for a sidereal target) its position.
+    """
+    now = now or timezone.now()
+    since = now - timedelta(hours=get_swift_setting('MIRROR_WARN_HOURS', MIRROR_WARN_HOURS) if hours is None
+                            else hours)
+    too_requests = {too_request.too_id: too_request for too_request in too_requests_named(target.name, since)}
+    if target.ra is not None and target.dec is not None:
+        too_requests.update((too_request.too_id, too_request)
+                            for too_request in too_requests_near(target.ra, target.dec, since=since))
+    return sorted(too_requests.values(), key=lambda too_request: too_request.timestamp, reverse=True)
@@ -0,0 +1,168 @@
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import models
+
+from tom_observations.models import ObservationRecord
+from tom_targets.models import Target
+
+
+class SwiftPollState(models.Model):
+    """When the status of an open Swift ObservationRecord should next be asked for.
+
+    See tom_swift.polling for how these are created, scheduled, and removed.
+    """
+    observation_record = models.OneToOneField(ObservationRecord, on_delete=models.CASCADE,
+                                              related_name='swift_poll_state')
+    # the Swift TOO urgency (0 is most urgent), copied from the ObservationRecord parameters
+    urgency = models.PositiveSmallIntegerField(default=3)
+    next_poll = models.DateTimeField(db_index=True)
+    last_polled = models.DateTimeField(null=True, blank=True)
+    # how many polls in a row found the status unchanged; the polling interval backs off with this
+    unchanged_polls = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        ordering = ['next_poll']
+
+    def __str__(self):
+        return f'{self.observation_record} (urgency {self.urgency}) next polled at {self.next_poll}'
+
+
+class SwiftStoredFile(models.Model):
+    """A file in the local, content-addressed store of Swift data files (see tom_swift.store)."""
+    sha256 = models.CharField(max_length=64, unique=True)
+    size = models.BigIntegerField()
+    created = models.DateTimeField(auto_now_add=True)
+    # the store evicts the least recently used files first
+    last_used = models.DateTimeField(db_index=True)
+
+    def __str__(self):
+        return f'{self.sha256} ({self.size} bytes)'
+
+
+class SwiftDataFile(models.Model):
+    """A data file of a Swift observation, as listed by the Swift TOO API (see swift_api.SwiftDataFile).
+
+    Together with SwiftDataFileListing, this is the index of tom_swift.store.
+    """
+    product_id = models.CharField(max_length=255, unique=True)  # path/filename, which is unique in the archive
+    obsid = models.CharField(max_length=11, db_index=True)
+    instrument = models.CharField(max_length=16, db_index=True)  # e.g. 'xrt', 'uvot', 'bat', or 'auxil'
+    path = models.CharField(max_length=200)
+    filename = models.CharField(max_length=200)
+    url = models.URLField(max_length=1024)
+    type = models.CharField(max_length=200, blank=True)
+    begin = models.DateTimeField(null=True, blank=True)  # of the observation
+    # known once the file has been downloaded
+    sha256 = models.CharField(max_length=64, blank=True, db_index=True)
+    size = models.BigIntegerField(null=True, blank=True)
+    stored_file = models.ForeignKey(SwiftStoredFile, null=True, blank=True, on_delete=models.SET_NULL,
+                                    related_name='data_files')
+
+    class Meta:
+        ordering = ['obsid', 'path', 'filename']
+
+    def __str__(self):
+        return self.product_id
+
+
+class SwiftDataFileListing(models.Model):
+    """The data files of the observations made for a Swift TOO, as last listed by the Swift TOO API."""
+    too_id = models.IntegerField(unique=True)
+    listed = models.DateTimeField()
+    data_files = models.ManyToManyField(SwiftDataFile, related_name='listings')
+
+    def __str__(self):
+        return f'too_id {self.too_id} listed at {self.listed}'
+
+
+class SwiftSubmission(models.Model):
+    """A Swift TOO request in the submission queue (see tom_swift.submission)."""
+    QUEUED = 'queued'
+    SUBMITTING = 'submitting'
+    SUBMITTED = 'submitted'
+    FAILED = 'failed'
+    STATE_CHOICES = [(QUEUED, 'Queued'), (SUBMITTING, 'Submitting'), (SUBMITTED, 'Submitted'), (FAILED, 'Failed')]
+
+    # the placeholder observation_id of the ObservationRecord until the TOO is submitted
+    observation_id = models.CharField(max_length=64, unique=True)
+    observation_record = models.OneToOneField(ObservationRecord, null=True, blank=True, on_delete=models.SET_NULL,
+                                              related_name='swift_submission')
+    payload = models.JSONField(encoder=DjangoJSONEncoder)  # the observation_payload to configure the TOO from
+    # the Swift TOO urgency (0 is most urgent); the queue is worked through in order of urgency
+    urgency = models.PositiveSmallIntegerField(default=3)
+    state = models.CharField(max_length=16, choices=STATE_CHOICES, default=QUEUED, db_index=True)
+    attempts = models.PositiveIntegerField(default=0)
+    next_attempt = models.DateTimeField(db_index=True)
+    claimed = models.DateTimeField(null=True, blank=True)  # when a worker last claimed it to submit (SUBMITTING)
+    created = models.DateTimeField(auto_now_add=True)
+    submitted = models.DateTimeField(null=True, blank=True)
+    too_id = models.IntegerField(null=True, blank=True)
+    errors = models.JSONField(default=list, blank=True)  # of the last attempt
+
+    class Meta:
+        ordering = ['urgency', 'created']
+
+    def __str__(self):
+        return f'{self.observation_id} (urgency {self.urgency}) {self.state}'
+
+
+class SwiftTOORequestMirror(models.Model):
+    """A Swift TOO request (anyone's), as listed by the Swift TOO API (see tom_swift.mirror)."""
+    too_id = models.IntegerField(unique=True)
+    timestamp = models.DateTimeField(db_index=True)  # when the TOO was requested
+    source_name = models.CharField(max_length=200, blank=True)
+    # the source_name, as swift_api.normalize_target_name() makes it
+    normalized_name = models.CharField(max_length=200, blank=True, db_index=True)
+    ra = models.FloatField(null=True, blank=True)
+    dec = models.FloatField(null=True, blank=True, db_index=True)
+    instrument = models.CharField(max_length=16, blank=True)
+    urgency = models.PositiveSmallIntegerField(null=True, blank=True)
+    decision = models.CharField(max_length=64, blank=True)
+    done = models.BooleanField(default=False)
+    synced = models.DateTimeField()
+
+    class Meta:
+        ordering = ['-timestamp']
+
+    def __str__(self):
+        return f'too_id {self.too_id}: {self.source_name} requested at {self.timestamp}'
+
+
+class SwiftTimelineEntry(models.Model):
+    """An observation in Swift's planned or as-flown science timeline, near a TOM target (see tom_swift.timeline)."""
+    PLANNED = 'planned'
+    FLOWN = 'flown'
+    KIND_CHOICES = [(PLANNED, 'Planned'), (FLOWN, 'As-flown')]
+
+    target = models.ForeignKey(Target, on_delete=models.CASCADE, related_name='swift_timeline')
+    kind = models.CharField(max_length=8, choices=KIND_CHOICES)
+    obsid = models.CharField(max_length=11, db_index=True)
+    targname = models.CharField(max_length=200, blank=True)  # Swift's name for the target
+    begin = models.DateTimeField(db_index=True)
+    end = models.DateTimeField()
+    exposure = models.FloatField(null=True, blank=True)  # seconds
+    ra = models.FloatField(null=True, blank=True)
+    dec = models.FloatField(null=True, blank=True)
+    roll = models.FloatField(null=True, blank=True)
+    xrt_mode = models.CharField(max_length=32, blank=True)
+    uvot_mode = models.CharField(max_length=32, blank=True)
+
+    class Meta:
+        ordering = ['begin']
+        constraints = [models.UniqueConstraint(fields=['target', 'kind', 'obsid', 'begin'],
+                                               name='unique_swift_timeline_entry')]
+
+    def __str__(self):
+        return f'{self.get_kind_display()} obsid {self.obsid} of {self.target} at {self.begin}'
+
+
+class SwiftTimelineSync(models.Model):
+    """How far the Swift timeline of a TOM target has been synced (see tom_swift.timeline)."""
+    target = models.OneToOneField(Target, on_delete=models.CASCADE, related_name='swift_timeline_sync')
+    # the as-flown timeline is complete from flown_from up to flown_until; the next sync asks for what came after
+    flown_from = models.DateTimeField()
+    flown_until = models.DateTimeField()
+    planned_until = models.DateTimeField(null=True, blank=True)
+    synced = models.DateTimeField(db_index=True)
+
+    def __str__(self):
+        return f'Swift timeline of {self.target} synced at {self.synced}, flown until {self.flown_until}'
@@ -0,0 +1,176 @@
+"""Adaptive polling of Swift TOO request statuses.
+
+Rather than asking for the status of every open Swift ObservationRecord each time
+(as `./manage.py updatestatus` does), each open record gets a SwiftPollState saying
+when it should next be polled. Urgent requests are polled often; the polling interval
+of less urgent requests doubles each time their status is found unchanged (up to a
+maximum); and records in a terminal state, or without a Swift TOO request whose status can
+be asked for (see is_pollable()), are not polled at all.
+
+poll_due_observations() polls the records that are due, and is meant to be run
+frequently: by `./manage.py pollswiftstatus` (from cron, say), or as the
+tom_swift.tasks.poll_swift_observations background task.
+"""
+from datetime import timedelta
+import logging
+
+from django.db import transaction
+from django.utils import timezone
+
+from tom_observations.facility import get_service_class
+from tom_observations.models import ObservationRecord
+
+from tom_swift.models import SwiftPollState
+from tom_swift.swift_api import SWIFT_PENDING_SUBMISSION_STATE, get_swift_setting
+
+logger = logging.getLogger(__name__)
+
+# Swift TOO urgency -> (first polling interval, maximum polling interval), in seconds.
+# Override any of them with the POLL_INTERVALS setting.
+POLL_INTERVALS = {
+    0: (5 * 60, 15 * 60),  # Immediately
+    1: (10 * 60, 30 * 60),  # Within 4 hours
+    2: (30 * 60, 3 * 60 * 60),  # Within 24 hours
+    3: (2 * 60 * 60, 24 * 60 * 60),  # Days to a week
+    4: (6 * 60 * 60, 7 * 24 * 60 * 60),  # Week to a month
+}
+DEFAULT_URGENCY = 3  # the SwiftObservationForm default
+
+FACILITY_NAME = 'Swift'
+
+
+def poll_interval(urgency, unchanged_polls) -> timedelta:
+    """Return how long to wait before polling a request of the given urgency again, after
+    unchanged_polls polls in a row have found its status unchanged.
+
+    >>> poll_interval(4, 0), poll_interval(4, 1), poll_interval(4, 10)
+    (datetime.timedelta(seconds=21600), datetime.timedelta(seconds=43200), datetime.timedelta(days=7))
+    """
+    intervals = {**POLL_INTERVALS, **get_swift_setting('POLL_INTERVALS', {})}
+    first, maximum = intervals.get(urgency, intervals[DEFAULT_URGENCY])
+    # min() before the multiplication keeps the exponent from growing without bound
+    return timedelta(seconds=min(first * 2 ** min(unchanged_polls, 32), maximum))
+
+
+def record_urgency(record) -> int:
+    """Return the Swift TOO urgency that the ObservationRecord was submitted with."""
+    try:
+        return int(record.parameters.get('urgency', DEFAULT_URGENCY))
+    except (AttributeError, TypeError, ValueError):
+        return DEFAULT_URGENCY
+
+
+def is_pollable(record) -> bool:
+    """Return whether the ObservationRecord is of a Swift TOO request whose status can be asked for.
+
+    A submission that wasn't accepted has the observation_id 'None', and a debug submission a
+    too_id that points to nothing (see SwiftFacility.submit_observation()): neither ever has a status.
+    """
+    try:
+        int(record.observation_id)
+    except (TypeError, ValueError):
+        return False
+    return not (isinstance(record.parameters, dict) and record.parameters.get('debug'))
+
+
+def get_facility():
+    return get_service_class(FACILITY_NAME)()
+
+
+def schedule_open_observations(facility=None, now=None):
+    """Bring the SwiftPollStates up to date with the ObservationRecords.
+
+    Open Swift ObservationRecords without a SwiftPollState get one that is due now (except those
+    waiting in the submission queue, and the others that aren't is_pollable()), and the
+    SwiftPollStates of records that have reached a terminal state are deleted.
+    Returns the number of SwiftPollStates (created, deleted).
+    """
+    facility = facility or get_facility()
+    now = now or timezone.now()
+    terminal_states = facility.get_terminal_observing_states()
+
+    deleted, _ = SwiftPollState.objects.filter(observation_record__status__in=terminal_states).delete()
+
+    # (TOOs still in the submission queue have no status to poll; see tom_swift.submission)
+    unscheduled_records = (ObservationRecord.objects.filter(facility=FACILITY_NAME, swift_poll_state__isnull=True)
+                           .exclude(status__in=terminal_states).exclude(status=SWIFT_PENDING_SUBMISSION_STATE))
+    created = SwiftPollState.objects.bulk_create([
+        SwiftPollState(observation_record=record, urgency=record_urgency(record), next_poll=now)
+        for record in unscheduled_records if is_pollable(record)
+    ])
+    return len(created), deleted
+
+
+def poll_due_observations(limit=None, facility=None, now=None):
+    """Update the statuses of the Swift ObservationRecords whose SwiftPollState is due.
+
+    The due records are updated together, with one query to the Swift TOO API (see
+    SwiftFacility.update_observation_statuses()). Each polled record is then rescheduled:
+    a record whose status changed is next polled after the first interval for its urgency,
+    one whose status didn't change waits twice as long as it did last time (up to the maximum
+    interval), and one that has reached a terminal state is no longer polled. (Nor is one that
+    isn't is_pollable(): its SwiftPollState is deleted.)
+
+    Returns a list of (observation_id, error) tuples for the records that couldn't be updated.
+    """
+    facility = facility or get_facility()
+    now = now or timezone.now()
+    schedule_open_observations(facility, now)
+
+    due_poll_states = (SwiftPollState.objects.filter(next_poll__lte=now)
+                       .select_related('observation_record').order_by('urgency', 'next_poll'))
+    if limit:
+        due_poll_states = due_poll_states[:limit]
+    due_poll_states = list(due_poll_states)
+    unpollable = [poll_state.pk for poll_state in due_poll_states if not is_pollable(poll_state.observation_record)]
+    if unpollable:
+        SwiftPollState.objects.filter(pk__in=unpollable).delete()
+        logger.info(f'poll_due_observations - no longer polling {len(unpollable)} records without a Swift too_id')
+        due_poll_states = [poll_state for poll_state in due_poll_states if poll_state.pk not in unpollable]
+    if not due_poll_states:
+        return []
+
+    def status_of(record):
+        return record.status, record.scheduled_start, record.scheduled_end
+
+    records = [poll_state.observation_record for poll_state in due_poll_states]
+    previous_statuses = {record.pk: status_of(record) for record in records}
+    failed_records = facility.update_observation_statuses(records)
+
+    terminal_states = facility.get_terminal_observing_states()
+    finished, rescheduled = [], []
+    for poll_state in due_poll_states:
+        record = poll_state.observation_record
+        if record.status in terminal_states:
+            finished.append(poll_state.pk)
+            continue
+        if status_of(record) == previous_statuses[record.pk]:
+            poll_state.unchanged_polls += 1
+        else:
+            poll_state.unchanged_polls = 0
+        poll_state.last_polled = now
+        poll_state.next_poll = now + poll_interval(poll_state.urgency, poll_state.unchanged_polls)
+        rescheduled.append(poll_state)
+
+    with transaction.atomic():
+        SwiftPollState.objects.filter(pk__in=finished).delete()
+        SwiftPollState.objects.bulk_update(rescheduled, ['unchanged_polls', 'last_polled', 'next_poll'])
+    logger.info(f'poll_due_observations - polled {len(due_poll_states)} records; '
+                f'{len(finished)} finished, {len(failed_records)} failed')
+
+    return failed_records
+
+
+def poll_queue(now=None) -> dict:
+    """Return the state of the polling queue: for each urgency, how many open records are
+    being polled, how many of them are due, and when the next one is due.
+    """
+    now = now or timezone.now()
+    queue = {}
+    for poll_state in SwiftPollState.objects.only('urgency', 'next_poll').order_by('next_poll'):
+        urgency_queue = queue.setdefault(poll_state.urgency,
+                                         {'scheduled': 0, 'due': 0, 'next_poll': poll_state.next_poll})
+        urgency_queue['scheduled'] += 1
+        if poll_state.next_poll <= now:
+            urgency_queue['due'] += 1
+    return dict(sorted(queue.items()))
@@ -0,0 +1,122 @@
+"""Downloads of Swift archive data from an S3 mirror of the HEASARC archive.
+
+The HEASARC archive (where the Swift data files listed by the Swift TOO API are) is
+mirrored in the public 'nasa-heasarc' S3 bucket. For bulk downloads, fetching the files
+from there is much faster than fetching them one at a time over HTTP: download_s3_files()
+downloads many files at once, and each large file in parts with parallel ranged GETs,
+all sharing one S3 client (and one limit on concurrent requests) per process.
+
+Any S3-compatible service can stand in for the bucket (MinIO, say, or moto), by giving its
+endpoint_url. Like tom_swift.downloads, this module is free of Django.
+"""
+import logging
+import os
+import threading
+
+import boto3
+from boto3.s3.transfer import TransferConfig, create_transfer_manager
+from botocore import UNSIGNED
+from botocore.config import Config
+from botocore.exceptions import BotoCoreError, ClientError
+
+from tom_swift.downloads import PARTIAL_SUFFIX, Download, download_files
+
+logger = logging.getLogger(__name__)
+
+HEASARC_BUCKET = 'nasa-heasarc'
+HEASARC_REGION = 'us-east-1'
+# the S3 key of a HEASARC archive file is its URL without this prefix
+HEASARC_ARCHIVE_URL = 'https://heasarc.gsfc.nasa.gov/FTP/'
+
+S3_MAX_CONCURRENCY = 10  # concurrent GET requests, across all of the files being downloaded
+S3_MULTIPART_THRESHOLD = 8 * 1024 * 1024  # bytes; larger files are downloaded in parts...
+S3_MULTIPART_CHUNKSIZE = 8 * 1024 * 1024  # ...of this size
+
+_s3_clients = {}
+_s3_clients_lock = threading.Lock()
+
+
+def get_s3_client(endpoint_url=None, region_name=HEASARC_REGION, unsigned=True,
+                  max_pool_connections=S3_MAX_CONCURRENCY):
+    """Return this process's S3 client for the given configuration, creating it the first time.
+
+    boto3 clients are thread-safe, and creating one is slow, so one client (and its pool of
+    connections) is shared by all of the downloads in a process. The HEASARC bucket is public,
+    so by default requests are not signed (and no AWS credentials are needed).
+    """
+    key = (endpoint_url, region_name, unsigned, max_pool_connections)
+    with _s3_clients_lock:
+        client = _s3_clients.get(key)
+        if client is None:
+            config = Config(
+                signature_version=UNSIGNED if unsigned else None,
+                max_pool_connections=max_pool_connections,
+                retries={'max_attempts': 3, 'mode': 'standard'},
+                # S3 stand-ins (MinIO, moto) are addressed as endpoint_url/bucket/key
+                s3={'addressing_style': 'path'} if endpoint_url else None,
+            )
+            client = boto3.session.Session().client('s3', endpoint_url=endpoint_url, region_name=region_name,
+                                                    config=config)
+            _s3_clients[key] = client
+    return client
+
+
+def s3_key_for_url(url, archive_url=HEASARC_ARCHIVE_URL):
+    """Return the S3 key of the archive file at url, or None if url isn't in the archive.
+
+    >>> s3_key_for_url('https://heasarc.gsfc.nasa.gov/FTP/swift/data/obs/2024_05/00012345001/xrt/hk/sw.hk.gz')
+    'swift/data/obs/2024_05/00012345001/xrt/hk/sw.hk.gz'
+    """
+    if url and url.startswith(archive_url):
+        return url[len(archive_url):]
+    return None
+
+
+def download_s3_files(downloads, bucket=HEASARC_BUCKET, client=None, max_concurrency=S3_MAX_CONCURRENCY,
+                      multipart_threshold=S3_MULTIPART_THRESHOLD, multipart_chunksize=S3_MULTIPART_CHUNKSIZE,
+                      **client_kwargs) -> list[Download]:
+    """Download each (url, path) in downloads from the S3 bucket, with at most max_concurrency GETs at once.
+
+    Files at least multipart_threshold bytes long are downloaded in multipart_chunksize parts, with
+    parallel ranged GETs. Each file is written to path + '.part' and renamed to path when it is
+    complete. Files whose url isn't in the archive (e.g. quicklook data) are downloaded over HTTP
+    with tom_swift.downloads.download_files() instead.
+
+    client defaults to get_s3_client(**client_kwargs). Returns a Download for each of the downloads,
+    in the same order; its error is None if the file was downloaded, or says why it wasn't.
+    """
+    downloads = list(downloads)
+    if client is None:
+        client = get_s3_client(max_pool_connections=max_concurrency, **client_kwargs)
+    transfer_config = TransferConfig(max_concurrency=max_concurrency, multipart_threshold=multipart_threshold,
+                                     multipart_chunksize=multipart_chunksize, use_threads=True)
+
+    results = [None] * len(downloads)
+    http_downloads = []  # (index, (url, path))
+    with create_transfer_manager(client, transfer_config) as transfer_manager:
+        futures = []  # (index, future)
+        for index, (url, path) in enumerate(downloads):
+            key = s3_key_for_url(url)
+            if key is None:
+                http_downloads.append((index, (url, path)))
+                continue
+            os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+            futures.append((index, transfer_manager.download(bucket, key, path + PARTIAL_SUFFIX)))
+
+        for index, future in futures:
+            url, path = downloads[index]
+            try:
+                future.result()
+                os.replace(path + PARTIAL_SUFFIX, path)
+                results[index] = Download(url, path)
+            except (BotoCoreError, ClientError, OSError) as err:
+                logger.error(f'download_s3_files - failed to download {url} from s3://{bucket}: {err}')
+                results[index] = Download(url, path, str(err))
+
+    if http_downloads:
+        logger.debug(f'download_s3_files - downloading {len(http_downloads)} files over HTTP')
+        indexes = [index for index, _ in http_downloads]
+        for index, download in zip(indexes, download_files([download for _, download in http_downloads],
+                                                           max_workers=max_concurrency)):
+            results[index] = download
+    return results
@@ -0,0 +1,178 @@
+"""A local, content-addressed store of Swift data files, and an index of them.
+
+Listing the data files of a TOO means several round trips to the Swift TOO API (see
+SwiftAPI.get_too_data_files()), and the data products of an ObservationRecord are listed
+every time its page is viewed. So the listing of each TOO is kept in the index
+(SwiftDataFileListing and SwiftDataFile), by obsid, instrument, and (once downloaded)
+checksum, and is only listed again once it is LISTING_TTL seconds old.
+
+Downloaded files are kept in the store, under their SHA-256 checksum, so a file that is
+shared by overlapping TOOs (or saved again) is downloaded and stored only once. The store
+is bounded in size: when it grows beyond STORE_MAX_SIZE bytes, the least recently used
+files are evicted.
+
+Settings (in settings.FACILITIES['SWIFT']):
+  'STORE_DIR': directory of the store (default: a tom_swift/store directory in the temporary directory)
+  'STORE_MAX_SIZE': bytes the store may grow to before files are evicted (default 10 GiB)
+  'LISTING_TTL': seconds before the data files of a TOO are listed again (default 1 hour)
+"""
+from datetime import timedelta
+import hashlib
+import logging
+import os
+import shutil
+import tempfile
+
+from django.db import transaction
+from django.db.models import Sum
+from django.utils import timezone
+
+from tom_swift.models import SwiftDataFile, SwiftDataFileListing, SwiftStoredFile
+from tom_swift.swift_api import get_swift_setting
+
+logger = logging.getLogger(__name__)
+
+LISTING_TTL = 60 * 60
+STORE_MAX_SIZE = 10 * 1024 ** 3
+HASH_CHUNK_SIZE = 1024 * 1024
+
+
+def file_sha256(path) -> str:
+    """Return the hex SHA-256 checksum of the file at path, reading it a chunk at a time."""
+    sha256 = hashlib.sha256()
+    with open(path, 'rb') as data_file:
+        while chunk := data_file.read(HASH_CHUNK_SIZE):
+            sha256.update(chunk)
+    return sha256.hexdigest()
+
+
+def instrument_of(path) -> str:
+    """Return the instrument of a Swift data file path, e.g. 'xrt' for '00012345001/xrt/event'."""
+    parts = path.split('/')
+    return parts[1] if len(parts) > 1 else ''
+
+
+def get_data_files(too_id, swift_api, max_age=None, now=None, observed_obsids=None) -> list[SwiftDataFile]:
+    """Return the SwiftDataFiles of the observations made for the TOO request with too_id.
+
+    They come from the index if the TOO's data files were listed less than max_age seconds
+    (default: the LISTING_TTL setting) ago, or if they were listed for all the observed_obsids
+    (the observations Swift has made of the TOO's target, by its as-flown timeline; see
+    tom_swift.timeline.observed_obsids()). Otherwise they are listed by the Swift TOO API
+    (see SwiftAPI.get_too_data_files(), which raises SwiftAPIError if that fails), and indexed.
+    """
+    now = now or timezone.now()
+    max_age = get_swift_setting('LISTING_TTL', LISTING_TTL) if max_age is None else max_age
+    listing = SwiftDataFileListing.objects.filter(too_id=too_id).first()
+    if listing is not None and listing.listed > now - timedelta(seconds=max_age):
+        return list(listing.data_files.select_related('stored_file'))
+    if listing is not None and observed_obsids is not None:
+        listed_files = list(listing.data_files.select_related('stored_file'))
+        if set(observed_obsids) <= {listed_file.obsid for listed_file in listed_files}:
+            return listed_files  # nothing has been observed since that isn't listed
+
+    listed_files = swift_api.get_too_data_files(too_id)
+    product_ids = [listed_file.product_id for listed_file in listed_files]
+    with transaction.atomic():
+        indexed_files = {data_file.product_id: data_file
+                         for data_file in SwiftDataFile.objects.filter(product_id__in=product_ids)}
+        new_files, moved_files = [], []
+        for listed_file in listed_files:
+            data_file = indexed_files.get(listed_file.product_id)
+            if data_file is None:
+                new_files.append(SwiftDataFile(product_id=listed_file.product_id, obsid=listed_file.obsid,
+                                               instrument=instrument_of(listed_file.path), path=listed_file.path,
+                                               filename=listed_file.filename, url=listed_file.url,
+                                               type=listed_file.type or '', begin=listed_file.begin))
+            elif data_file.url != listed_file.url:
+                # e.g. quicklook data that has since been archived, and may have been reprocessed
+                data_file.url = listed_file.url
+                data_file.sha256, data_file.size, data_file.stored_file = '', None, None
+                moved_files.append(data_file)
+        SwiftDataFile.objects.bulk_create(new_files, ignore_conflicts=True)
+        SwiftDataFile.objects.bulk_update(moved_files, ['url', 'sha256', 'size', 'stored_file'])
+
+        data_files = list(SwiftDataFile.objects.filter(product_id__in=product_ids).select_related('stored_file'))
+        listing, _ = SwiftDataFileListing.objects.update_or_create(too_id=too_id, defaults={'listed': now})
+        listing.data_files.set(data_files)
+    logger.debug(f'get_data_files - indexed {len(data_files)} data files ({len(new_files)} new) for too_id {too_id}')
+    return data_files
+
+
+class DataFileStore:
+    """The content-addressed store of Swift data files: each file is kept (once) under its SHA-256 checksum."""
+
+    def __init__(self, root=None, max_size=None):
+        self.root = root or get_swift_setting('STORE_DIR', os.path.join(tempfile.gettempdir(), 'tom_swift', 'store'))
+        self.max_size = get_swift_setting('STORE_MAX_SIZE', STORE_MAX_SIZE) if max_size is None else max_size
+
+    def path(self, sha256) -> str:
+        return os.path.join(self.root, sha256[:2], sha256)
+
+    def get(self, data_file: SwiftDataFile):
+        """Return the path of the data_file in the store, or None if it isn't stored."""
+        stored_file = data_file.stored_file
+        if stored_file is None and data_file.sha256:
+            # the same content may have been stored for another data file
+            stored_file = SwiftStoredFile.objects.filter(sha256=data_file.sha256).first()
+        if stored_file is None:
+            return None
+
+        path = self.path(stored_file.sha256)
+        if not os.path.exists(path):
+            logger.warning(f'DataFileStore.get - {path} is missing from the store')
+            stored_file.delete()
+            return None
+        stored_file.last_used = timezone.now()
+        stored_file.save(update_fields=['last_used'])
+        if data_file.stored_file_id != stored_file.id:
+            data_file.stored_file = stored_file
+            data_file.save(update_fields=['stored_file'])
+        return path
+
+    def add(self, data_file: SwiftDataFile, path) -> str:
+        """Move the downloaded file at path into the store as the data_file, and return its path in the store.
+
+        If a file with the same content is already stored, the downloaded file is removed instead.
+        """
+        sha256 = file_sha256(path)
+        size = os.path.getsize(path)
+        stored_path = self.path(sha256)
+        if os.path.exists(stored_path):
+            os.remove(path)
+        else:
+            os.makedirs(os.path.dirname(stored_path), exist_ok=True)
+            shutil.move(path, stored_path)
+
+        stored_file, created = SwiftStoredFile.objects.get_or_create(
+            sha256=sha256, defaults={'size': size, 'last_used': timezone.now()})
+        if not created:
+            stored_file.last_used = timezone.now()
+            stored_file.save(update_fields=['last_used'])
+        data_file.sha256, data_file.size, data_file.stored_file = sha256, size, stored_file
+        data_file.save(update_fields=['sha256', 'size', 'stored_file'])
+        return stored_path
+
+    def size(self) -> int:
+        return SwiftStoredFile.objects.aggregate(size=Sum('size'))['size'] or 0
+
+    def evict(self) -> int:
+        """Evict the least recently used files until the store is no bigger than max_size.
+
+        Returns the number of files evicted. The index keeps the checksums of evicted data files.
+        """
+        excess = self.size() - self.max_size
+        evicted = []
+        for stored_file in SwiftStoredFile.objects.order_by('last_used').only('id', 'sha256', 'size'):
+            if excess <= 0:
+                break
+            try:
+                os.remove(self.path(stored_file.sha256))
+            except FileNotFoundError:
+                pass
+            evicted.append(stored_file.id)
+            excess -= stored_file.size
+        if evicted:
+            SwiftStoredFile.objects.filter(id__in=evicted).delete()
+            logger.info(f'DataFileStore.evict - evicted {len(evicted)} files from {self.root}')
+        return len(evicted)
@@ -0,0 +1,288 @@
+"""Queued, urgency-ordered submission of Swift TOO requests.
+
+Submitting a TOO means waiting for the Swift TOO API to accept it, which can take many
+seconds (or, when the API is struggling, minutes), and the observation form normally makes
+the user wait. With the SUBMISSION_QUEUE setting on, SwiftFacility.submit_observation()
+instead puts the TOO in the submission queue (a SwiftSubmission) and returns at once: the
+ObservationRecord is created with a placeholder observation_id, and the 'Pending submission'
+status.
+
+process_submission_queue() sends the queued TOOs to Swift, the most urgent first (urgency 0
+before anything else), at most one every SUBMISSION_INTERVAL seconds. It is meant to be run
+frequently, or continuously: by `./manage.py submitswifttoos` (with --loop, as a worker), or as
+the tom_swift.tasks.submit_swift_observations background task. When a TOO is accepted, its
+ObservationRecord gets the real too_id (and is polled from then on; see tom_swift.polling).
+A TOO the Swift TOO API couldn't be asked to take (it was down, say) is tried again later,
+up to SUBMISSION_MAX_ATTEMPTS times; one it rejected is marked 'Failed'.
+
+A worker that stops (crashes, say) while submitting a TOO leaves it claimed. Once it has been
+claimed for SUBMISSION_CLAIM_TIMEOUT seconds, the TOO is marked 'Failed' (see
+fail_stale_claims()) rather than submitted again: the Swift TOO API may already have it, and a
+second TOO request for the same observation would waste Swift's time.
+"""
+from datetime import timedelta
+import json
+import logging
+import time
+import uuid
+
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from tom_observations.models import ObservationRecord
+
+from tom_swift.models import SwiftPollState, SwiftSubmission
+from tom_swift.polling import DEFAULT_URGENCY, FACILITY_NAME, get_facility
+from tom_swift.swift_api import (SWIFT_PENDING_STATE, SWIFT_PENDING_SUBMISSION_STATE, TRANSIENT_VALIDATION_ERRORS,
+                                 CircuitBreaker, get_circuit_breaker, get_swift_setting)
+
+logger = logging.getLogger(__name__)
+
+#
+# Settings (in settings.FACILITIES['SWIFT']):
+#   'SUBMISSION_QUEUE': submit TOOs through the submission queue, rather than from the view (default False)
+#   'SUBMISSION_INTERVAL': minimum seconds between submissions to the Swift TOO API (default 2)
+#   'SUBMISSION_MAX_ATTEMPTS': attempts to submit a TOO before it is marked 'Failed' (default 5)
+#   'SUBMISSION_RETRY_DELAY': seconds before the first retry; each retry waits twice as long (default 30)
+#   'SUBMISSION_CLAIM_TIMEOUT': seconds after which a TOO still being submitted was left by a worker that
+#                               stopped, and is marked 'Failed' (default 10 minutes)
+#
+SUBMISSION_INTERVAL = 2
+SUBMISSION_MAX_ATTEMPTS = 5
+SUBMISSION_RETRY_DELAY = 30
+SUBMISSION_CLAIM_TIMEOUT = 10 * 60
+
+OBSERVATION_ID_PREFIX = 'queued-'  # of the placeholder observation_ids of queued TOOs
+FAILED_STATE = 'Failed'  # the ObservationRecord status of a TOO that couldn't be submitted
+
+# the errors of a TOO that the Swift TOO API couldn't be asked to take (see SwiftAPI.submit());
+# anything else (a rejection, a local validation error) won't go away by trying again
+RETRYABLE_ERRORS = TRANSIENT_VALIDATION_ERRORS + ('The Swift TOO API could not', 'The Swift TOO API has been failing')
+
+
+def submission_queue_enabled() -> bool:
+    return bool(get_swift_setting('SUBMISSION_QUEUE', False))
+
+
+def is_queued_observation_id(observation_id) -> bool:
+    return str(observation_id).startswith(OBSERVATION_ID_PREFIX)
+
+
+def retry_delay(attempts) -> timedelta:
+    """Return how long to wait before trying again to submit a TOO that has failed attempts times.
+
+    >>> retry_delay(1), retry_delay(3)
+    (datetime.timedelta(seconds=30), datetime.timedelta(seconds=120))
+    """
+    return timedelta(seconds=get_swift_setting('SUBMISSION_RETRY_DELAY', SUBMISSION_RETRY_DELAY)
+                     * 2 ** min(max(attempts - 1, 0), 16))
+
+
+def is_retryable(too) -> bool:
+    """Return whether the failed submission of the too is worth trying again.
+
+    Only if the TOO wasn't queued by the Swift TOO API: once it has a jobnumber, the API has
+    it, and may yet accept it (so submitting it again could make a second TOO request).
+    """
+    if getattr(too.status, 'jobnumber', None) is not None:
+        return False
+    return any(str(error).startswith(RETRYABLE_ERRORS) for error in too.status.errors)
+
+
+def queued_payload(observation_payload) -> dict:
+    """Return the observation_payload as the JSON a SwiftSubmission can save.
+
+    Values that aren't JSON are left out: they don't configure the TOO. (Notably, without the
+    TARGET_PERMISSIONS_ONLY setting, the form's cleaned_data has the groups, a QuerySet, to
+    share the ObservationRecord with; the view, not the TOO, uses those.)
+    """
+    payload = {}
+    for key, value in observation_payload.items():
+        try:
+            payload[key] = json.loads(json.dumps(value, cls=DjangoJSONEncoder))
+        except TypeError:
+            logger.debug(f'queued_payload - leaving out {key}: {type(value).__name__} is not JSON')
+    return payload
+
+
+def enqueue_submission(observation_payload, now=None) -> str:
+    """Put the observation_payload in the submission queue, and return its placeholder observation_id."""
+    now = now or timezone.now()
+    try:
+        urgency = int(observation_payload.get('urgency', DEFAULT_URGENCY))
+    except (TypeError, ValueError):
+        urgency = DEFAULT_URGENCY
+    submission = SwiftSubmission.objects.create(observation_id=f'{OBSERVATION_ID_PREFIX}{uuid.uuid4().hex}',
+                                                payload=queued_payload(observation_payload), urgency=urgency,
+                                                next_attempt=now)
+    logger.info(f'enqueue_submission - queued {submission}')
+    return submission.observation_id
+
+
+def link_observation_record(sender, instance, created, **kwargs):
+    """post_save receiver of ObservationRecord: link a new record of a queued TOO to its SwiftSubmission.
+
+    The view creates the ObservationRecord after SwiftFacility.submit_observation() has queued
+    the TOO, so this is where the record gets its 'Pending submission' status (or, if the queue
+    has already been processed, the outcome of the submission).
+    """
+    if not created or instance.facility != FACILITY_NAME or not is_queued_observation_id(instance.observation_id):
+        return
+    submission = SwiftSubmission.objects.filter(observation_id=instance.observation_id).first()
+    if submission is None:
+        return
+    submission.observation_record = instance
+    submission.save(update_fields=['observation_record'])
+    if submission.state in (SwiftSubmission.SUBMITTED, SwiftSubmission.FAILED):
+        _update_observation_record(submission)
+    else:
+        instance.status = SWIFT_PENDING_SUBMISSION_STATE
+        ObservationRecord.objects.filter(pk=instance.pk).update(status=instance.status)
+
+
+def _update_observation_record(submission):
+    """Give the ObservationRecord of the submission (if it has one yet) the outcome of the submission."""
+    if submission.observation_record is None:
+        # the view may have created the record after the submission was claimed
+        submission.observation_record = (ObservationRecord.objects
+                                         .filter(facility=FACILITY_NAME, observation_id=submission.observation_id)
+                                         .first())
+    record = submission.observation_record
+    if record is None:
+        return
+    if submission.state == SwiftSubmission.SUBMITTED:
+        record.observation_id = str(submission.too_id)
+        record.status = SWIFT_PENDING_STATE
+    else:
+        record.status = FAILED_STATE
+    record.save()  # runs the observation_change_state hook
+    # poll the submitted TOO from now (see tom_swift.polling)
+    SwiftPollState.objects.filter(observation_record=record).delete()
+
+
+def _claim_next_submission(now):
+    """Return the most urgent SwiftSubmission that is due, marked as SUBMITTING (or None if there isn't one).
+
+    A submission is claimed by changing its state, so concurrent workers never submit the same TOO.
+    """
+    while True:
+        submission = (SwiftSubmission.objects.filter(state=SwiftSubmission.QUEUED, next_attempt__lte=now)
+                      .order_by('urgency', 'created').first())
+        if submission is None:
+            return None
+        claimed = (SwiftSubmission.objects.filter(pk=submission.pk, state=SwiftSubmission.QUEUED)
+                   .update(state=SwiftSubmission.SUBMITTING, claimed=now))
+        if claimed:
+            submission.state, submission.claimed = SwiftSubmission.SUBMITTING, now
+            return submission
+
+
+def fail_stale_claims(now=None) -> int:
+    """Mark 'Failed' the SwiftSubmissions claimed more than SUBMISSION_CLAIM_TIMEOUT seconds ago
+    and still SUBMITTING: the worker that claimed them stopped before it recorded the outcome.
+
+    They aren't submitted again, as the Swift TOO API may have them already.
+    Returns the number of submissions marked 'Failed'.
+    """
+    now = now or timezone.now()
+    stale = now - timedelta(seconds=get_swift_setting('SUBMISSION_CLAIM_TIMEOUT', SUBMISSION_CLAIM_TIMEOUT))
+    failed = 0
+    # (one claimed before SwiftSubmissions had a claimed time was claimed some time after its next_attempt)
+    stale_submissions = SwiftSubmission.objects.filter(
+        Q(claimed__lt=stale) | Q(claimed__isnull=True, next_attempt__lt=stale), state=SwiftSubmission.SUBMITTING)
+    for submission in stale_submissions:
+        with transaction.atomic():
+            # (conditionally, in case the worker has just recorded the outcome after all)
+            if not (SwiftSubmission.objects.filter(pk=submission.pk, state=SwiftSubmission.SUBMITTING)
+                    .update(state=SwiftSubmission.FAILED,
+                            errors=['The submission stopped while the TOO request was being submitted; '
+                                    'it may or may not have been'])):
+                continue
+            submission.refresh_from_db()
+            _update_observation_record(submission)
+        logger.error(f'fail_stale_claims - {submission}: {submission.errors[0]}')
+        failed += 1
+    return failed
+
+
+def submit_queued(submission, facility=None, now=None):
+    """Submit the claimed (SUBMITTING) submission to Swift, and record the outcome."""
+    facility = facility or get_facility()
+    now = now or timezone.now()
+    submission.attempts += 1
+    try:
+        too = facility._configure_too(submission.payload)
+        facility.swift_api.submit(too)
+    except Exception as err:
+        # e.g. a payload that can no longer configure a TOO; trying again won't help
+        logger.error(f'submit_queued - {submission}: {err}')
+        too = None
+        submission.errors = [str(err)]
+    else:
+        submission.errors = [str(error) for error in too.status.errors]
+
+    if too is not None and too.status.status == 'Accepted':
+        submission.state = SwiftSubmission.SUBMITTED
+        submission.too_id = too.status.too_id
+        submission.submitted = now
+    elif too is not None and is_retryable(too) and \
+            submission.attempts < get_swift_setting('SUBMISSION_MAX_ATTEMPTS', SUBMISSION_MAX_ATTEMPTS):
+        submission.state = SwiftSubmission.QUEUED
+        submission.next_attempt = now + retry_delay(submission.attempts)
+    else:
+        submission.state = SwiftSubmission.FAILED
+
+    with transaction.atomic():
+        submission.save()
+        if submission.state != SwiftSubmission.QUEUED:
+            _update_observation_record(submission)
+    logger.info(f'submit_queued - {submission} after {submission.attempts} attempts; errors: {submission.errors}')
+    return submission
+
+
+def process_submission_queue(limit=None, facility=None, sleep=time.sleep) -> dict:
+    """Submit the queued TOOs that are due, the most urgent first, at most one every SUBMISSION_INTERVAL seconds.
+
+    Stops when the queue has nothing due, after limit submissions, or while the circuit breaker
+    says the Swift TOO API is failing (the TOOs stay queued). The queue is looked at again before
+    each submission, so a TOO queued meanwhile goes next if it is more urgent. First, the TOOs
+    left claimed by a worker that stopped are marked 'Failed' (see fail_stale_claims()).
+    Returns the number of submissions that were {'submitted', 'retrying', 'failed'}.
+    """
+    facility = facility or get_facility()
+    fail_stale_claims()
+    interval = get_swift_setting('SUBMISSION_INTERVAL', SUBMISSION_INTERVAL)
+    counts = {'submitted': 0, 'retrying': 0, 'failed': 0}
+    last_submission = None
+    while limit is None or sum(counts.values()) < limit:
+        if get_circuit_breaker().state == CircuitBreaker.OPEN:
+            logger.warning('process_submission_queue - the Swift TOO API has been failing; leaving the TOOs queued')
+            break
+        if last_submission is not None:
+            sleep(max(0.0, last_submission + interval - time.monotonic()))
+        submission = _claim_next_submission(timezone.now())
+        if submission is None:
+            break
+        last_submission = time.monotonic()
+        submission = submit_queued(submission, facility)
+        counts[{SwiftSubmission.SUBMITTED: 'submitted', SwiftSubmission.QUEUED: 'retrying'}
+               .get(submission.state, 'failed')] += 1
+    return counts
+
+
+def submission_queue_state(now=None) -> dict:
+    """Return the state of the submission queue: for each urgency, how many TOOs are queued,
+    how many of them are due, and when the next one is due.
+    """
+    now = now or timezone.now()
+    queue = {}
+    for submission in (SwiftSubmission.objects.filter(state=SwiftSubmission.QUEUED)
+                       .only('urgency', 'next_attempt').order_by('next_attempt')):
+        urgency_queue = queue.setdefault(submission.urgency,
+                                         {'queued': 0, 'due': 0, 'next_attempt': submission.next_attempt})
+        urgency_queue['queued'] += 1
+        if submission.next_attempt <= now:
+            urgency_queue['due'] += 1
+    return dict(sorted(queue.items()))
@@ -1,27 +1,50 @@
 import logging
+import os
+import tempfile
 
 from crispy_forms.layout import Layout, Div, Field
 from crispy_forms.bootstrap import Accordion, AccordionGroup
 from django import forms
+from django.conf import settings
+from django.core.files import File
+from django.urls import reverse
+from django.utils import timezone
 from django.utils.safestring import mark_safe
 
+from tom_common.hooks import run_hook
+from tom_dataproducts.models import DataProduct
+from tom_dataproducts.utils import create_image_dataproduct
 from tom_observations.facility import BaseObservationForm, BaseObservationFacility, get_service_class
+from tom_observations.models import ObservationRecord
 from tom_targets.models import Target
 
-from tom_swift import __version__
+from tom_swift import __version__, metrics, submission, timeline
+from tom_swift.async_api import run_in_swift_executor
+from tom_swift.tracing import dump, trace
+from tom_swift.cache import TTLCache
+from tom_swift.downloads import DOWNLOAD_WORKERS, download_files
+from tom_swift.store import DataFileStore, get_data_files
+from tom_swift.visibility import visibility_context
 from tom_swift.swift_api import (SwiftAPI,
+                                 SwiftAPIError,
+                                 SWIFT_FAILED_STATES,
                                  SWIFT_INSTRUMENT_CHOICES,
                                  SWIFT_OTHER_CHOICE,
+                                 SWIFT_PENDING_SUBMISSION_STATE,
                                  SWIFT_TARGET_CLASSIFICATION_CHOICES,
+                                 SWIFT_TERMINAL_STATES,
                                  SWIFT_URGENCY_CHOICES,
                                  SWIFT_XRT_MODE_CHOICES,
                                  SWIFT_UVOT_FILTER_MODE_CHOICES,
                                  get_grb_detector_choices,
                                  get_observation_type_choices,
-                                 get_monitoring_unit_choices,)
+                                 get_monitoring_unit_choices,
+                                 get_swift_setting,
+                                 swift_api_degraded,
+                                 too_fingerprint,
+                                 too_parameters_from_payload)
 
 logger = logging.getLogger(__name__)
-logger.setLevel(logging.DEBUG)
 
 #  TODO: re-consider (or remove?) assumption that all Layout instances have a group property
 #        (see tom_observations.view,py::get_form::L#255 and other layout methods of other
@@ -90,7 +113,7 @@ class SwiftObservationForm(BaseObservationForm):
     obs_type = forms.ChoiceField(
         required=True,
         label='Observation Type',
-        choices=get_observation_type_choices(),
+        choices=get_observation_type_choices,  # a callable, so the choices are computed on first use
         help_text='What is driving the exposure time?')
 
     #
@@ -121,7 +144,7 @@ class SwiftObservationForm(BaseObservationForm):
     grb_detector_choices = forms.ChoiceField(
         required=False,
         label='GRB Detector',
-        choices=get_grb_detector_choices(),
+        choices=get_grb_detector_choices,  # a callable, so the choices are computed on first use
     )
 
     grb_detector = forms.CharField(
@@ -186,7 +209,7 @@ class SwiftObservationForm(BaseObservationForm):
         initial=1)
     monitoring_units = forms.ChoiceField(
         required=False,
-        choices=get_monitoring_unit_choices(),
+        choices=get_monitoring_unit_choices,  # a callable, so the choices are computed on first use
     )
 
     #
@@ -385,14 +408,22 @@ class SwiftObservationForm(BaseObservationForm):
         This method is called by the view's form_valid() method.
         """
         # TODO: check validity of doc-string
-        super().is_valid()  # this adds cleaned_data to the form instance
-        logger.debug(f'SwiftObservationForm.is_valid -- cleaned_data: {self.cleaned_data}')
+        if not super().is_valid():  # this adds cleaned_data to the form instance
+            # the Swift_TOO can't be configured from incomplete cleaned_data, so don't try to validate it
+            logger.warning(f'Facility submission has errors {self._errors.as_data()}')
+            return False
+        dump(logger, 'SwiftObservationForm.is_valid', lambda: self.cleaned_data, what='cleaned_data')
 
         observation_payload = self.observation_payload()
-        logger.debug(f'SwiftObservationForm.is_valid -- observation_payload: {observation_payload}')
+        dump(logger, 'SwiftObservationForm.is_valid', lambda: observation_payload, what='observation_payload')
 
-        # BaseObservationForm.is_valid() says to make this call the Facility.validate_observation() method
-        observation_module = get_service_class(self.cleaned_data['facility'])
+        # BaseObservationForm.is_valid() says to make this call the Facility.validate_observation() method.
+        # Use the facility instance that the view gave the form (see BaseObservationForm.__init__()):
+        # it's the one the view will call submit_observation() on, and it will reuse the Swift_TOO
+        # configured and validated here.
+        observation_module = getattr(self, 'facility', None)
+        if observation_module is None:
+            observation_module = get_service_class(self.cleaned_data['facility'])()
 
         # validate_observation needs to return a list of (field, error) tuples
         # if the list is empty, then the observation is valid
@@ -402,11 +433,11 @@ class SwiftObservationForm(BaseObservationForm):
         # of the swifttoolkit.Swift_TOO object (unless we want to maintain a mapping between
         # the two). NB: field can be None.
         #
-        errors: [] = observation_module().validate_observation(observation_payload)
+        errors: [] = observation_module.validate_observation(observation_payload)
 
         if errors:
             self.add_error(None, errors)
-            logger.debug(f'SwiftObservationForm.is_valid -- errors: {errors}')
+            trace(logger, 'SwiftObservationForm.is_valid', errors=errors)
 
         if self._errors:
             logger.warning(f'Facility submission has errors {self._errors.as_data()}')
@@ -426,7 +457,14 @@ class SwiftObservationForm(BaseObservationForm):
         For Swift, since we're configuring a Swift_TOO object, the form.cleaned_data
         plus the target information should be sufficient. See _configure_too() for how
         the observation_payload is used to configure the TOO attributes.
+
+        The payload is made once per form: is_valid() and then the view's form_valid() both
+        ask for it, and this saves looking up the Target twice.
         """
+        payload = getattr(self, '_observation_payload', None)
+        if payload is not None:
+            return payload
+
         # At the moment it's unclear why the observation_payload needs to differ from
         # the form.cleaned_data...
         payload = self.cleaned_data.copy()  # copy() just to be safe
@@ -438,13 +476,21 @@ class SwiftObservationForm(BaseObservationForm):
         payload['ra'] = target.ra
         payload['dec'] = target.dec
 
+        self._observation_payload = payload
         return payload
 
 
 class SwiftFacility(BaseObservationFacility):
+    # how many validated Swift_TOOs to keep for submit_observation(), and for how long (seconds)
+    VALIDATED_TOO_CACHE_SIZE = 16
+    VALIDATED_TOO_CACHE_TTL = 15 * 60
+
     def __init__(self):
         super().__init__()
         self.swift_api = SwiftAPI()
+        # Swift_TOOs that validate_observation() has configured and validated, keyed by too_fingerprint().
+        # submit_observation() takes its Swift_TOO from here rather than configuring it again.
+        self._validated_toos = TTLCache(maxsize=self.VALIDATED_TOO_CACHE_SIZE, ttl=self.VALIDATED_TOO_CACHE_TTL)
 
     name = 'Swift'
     observation_types = [
@@ -464,7 +510,7 @@ class SwiftFacility(BaseObservationFacility):
         dictionary of context data to be added to the View's context
         """
         facility_context_data = super().get_facility_context_data(**kwargs)
-        logger.debug(f'get_facility_context_data -- kwargs: {kwargs}')
+        trace(logger, 'get_facility_context_data', kwargs=kwargs)
 
         # get the username from the SwiftAPI for the context
         username = self.swift_api.get_credentials()[0]  # returns (username, shared_secret)
@@ -473,17 +519,20 @@ class SwiftFacility(BaseObservationFacility):
             'username': username,
         }
 
-        # get the resolved target info from the SwiftAPI
+        # the template fetches the resolved target info from this URL (see tom_swift.views.TargetResolveView)
+        # after the page has rendered, so that the form is not held up by the Swift resolver
         target = kwargs['target']
-        resolved_target = self.swift_api.resolve_target(target)
-        if resolved_target:
-            new_context_data['resolver'] = resolved_target.resolver
-            new_context_data['resolved_target_name'] = resolved_target.name
-            new_context_data['resolved_target_ra'] = resolved_target.ra
-            new_context_data['resolved_target_dec'] = resolved_target.dec
-        else:
-            # TODO: display bootstrap warning alert
-            new_context_data['resolved_target_name'] = 'Target not resolved'
+        new_context_data['resolve_target_url'] = reverse('tom_swift:resolve-target', kwargs={'pk': target.id})
+
+        # whether the Swift TOO API has been failing (see swift_api.CircuitBreaker)
+        new_context_data['swift_api_degraded'] = swift_api_degraded()
+
+        # when Swift can observe the target (see tom_swift.visibility), if that's cached; if not, it's
+        # computed after the page has rendered, along with the TOOs recently requested for the target
+        # (see tom_swift.mirror) and Swift's timeline of it (see tom_swift.timeline), which need queries:
+        # the template fetches them from this URL (see tom_swift.views.TargetSwiftContextView)
+        new_context_data.update(visibility_context(target, cached_only=True))
+        new_context_data['swift_context_url'] = reverse('tom_swift:target-swift-context', kwargs={'pk': target.id})
 
         facility_context_data.update(new_context_data)
         return facility_context_data
@@ -493,24 +542,145 @@ class SwiftFacility(BaseObservationFacility):
 
     def all_data_products(self, observation_record):
         data_products = super().all_data_products(observation_record)
-        logger.debug(f'all_data_products: {data_products}')
+        dump(logger, 'all_data_products', lambda: data_products)
         # TODO: right now we just extend this to log a debug message. So remove this
         #  and just let the super class method handle it, when we're finished developing.
         return data_products
 
     def data_products(self, observation_id, product_id=None):
-        logger.debug('data_products')
-        # TODO: how do we get data products from Swift?
-        return []
+        """Return the data files of the observations made for the Swift TOO whose too_id is observation_id
+        (or just the one whose id is product_id).
 
-    def get_observation_status(self):
-        logger.debug('get_observation_status')
-        raise NotImplementedError('SwiftFacility.get_observation_status not yet implemented')
+        See SwiftAPI.get_too_data_files() for where the files come from. They are listed from the
+        index of tom_swift.store, unless it's time to list them again (see the LISTING_TTL setting)
+        and the Swift timeline of the target has observations that aren't listed (see tom_swift.timeline).
+        """
+        trace(logger, 'data_products', observation_id=observation_id, product_id=product_id)
+        return [{
+            'id': data_file.product_id,
+            'filename': data_file.filename,
+            'created': data_file.begin,
+            'url': data_file.url,
+            'data': data_file.url,  # the template links to the unsaved data products with this
+        } for data_file in self._data_files(observation_id, product_id)]
+
+    def _data_files(self, observation_id, product_id=None):
+        """Return the (indexed) SwiftDataFiles of the Swift TOO whose too_id is observation_id
+        (or just the one whose product_id is product_id)."""
+        # the observations made since the TOO was requested, by the (local) as-flown timeline of its target
+        record = (ObservationRecord.objects.filter(facility=self.name, observation_id=observation_id)
+                  .select_related('target').first())
+        observed_obsids = timeline.observed_obsids(record.target, record.created) if record is not None else None
+        try:
+            data_files = get_data_files(int(observation_id), self.swift_api, observed_obsids=observed_obsids)
+        except (TypeError, ValueError):
+            return []  # e.g. a submission that was not accepted has observation_id 'None'
+        except SwiftAPIError as err:
+            logger.error(f'data_products - {err}')
+            return []
+        return [data_file for data_file in data_files if product_id is None or data_file.product_id == product_id]
+
+    def save_data_products(self, observation_record, product_id=None):
+        """Save the data products of the observation_record (or just the one whose id is product_id)
+        as DataProducts, and return them.
+
+        ObservationRecord.save_data() and the DataProductSaveView call this. The data files come from
+        the local store (see tom_swift.store) if they are there. Otherwise, rather than reading each
+        file into memory, the files are streamed to the DOWNLOAD_DIR a chunk at a time, several at once
+        (see tom_swift.downloads), and added to the store. Each is then saved to the DataProduct's
+        storage from the store. A download that fails is resumed the next time its data product is saved.
+        """
+        data_files = self._data_files(observation_record.observation_id, product_id)
+        download_dir = os.path.join(get_swift_setting('DOWNLOAD_DIR', os.path.join(tempfile.gettempdir(), 'tom_swift')),
+                                    str(observation_record.id))
+        store = DataFileStore()
+
+        saved_products = []
+        stored_products = []  # (DataProduct, SwiftDataFile, path in the store)
+        unstored_products = {}  # download path -> (DataProduct, SwiftDataFile, whether this made the DataProduct)
+        for data_file in data_files:
+            # DataProduct product_ids are unique, so a data file shared by overlapping TOOs is saved
+            # (as a DataProduct of the first ObservationRecord to save it) only once
+            data_product, created = DataProduct.objects.get_or_create(
+                product_id=data_file.product_id,
+                defaults={'target': observation_record.target, 'observation_record': observation_record})
+            if data_product.data:
+                saved_products.append(data_product)
+            elif stored_path := store.get(data_file):
+                stored_products.append((data_product, data_file, stored_path))
+            else:
+                download_path = os.path.join(download_dir, data_file.product_id)
+                unstored_products[download_path] = (data_product, data_file, created)
+
+        downloads = self._download([(data_file.url, path) for path, (_, data_file, _) in unstored_products.items()])
+        for download in downloads:
+            data_product, data_file, created = unstored_products[download.path]
+            if not download.ok:
+                # leave it unsaved, to be tried again (and if this didn't create it, it isn't ours to delete)
+                if created:
+                    data_product.delete()
+                continue
+            stored_products.append((data_product, data_file, store.add(data_file, download.path)))
+
+        for data_product, data_file, stored_path in stored_products:
+            with open(stored_path, 'rb') as stored_file:
+                data_product.data.save(data_file.filename, File(stored_file))  # saves the DataProduct, too
+            logger.info(f'Saved new dataproduct: {data_product.data}')
+            saved_products.append(data_product)
+        store.evict()
+
+        if getattr(settings, 'AUTO_THUMBNAILS', False):
+            for data_product in saved_products:
+                create_image_dataproduct(data_product)
+                data_product.get_preview()
+        return saved_products
+
+    def _download(self, downloads):
+        """Download each (url, path) in downloads, from the DOWNLOAD_BACKEND, and return their
+        tom_swift.downloads.Downloads.
+
+        The 'http' backend (the default) downloads from the Swift data archives over HTTP (see
+        tom_swift.downloads). The 's3' backend downloads the HEASARC archive files from its S3
+        mirror (or an S3_ENDPOINT_URL standing in for it), which is much faster for bulk downloads
+        (see tom_swift.s3).
+        """
+        backend = get_swift_setting('DOWNLOAD_BACKEND', 'http')
+        if backend == 's3':
+            from tom_swift import s3  # boto3 is slow to import, so only import it if it is used
+            return s3.download_s3_files(downloads,
+                                        bucket=get_swift_setting('S3_BUCKET', s3.HEASARC_BUCKET),
+                                        max_concurrency=get_swift_setting('S3_MAX_CONCURRENCY', s3.S3_MAX_CONCURRENCY),
+                                        endpoint_url=get_swift_setting('S3_ENDPOINT_URL'),
+                                        region_name=get_swift_setting('S3_REGION', s3.HEASARC_REGION),
+                                        unsigned=get_swift_setting('S3_UNSIGNED', True))
+        if backend != 'http':
+            logger.error(f"_download - unknown DOWNLOAD_BACKEND {backend!r}; using 'http'")
+        return download_files(downloads, max_workers=get_swift_setting('DOWNLOAD_WORKERS', DOWNLOAD_WORKERS))
+
+    def get_observation_status(self, observation_id):
+        """Return the status of the Swift TOO whose too_id is observation_id.
+
+        The returned dictionary has state, scheduled_start, and scheduled_end keys. The status
+        of a TOO that the local mirror and timeline know to be finished comes from them (see
+        timeline.local_too_request_status()); otherwise, the Swift TOO API is asked for it.
+        To update many ObservationRecords, use update_all_observation_statuses(), which asks
+        for all of their statuses at once.
+        """
+        trace(logger, 'get_observation_status', observation_id=observation_id)
+        if submission.is_queued_observation_id(observation_id):
+            return {'state': SWIFT_PENDING_SUBMISSION_STATE, 'scheduled_start': None, 'scheduled_end': None}
+        record = (ObservationRecord.objects.filter(facility=self.name, observation_id=observation_id)
+                  .select_related('target').first())
+        status = timeline.local_too_request_status(int(observation_id), record.target) if record else None
+        if status is not None:
+            trace(logger, 'get_observation_status', observation_id=observation_id, local=True)
+            return status
+        return self.swift_api.get_too_request_status(int(observation_id))
 
     def get_observation_url(self, observation_id):
         """
         """
-        logger.debug('get_observation_url')
+        trace(logger, 'get_observation_url')
         return 'SwiftFacility.get_observation_url()'
 
     def get_observing_sites(self):
@@ -518,198 +688,47 @@ class SwiftFacility(BaseObservationFacility):
         to be used for target visibility window calculations. See, for example,
         tom_base/tom_observations/facilities/ocs.py::OCSSettings.get_sites()
 
-        Swift is entirely different. Just return and empty dict for now.
+        Swift is entirely different: its visibility depends on where the Sun, Moon, and Earth
+        are, not on airmass at a site. So this returns an empty dict (which keeps Swift out of
+        the TOM's airmass plots) and Swift's visibility windows come from tom_swift.visibility
+        (and are shown on the observation form and the Swift Visibility target detail tab).
         """
-        logger.debug('get_observing_sites')
+        trace(logger, 'get_observing_sites')
         return {}
 
     def get_terminal_observing_states(self):
-        """
+        """Return the ObservationRecord states from which a Swift TOO will not change.
+
+        See swift_api.too_request_status() for where the states come from.
         """
         # super().get_terminal_observing_states() returns None
-        # TODO: this just a made-up list of states. Find out what the real states are.
-        terminal_states = ['Completed', 'Failed', 'Canceled']
+        return SWIFT_TERMINAL_STATES
 
-        logger.warning(f'get_terminal_observing_states - (FAKE!) terminal_states: {terminal_states}')
-
-        return terminal_states
+    def get_failed_observing_states(self):
+        return SWIFT_FAILED_STATES
 
     def _configure_too(self, observation_payload):
-        """In preparation for calls to self.swift_api.too.validate() and self.swift_api.too.submit(),
-        both validate_observation() and submit_observation() call this method to
-        configure the Swift_TOO object (self.too) from the observation_payload.
+        """Return a new Swift_TOO configured from the observation_payload, ready for its
+        validate() or submit() method to be called.
+
+        Both validate_observation() and submit_observation() call this method. Each call
+        returns a new Swift_TOO (see swift_api.too_parameters_from_payload() for how the
+        observation_payload becomes the TOO attributes), so nothing is shared between
+        requests and one SwiftFacility can safely handle concurrent requests.
 
         For this Facility, the observation_payload is the serialized form.cleaned_data
         plus the target information (which doesn't come from the form).
         See SwiftObservationForm.observation_payload() for details.
-
-        Reference Documentation:
-         * https://www.swift.psu.edu/too_api/
-         * https://www.swift.psu.edu/too_api/index.php?md=TOO parameters.md
         """
-        self.swift_api.too.debug = observation_payload['debug']
-
-        #
-        # User identification
-        #
-        self.swift_api.too.username, self.swift_api.too.shared_secret = self.swift_api.get_credentials()
-
-        #
-        # Source name, type, location, position_error
-        #
-        self.swift_api.too.source_name = observation_payload['source_name']
-        self.swift_api.too.ra = observation_payload['ra']
-        self.swift_api.too.dec = observation_payload['dec']
-        self.swift_api.too.poserr = observation_payload['poserr']
-
-        # Get the source_type from target_classification_choices or target_classification
-        # depending on if they selected "Other (please specify)" in the drop-down menu
-        if observation_payload['target_classification_choices'] == SWIFT_OTHER_CHOICE:
-            # they specified a custom target classification. So, use that.
-            self.swift_api.too.source_type = observation_payload['target_classification']
-        else:
-            # use the value from the drop-down menu
-            self.swift_api.too.source_type = observation_payload['target_classification_choices']
-
-        #
-        # TOO Request details
-        #
-        self.swift_api.too.instrument = observation_payload['instrument']
-        self.swift_api.too.urgency = observation_payload['urgency']
-
-        #
-        # Observation Type
-        #     What is driving the exposure time? (Spectroscopy, Light Curve, Position, Timing)
-        self.swift_api.too.obs_type = observation_payload['obs_type']
-
-        #
-        # Description of the source brightness for various instruments
-        #
-        # Object Brightness
-        self.swift_api.too.opt_mag = observation_payload['optical_magnitude']
-        self.swift_api.too.opt_filt = observation_payload['optical_filter']
-        self.swift_api.too.xrt_countrate = observation_payload['xrt_countrate']  # counts/second
-        self.swift_api.too.bat_countrate = observation_payload['bat_countrate']  # counts/second
-        self.swift_api.too.other_brightness = observation_payload['other_brightness']
-        # TODO: validation - answer at least one of these questions
-
-        #
-        # GRB stuff
-        #
-        # If they specified GRB for the target_classification,
-        #     then set the grb_detector and grb_triggertime.
-        # And, if they specified SWIFT_OTHER_CHOICE for the GRB detector,
-        #     then set grb_detector from their text.
-        #
-        if observation_payload['target_classification_choices'] == 'GRB':
-            self.swift_api.too.grb_triggertime = observation_payload['grb_triggertime']
-            if observation_payload['grb_detector_choices'] == SWIFT_OTHER_CHOICE:
-                # they specified a custom GRB detector. So, use that.
-                self.swift_api.too.grb_detector = observation_payload['grb_detector']
-            else:
-                self.swift_api.too.grb_detector = observation_payload['grb_detector_choices']
-
-        #
-        # Science Justification
-        #
-        self.swift_api.too.immediate_objective = observation_payload['immediate_objective']
-        self.swift_api.too.science_just = observation_payload['science_just']
-
-        #
-        # Exposure requested time (total)
-        #
-        self.swift_api.too.exposure = observation_payload['exposure']
-        self.swift_api.too.exp_time_just = observation_payload['exp_time_just']
-
-        #
-        # Monitoring requests
-        #
-        self.swift_api.too.num_of_visits = observation_payload['num_of_visits']  # use assignment expression?
-        if self.swift_api.too.num_of_visits > 1:
-            self.swift_api.too.exp_time_per_visit = observation_payload['exp_time_per_visit']
-            # construct monitoring_freq from monitoring_freq and monitoring_units e.g '1 hour'
-            self.swift_api.too.monitoring_freq = f"{observation_payload['monitoring_freq']} " \
-                                                 f"{observation_payload['monitoring_units']}"
-        else:
-            self.swift_api.too.exp_time_per_visit = None
-            self.swift_api.too.monitoring_freq = None
-
-        #
-        # Swift Guest Investigator program parameters
-        #
-        # TODO: Guest InvestigatorI Program Support
-        # Are you triggering a GI program? (yes/no)
-        # if yes, then
-        #   GI Program Details: Proposal ID; Proposal PI; Trigger Justification
-        # Since "this will count against the number of awarded triggers", show
-        # triggers used / total number triggers awarded. (and trigger remaining?)..
-        if observation_payload['proposal']:
-            # this is a Swift Guest Investigator request, so set it's too attributes
-            self.swift_api.too.proposal = observation_payload['proposal']
-            self.swift_api.too.proposal_id = observation_payload['proposal_id']
-            self.swift_api.too.proposal_pi = observation_payload['proposal_pi']
-            self.swift_api.too.proposal_trigger_just = observation_payload['proposal_trigger_just']
-        else:
-            # just in case there are previously set attributes lingering in the TOO, reset them
-            self.swift_api.too.proposal = False
-            self.swift_api.too.proposal_id = None
-            self.swift_api.too.proposal_pi = None
-            self.swift_api.too.proposal_trigger_just = None
-
-        #
-        # Instrument mode
-        #
-        # self.swift_api.too.instrument is set above in the TOO Request details section
-        # Set and unset too.attributes according to the instrument selected.
-        if self.swift_api.too.instrument == 'BAT':
-            # not sure what to do here!  TODO: find out
-            self.swift_api.too.xrt_mode = None
-            self.swift_api.too.uvot_mode = None
-            self.swift_api.too.uvot_just = None
-        elif self.swift_api.too.instrument == 'UVOT':
-            self.swift_api.too.uvot_just = observation_payload['uvot_just']
-            self.swift_api.too.xrt_mode = None
-            if observation_payload['uvot_mode_choices'] == SWIFT_OTHER_CHOICE:
-                # use the value from the uvot_mode text field
-                self.swift_api.too.uvot_mode = observation_payload['uvot_mode']
-            else:
-                # use the value from the drop-down menu
-                self.swift_api.too.uvot_mode = observation_payload['uvot_mode_choices']
-        else:
-            # XRT mode
-            self.swift_api.too.xrt_mode = observation_payload['xrt_mode']
-            self.swift_api.too.uvot_mode = None
-            self.swift_api.too.uvot_just = None
-
-        # WARNING: Setting too.slew_in_place to False causes a timeout error in too.server_validate() !!!
-        if observation_payload['slew_in_place']:
-            self.swift_api.too.slew_in_place = observation_payload['slew_in_place']
-        else:
-            self.swift_api.too.slew_in_place = None  # do NOT slew_in_place to False!!!
-
-        #
-        # Tiling request
-        #
-        if observation_payload['tiling']:
-            # this is a tiling request to set tiling too attributes
-            self.swift_api.too.tiling = observation_payload['tiling']
-            self.swift_api.too.number_of_tiles = observation_payload['number_of_tiles']
-            self.swift_api.too.exposure_time_per_tile = observation_payload['exposure_time_per_tile']
-            # TODO: validation, if exposure_time_per_tile is unset, position_error should be set
-            self.swift_api.too.tiling_justification = observation_payload['tiling_justification']
-        else:
-            # just in case there are previously set attributes lingering in the TOO, reset them
-            self.swift_api.too.tiling = False
-            self.swift_api.too.number_of_tiles = None
-            self.swift_api.too.exposure_time_per_tile = None
-            self.swift_api.too.tiling_justification = None
+        too = self.swift_api.new_too(self._too_parameters(observation_payload))
 
-        #
-        # Debug parameter
-        #
-        self.swift_api.too.debug = observation_payload['debug']
+        dump(logger, 'SwiftFacility._configure_too', lambda: too, source_name=too.source_name)
+        return too
 
-        logger.info(f'SwiftFacility._configure_too - configured too:\n{self.swift_api.too}')
+    def _too_parameters(self, observation_payload):
+        """Return the Swift_TOO attributes for the observation_payload (see too_parameters_from_payload())."""
+        username, shared_secret = self.swift_api.get_credentials()
+        return too_parameters_from_payload(observation_payload, username, shared_secret)
 
     def validate_observation(self, observation_payload) -> []:
         """Perform a dry-run of submitting the observation.
@@ -718,25 +737,27 @@ class SwiftFacility(BaseObservationFacility):
 
         The super class method is absract. No need to call it.
         """
-        self._configure_too(observation_payload)
+        fingerprint = too_fingerprint(self._too_parameters(observation_payload))
+        too = self._configure_too(observation_payload)
 
         validation_errors = []
         # first, validate the too locally
-        logger.debug(f'validate_observation - calling too.validate():\n{self.swift_api.too}')
-        too_is_valid = self.swift_api.too.validate()
-        logger.debug(f'validate_observation response: {too_is_valid}')
+        with metrics.timed('validate_local', urgency=too.urgency, instrument=too.instrument):
+            too_is_valid = too.validate()
+        trace(logger, 'validate_observation', too_is_valid=too_is_valid)
 
         if too_is_valid:
             # if the TOO was internally valid, now validate with the server
-            logger.debug('validate_observation - calling too.server_validate()')
-            too_is_server_valid = self.swift_api.too.server_validate()
+            # (unless the server has recently validated an identical TOO; see SwiftAPI.server_validate())
+            too_is_server_valid = self.swift_api.server_validate(too, fingerprint)
 
         if not (too_is_valid and too_is_server_valid):
-            logger.debug(f'validate_observation - too.status.status: {self.swift_api.too.status.status}')
-            logger.debug(f'validate_observation - too.status.errors: {self.swift_api.too.status.errors}')
-            logger.debug(f'validate_observation - type(too.status.errors): {type(self.swift_api.too.status.errors)}')
+            trace(logger, 'validate_observation', status=too.status.status, errors=too.status.errors)
 
-            validation_errors = self.swift_api.too.status.errors
+            validation_errors = too.status.errors
+        else:
+            # keep the validated Swift_TOO for submit_observation()
+            self._validated_toos.set(fingerprint, too)
 
         return validation_errors
 
@@ -747,25 +768,35 @@ class SwiftFacility(BaseObservationFacility):
 
         For the SwiftFacility, submitting (or validating) an observation request means
         instantiating a Swift_TOO object, setting it properties from the observation_payload,
-        and calling its submit() (or validate()) method. self.too is the Swift_TOO object, whose
-        properties we need to set.
+        and calling its submit() (or validate()) method. See _configure_too().
 
         returns a list of (field, error) tuples if the observation is invalid
 
         See https://www.swift.psu.edu/too_api/ for documentation.
 
+        If validate_observation() has already validated this observation_payload (as it does
+        when the form is submitted), its Swift_TOO is submitted as-is, rather than configuring
+        a new one. (Swift_TOO.submit() re-runs the local validation before it submits.)
+
         The super class method is absract. No need to call it.
+
+        With the SUBMISSION_QUEUE setting on, the observation is put in the submission queue
+        instead, and its placeholder observation_id is returned (see tom_swift.submission).
          """
-        self._configure_too(observation_payload)
+        too = self._validated_toos.pop(too_fingerprint(self._too_parameters(observation_payload)))
+        if submission.submission_queue_enabled():
+            # the queue submits a Swift_TOO of its own, later, so the validated one isn't wanted
+            return [submission.enqueue_submission(observation_payload)]
 
-        logger.debug('calling too.submit()')
-        self.swift_api.too.submit()
-        logger.debug('too.submit() returned')
+        if too is None:
+            too = self._configure_too(observation_payload)
+        else:
+            trace(logger, 'submit_observation', too='configured by validate_observation()')
 
-        logger.info(f'submit_observation - too.status.status: {self.swift_api.too.status.status}')
-        logger.info(f'submit_observation - too.status.errors: {self.swift_api.too.status.errors}')
+        self.swift_api.submit(too)  # see SwiftAPI.submit() for what happens if the Swift TOO API is unavailable
 
-        logger.debug(f'submit_observation - too.status: {self.swift_api.too.status}')
+        trace(logger, 'submit_observation', level=logging.INFO, status=too.status.status, errors=too.status.errors)
+        dump(logger, 'submit_observation', lambda: too.status, what='too.status')
 
         #  too_status_properties_removed = [
         #    'clear', 'submit', 'jwt', 'queue',
@@ -778,34 +809,108 @@ class SwiftFacility(BaseObservationFacility):
         #                         'too_api_dict', 'too_id', 'username', 'warnings']
         #
         #  for property in too_status_properties:
-        #    logger.debug(f'submit_observation - too.status.{property}: {getattr(self.swift_api.too.status, property)}')
+        #    logger.debug(f'submit_observation - too.status.{property}: {getattr(too.status, property)}')
 
         too_id = None
-        if self.swift_api.too.status.status == 'Accepted':
-            too_id = self.swift_api.too.status.too_id
+        if too.status.status == 'Accepted':
+            too_id = too.status.too_id
             # this was a successful submission
-            logger.info(f'submit_observation - too.status.status: {self.swift_api.too.status.status}')
-            logger.info(f'submit_observation - too_id: {too_id}')
+            trace(logger, 'submit_observation', level=logging.INFO, too_id=too_id)
 
             # let's examine the TOO created
             # see https://www.swift.psu.edu/too_api/index.php?md=Swift TOO Request Example Notebook.ipynb
 
-            if self.swift_api.too.debug:
+            if too.debug:
                 # this was a debug submission and thus, no TOO was made and
                 # the too_id returned in the too.status points to nothing.
                 logger.warning(f'submit_observation - DEBUG submission - too_id: {too_id} is not real.')
         else:
-            logger.error(f'submit_observation - too.status.status: {self.swift_api.too.status.status}')
+            logger.error(f'submit_observation - too.status.status: {too.status.status}')
 
         # TODO: remove this -- it is only for debugging/development
-        #  self.swift_api.too.status.too_id = 19529 #  an actual NCG1566 TOO
+        #  too.status.too_id = 19529 #  an actual NCG1566 TOO
 
         return [too_id]
 
-    def update_all_observation_statuses(self, target):
-        """This would normaly be implemented by BaseRoboticObservationFacility, but that's
-        not one of our super classes. So, for now, we have a stub implementation here.
+    async def avalidate_observation(self, observation_payload) -> []:
+        """Await validate_observation(), run in tom_swift's Swift TOO API threads (see tom_swift.async_api).
+
+        For ASGI views: the event loop, and Django's sync thread, are free while the Swift TOO API answers.
+        """
+        return await run_in_swift_executor(self.validate_observation, observation_payload)
+
+    async def asubmit_observation(self, observation_payload) -> [()]:
+        """Await submit_observation(), run in tom_swift's Swift TOO API threads (see tom_swift.async_api)."""
+        return await run_in_swift_executor(self.submit_observation, observation_payload)
+
+    def update_all_observation_statuses(self, target=None):
+        """Update the status of every open Swift ObservationRecord (of the target, if one is given).
+
+        This would normally be implemented by BaseRoboticObservationFacility, which asks the
+        facility for the status of each record in turn. Instead, the statuses of all the records
+        come from a single Swift TOORequests query (see SwiftAPI.get_too_request_statuses()), and
+        the records whose status has changed are saved with a single bulk update.
+
+        Returns a list of (observation_id, error) tuples for the records that couldn't be updated.
+        """
+        records = ObservationRecord.objects.filter(facility=self.name)
+        if target:
+            records = records.filter(target=target)
+        records = records.exclude(status__in=self.get_terminal_observing_states())
+        return self.update_observation_statuses(records)
+
+    def update_observation_statuses(self, records):
+        """Update the status of the given Swift ObservationRecords, from a single TOORequests query.
+
+        The records are updated in place, and those whose status has changed are saved with a
+        single bulk update. (tom_swift.polling uses this to update the records that are due.)
+
+        Returns a list of (observation_id, error) tuples for the records that couldn't be updated.
         """
-        failed_records = []
-        logger.warning(f'Swift Facility - update_all_observation_statuses not implemented yet. target: {target}')
-        return failed_records
+        records_by_too_id = {}
+        for record in records:
+            try:
+                records_by_too_id.setdefault(int(record.observation_id), []).append(record)
+            except (TypeError, ValueError):
+                # e.g. a submission that was not accepted has observation_id 'None'
+                trace(logger, 'update_observation_statuses', skipped_observation_id=record.observation_id)
+        if not records_by_too_id:
+            return []
+
+        since = min(record.created for too_records in records_by_too_id.values() for record in too_records)
+        try:
+            statuses = self.swift_api.get_too_request_statuses(records_by_too_id.keys(), since)
+        except SwiftAPIError as err:
+            logger.error(f'update_observation_statuses - {err}')
+            return [(record.observation_id, str(err))
+                    for too_records in records_by_too_id.values() for record in too_records]
+
+        changed_records = []  # (record, previous status)
+        now = timezone.now()
+        for too_id, too_records in records_by_too_id.items():
+            status = statuses.get(too_id)
+            if status is None:
+                # e.g. the fake too_id of a debug submission
+                trace(logger, 'update_observation_statuses', too_id=too_id, found=False)
+                continue
+            for record in too_records:
+                if (record.status, record.scheduled_start, record.scheduled_end) == \
+                        (status['state'], status['scheduled_start'], status['scheduled_end']):
+                    continue
+                changed_records.append((record, record.status))
+                record.status = status['state']
+                record.scheduled_start = status['scheduled_start']
+                record.scheduled_end = status['scheduled_end']
+                record.modified = now  # bulk_update() doesn't update auto_now fields
+
+        if changed_records:
+            ObservationRecord.objects.bulk_update([record for record, _ in changed_records],
+                                                  ['status', 'scheduled_start', 'scheduled_end', 'modified'])
+            # bulk_update() doesn't call ObservationRecord.save(), which would run this hook
+            for record, previous_status in changed_records:
+                if record.status != previous_status:
+                    run_hook('observation_change_state', record, previous_status)
+        logger.info(f'update_observation_statuses - updated {len(changed_records)} of '
+                    f'{sum(len(too_records) for too_records in records_by_too_id.values())} records')
+
+        return []
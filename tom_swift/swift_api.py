@@ -8,20 +8,559 @@ Notes:
   - more
   - more notes
 """
+from contextlib import contextmanager
+from datetime import datetime, timedelta, timezone
+import functools
+import hashlib
+import json
 import logging
+import threading
+import time
+from types import MappingProxyType
+from typing import TYPE_CHECKING, Mapping, NamedTuple
 
 from django.conf import settings
+from django.core.cache import caches
 from django.core.exceptions import ImproperlyConfigured
+from django.core.signals import setting_changed
+from django.dispatch import receiver
 
-from requests.exceptions import ConnectionError
+import requests
+from requests.adapters import HTTPAdapter
 
-from swifttools.swift_too import TOO, TOORequests, Resolve
-from swifttools.swift_too.api_resolve import Swift_Resolve
+from tom_swift import metrics
+from tom_swift.cache import TTLCache
+from tom_swift.tracing import Lazy, dump, trace
 
-from tom_targets.models import Target
+if TYPE_CHECKING:
+    from tom_targets.models import Target
 
 logger = logging.getLogger(__name__)
-logger.setLevel(logging.INFO)
+
+
+class SwiftAPIError(Exception):
+    """The Swift TOO API did not give us what we asked for."""
+
+
+class SwiftAPIUnavailable(SwiftAPIError):
+    """The Swift TOO API could not be asked: it timed out, couldn't be reached, or has been failing.
+
+    See swift_api_call() and CircuitBreaker.
+    """
+
+
+def _swift_too():
+    """Return the swifttools.swift_too module, importing it on first use.
+
+    swifttools (and the astropy modules it imports) takes a noticeable fraction of a second
+    to import, and the TOM imports this module at startup in every worker and management
+    command, most of which never talk to Swift. So, don't import it until it's needed.
+    """
+    import swifttools.swift_too
+    _install_swift_session()
+    return swifttools.swift_too
+
+
+def get_swift_setting(key, default=None):
+    """Return an optional tom_swift setting from the settings.FACILITIES['SWIFT'] dictionary.
+
+    Unlike the credentials (see SwiftAPI.get_credentials()), these settings have sensible
+    defaults, so a missing key (or a missing 'SWIFT' dictionary) is not an error.
+    """
+    return getattr(settings, 'FACILITIES', {}).get('SWIFT', {}).get(key, default)
+
+
+#
+# HTTP session
+#
+# swifttools sends each Swift TOO API request with requests.get() or requests.post(), which
+# open a new connection (TLS handshake and all) for every request, and close it afterwards.
+# Instead, all of the Swift TOO API traffic of a process goes through one requests.Session,
+# whose pool of keep-alive connections is reused (TLS session and all) from one request to
+# the next. _swift_too() installs it into swifttools the first time swifttools is used.
+#
+# Settings (in settings.FACILITIES['SWIFT']):
+#   'HTTP_POOL_SIZE': connections kept alive to the Swift TOO API (default 10)
+#   'HTTP_TIMEOUT': (connect, read) timeout in seconds of each request (default (5, 60))
+#   'API_URL': URL to send Swift TOO API requests to instead of swifttools' own (e.g. a local stand-in
+#              for load testing; see benchmarks/fake_swift_server.py) (default None)
+#
+HTTP_POOL_SIZE = 10
+HTTP_TIMEOUT = (5, 60)
+
+_swift_session = None
+_swift_session_lock = threading.Lock()
+
+
+def get_swift_session() -> requests.Session:
+    """Return the process-wide requests.Session for the Swift TOO API (creating it if necessary).
+
+    requests.Sessions can be shared by threads: each request takes a connection from the pool
+    (or opens one, if they are all in use) and returns it when done.
+    """
+    global _swift_session
+    with _swift_session_lock:
+        if _swift_session is None:
+            pool_size = get_swift_setting('HTTP_POOL_SIZE', HTTP_POOL_SIZE)
+            session = requests.Session()
+            adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+            session.mount('https://', adapter)
+            session.mount('http://', adapter)
+            _swift_session = session
+    return _swift_session
+
+
+class _SessionRequests:
+    """Stands in for the requests module in swifttools, so that its requests use the Swift session.
+
+    Requests without a timeout are given the HTTP_TIMEOUT setting, so that a Swift TOO API that
+    has stopped responding can't hang a worker, and no request may outlast the timeout budget of
+    the operation it is part of (see swift_api_call()). Anything else is the requests module's.
+    """
+    def __init__(self, session: requests.Session, timeout):
+        self.session = session
+        self.timeout = timeout
+
+    def get(self, url, **kwargs):
+        kwargs['timeout'] = _budgeted_timeout(kwargs.get('timeout', self.timeout))
+        return self.session.get(url, **kwargs)
+
+    def post(self, url=None, **kwargs):
+        kwargs['timeout'] = _budgeted_timeout(kwargs.get('timeout', self.timeout))
+        return self.session.post(url, **kwargs)
+
+    def __getattr__(self, name):
+        return getattr(requests, name)
+
+
+def _install_swift_session():
+    """Make the swifttools modules that send requests send them with get_swift_session() (once),
+    to the API_URL setting (if it is set).
+    """
+    from swifttools.swift_too import api_common, swift_data
+    api_url = get_swift_setting('API_URL')
+    if api_url and api_common.API_URL != api_url:
+        logger.warning(f'Sending Swift TOO API requests to {api_url}, not {api_common.API_URL}')
+        api_common.API_URL = api_url
+    for module in (api_common, swift_data):
+        if not isinstance(module.requests, _SessionRequests):
+            timeout = get_swift_setting('HTTP_TIMEOUT', HTTP_TIMEOUT)
+            if isinstance(timeout, list):
+                timeout = tuple(timeout)
+            module.requests = _SessionRequests(get_swift_session(), timeout)
+
+
+#
+# Credentials
+#
+# The Swift TOO API has no sessions or access tokens to reuse: every request is a JWT signed
+# with the shared secret, whose claims are the request itself (see swifttools'
+# TOOAPI_Baseclass.jwt). What can be reused is the credentials: they are read from the
+# settings once per process, by get_swift_credentials(), rather than on every form render,
+# validation, submission and status query. They are read again if settings.FACILITIES changes
+# (e.g. with override_settings() in tests).
+#
+class SwiftCredentials(NamedTuple):
+    username: str
+    shared_secret: str
+
+
+_swift_credentials = None
+_swift_credentials_lock = threading.Lock()
+
+
+def get_swift_credentials() -> SwiftCredentials:
+    """Return the SwiftCredentials from settings.FACILITIES['SWIFT'] (reading them on first use).
+
+    Raises ImproperlyConfigured if there is no settings.FACILITIES['SWIFT'] dictionary.
+    """
+    global _swift_credentials
+    credentials = _swift_credentials
+    if credentials is None:
+        with _swift_credentials_lock:
+            if _swift_credentials is None:
+                try:
+                    swift_settings = settings.FACILITIES['SWIFT']
+                except (AttributeError, KeyError):
+                    logger.error("'SWIFT' configuration dictionary not defined in settings.FACILITIES")
+                    raise ImproperlyConfigured
+                _swift_credentials = SwiftCredentials(
+                    username=swift_settings.get('SWIFT_USERNAME', 'SWIFT_USERNAME not configured'),
+                    shared_secret=swift_settings.get('SWIFT_SHARED_SECRET', 'SWIFT_SHARED_SECRET not configured'))
+                trace(logger, 'get_swift_credentials', username=_swift_credentials.username)
+            credentials = _swift_credentials
+    return credentials
+
+
+@receiver(setting_changed)
+def _forget_swift_credentials(setting, **kwargs):
+    global _swift_credentials
+    if setting == 'FACILITIES':
+        _swift_credentials = None
+
+
+#
+# Timeout budgets and circuit breaker
+#
+# One Swift TOO API operation can be many HTTP requests: swifttools queues a job, then asks
+# whether it is done every second, for up to two minutes. So each operation (see
+# swift_api_call()) has a timeout budget, in seconds, that all of its requests share: once it
+# is spent, the next request raises requests.Timeout instead of being sent.
+#
+# When the Swift TOO API is failing (timing out, refusing connections, or returning errors),
+# there is no point holding a Django worker to ask it again. After CIRCUIT_BREAKER_THRESHOLD
+# failures in a row, the circuit breaker opens, and operations fail at once (with
+# SwiftAPIUnavailable) for CIRCUIT_BREAKER_RESET seconds. Then one trial operation is let
+# through: if it succeeds, the breaker closes again; if not, it stays open for another period.
+#
+# Settings (in settings.FACILITIES['SWIFT']):
+#   'API_TIMEOUTS': {operation: seconds} to override the API_TIMEOUTS budgets below
+#   'CIRCUIT_BREAKER_THRESHOLD': failures in a row that open the circuit breaker (default 5)
+#   'CIRCUIT_BREAKER_RESET': seconds the circuit breaker stays open before a trial operation (default 30)
+#
+API_TIMEOUTS = {
+    'resolve': 10,
+    'validate': 30,
+    'submit': 60,
+    'status': 30,
+    'data': 60,
+}
+CIRCUIT_BREAKER_THRESHOLD = 5
+CIRCUIT_BREAKER_RESET = 30
+
+_operation_deadline = threading.local()  # when the budget of this thread's operation runs out (time.monotonic())
+
+
+def _budgeted_timeout(timeout):
+    """Return the request timeout, cut down to what is left of the budget of the operation in progress.
+
+    Raises requests.Timeout if there is nothing left.
+    """
+    deadline = getattr(_operation_deadline, 'deadline', None)
+    if deadline is None:
+        return timeout
+    remaining = deadline - time.monotonic()
+    if remaining <= 0:
+        raise requests.Timeout('the timeout budget of the Swift TOO API operation is spent')
+    if timeout is None:
+        return remaining
+    if isinstance(timeout, tuple):
+        return tuple(remaining if part is None else min(part, remaining) for part in timeout)
+    return min(timeout, remaining)
+
+
+class CircuitBreaker:
+    """Counts the failures of the Swift TOO API operations and, after too many in a row, stops them for a while.
+
+    Thread-safe: one breaker is shared by all of the threads of a process (see get_circuit_breaker()).
+    """
+    CLOSED = 'closed'
+    OPEN = 'open'
+    HALF_OPEN = 'half-open'  # the reset period is over, and one trial operation is under way
+
+    def __init__(self, threshold=CIRCUIT_BREAKER_THRESHOLD, reset=CIRCUIT_BREAKER_RESET, timer=time.monotonic):
+        self.threshold = threshold
+        self.reset = reset
+        self.timer = timer
+        self._lock = threading.Lock()
+        self._failures = 0
+        self._opened = None  # when the breaker (last) opened
+        self._trial = None  # the thread (ident) whose trial operation is under way
+
+    @property
+    def state(self) -> str:
+        with self._lock:
+            return self._state()
+
+    def _state(self):
+        if self._opened is None:
+            return self.CLOSED
+        if self._trial is not None or self.timer() - self._opened >= self.reset:
+            return self.HALF_OPEN
+        return self.OPEN
+
+    def retry_after(self) -> float:
+        """Return how many seconds until the breaker lets a trial operation through (0 if it would now)."""
+        with self._lock:
+            if self._opened is None:
+                return 0.0
+            return max(0.0, self._opened + self.reset - self.timer())
+
+    def allow(self) -> bool:
+        """Return whether an operation may go ahead (if it may, record_success() or record_failure() it)."""
+        with self._lock:
+            state = self._state()
+            if state == self.CLOSED:
+                return True
+            if state == self.HALF_OPEN and self._trial is None:
+                self._trial = threading.get_ident()
+                return True
+            return False
+
+    def release(self):
+        """Give up the trial operation, if this thread has it, without counting it as a success or a failure."""
+        with self._lock:
+            if self._trial == threading.get_ident():
+                self._trial = None
+
+    def record_success(self):
+        with self._lock:
+            if self._opened is not None:
+                logger.info('CircuitBreaker: the Swift TOO API is responding again; closing the circuit breaker')
+            self._failures, self._opened, self._trial = 0, None, None
+
+    def record_failure(self):
+        with self._lock:
+            self._failures += 1
+            if self._trial is not None or (self._opened is None and self._failures >= self.threshold):
+                logger.warning(f'CircuitBreaker: {self._failures} Swift TOO API failures in a row; '
+                               f'opening the circuit breaker for {self.reset} seconds')
+                self._opened = self.timer()
+            self._trial = None
+
+
+_circuit_breaker = None
+
+
+def get_circuit_breaker() -> CircuitBreaker:
+    """Return the process-wide Swift TOO API circuit breaker (creating it if necessary)."""
+    global _circuit_breaker
+    if _circuit_breaker is None:
+        _circuit_breaker = CircuitBreaker(
+            threshold=get_swift_setting('CIRCUIT_BREAKER_THRESHOLD', CIRCUIT_BREAKER_THRESHOLD),
+            reset=get_swift_setting('CIRCUIT_BREAKER_RESET', CIRCUIT_BREAKER_RESET))
+    return _circuit_breaker
+
+
+def swift_api_degraded() -> bool:
+    """Return whether the circuit breaker is stopping (or trialling) Swift TOO API operations."""
+    return get_circuit_breaker().state != CircuitBreaker.CLOSED
+
+
+@contextmanager
+def swift_api_call(operation: str, urgency='', instrument=''):
+    """Run a Swift TOO API operation (one of the API_TIMEOUTS keys) within its timeout budget,
+    through the circuit breaker, and record it in tom_swift.metrics (labelled with the urgency
+    and instrument of the TOO, if the operation is about one).
+
+    Raises SwiftAPIUnavailable at once if the circuit breaker is open, and if the operation
+    raises a requests.RequestException (including running out of budget). Code in the block
+    should raise SwiftAPIUnavailable itself when the API answered, but with a failure (an HTTP
+    error, say) rather than an answer: that counts against the API too.
+    """
+    breaker = get_circuit_breaker()
+    if not breaker.allow():
+        metrics.record_call(operation, metrics.CIRCUIT_OPEN, 0.0, urgency=urgency, instrument=instrument)
+        raise SwiftAPIUnavailable(f'The Swift TOO API has been failing; not asking it to {operation} '
+                                  f'for another {breaker.retry_after():.0f} seconds')
+
+    budget = {**API_TIMEOUTS, **get_swift_setting('API_TIMEOUTS', {})}[operation]
+    outer_deadline = getattr(_operation_deadline, 'deadline', None)
+    deadline = time.monotonic() + budget
+    _operation_deadline.deadline = deadline if outer_deadline is None else min(deadline, outer_deadline)
+    start = time.monotonic()
+    outcome = metrics.ERROR
+    try:
+        yield
+        outcome = metrics.SUCCESS
+        breaker.record_success()
+    except requests.RequestException as err:
+        outcome = metrics.UNAVAILABLE
+        breaker.record_failure()
+        raise SwiftAPIUnavailable(f'The Swift TOO API could not {operation}: {err}') from err
+    except SwiftAPIUnavailable:
+        outcome = metrics.UNAVAILABLE
+        breaker.record_failure()
+        raise
+    except SwiftAPIError:
+        breaker.record_success()  # the API answered, with an error
+        raise
+    finally:
+        # anything else (a bug here, say, or a KeyboardInterrupt) is neither a success nor a failure of
+        # the API: it leaves the breaker as it was, but for giving up the trial operation, if this was it
+        breaker.release()
+        _operation_deadline.deadline = outer_deadline
+        metrics.record_call(operation, outcome, time.monotonic() - start, urgency=urgency, instrument=instrument)
+
+
+def _raise_if_unavailable(status, operation: str):
+    """Raise SwiftAPIUnavailable if the swifttools status has errors that mean the API failed to answer."""
+    errors = [error for error in status.errors if error.startswith(TRANSIENT_VALIDATION_ERRORS)]
+    if errors:
+        raise SwiftAPIUnavailable(f'The Swift TOO API could not {operation}: {"; ".join(errors)}')
+
+
+#
+# Target resolution cache
+#
+# Resolving a target name means a round trip to the Swift TOO API, and the observation
+# form resolves its target every time it is rendered. Resolved (and unresolved) names are
+# cached in-process and in the Django cache named by the RESOLVER_CACHE setting, so that
+# they survive restarts and are shared between worker processes.
+#
+# Settings (in settings.FACILITIES['SWIFT']):
+#   'RESOLVER_CACHE': Django cache alias to use, or None for in-process caching only (default 'default')
+#   'RESOLVER_CACHE_TTL': seconds to remember a resolved target (default 1 day)
+#   'RESOLVER_CACHE_NEGATIVE_TTL': seconds to remember that a target could not be resolved (default 10 minutes)
+#   'RESOLVER_CACHE_SIZE': maximum number of targets remembered in-process (default 512)
+#
+RESOLVER_CACHE_TTL = 24 * 60 * 60
+RESOLVER_CACHE_NEGATIVE_TTL = 10 * 60
+RESOLVER_CACHE_SIZE = 512
+
+_resolver_cache = None
+
+
+class ResolvedTarget(NamedTuple):
+    """The parts of a swifttools Swift_Resolve that we use (and cache)."""
+    name: str
+    ra: float
+    dec: float
+    resolver: str
+
+    @property
+    def is_resolved(self):
+        return self.ra is not None and self.dec is not None
+
+
+def normalize_target_name(name: str) -> str:
+    """Return the form of a target name used as the resolver cache key.
+
+    Case and runs of whitespace do not change what a name resolves to, so
+    'NGC 1566', 'ngc  1566' and ' NGC 1566 ' all share one cache entry.
+    """
+    return ' '.join(name.split()).casefold()
+
+
+def get_resolver_cache() -> TTLCache:
+    """Return the process-wide, in-memory target resolution cache (creating it if necessary)."""
+    global _resolver_cache
+    if _resolver_cache is None:
+        _resolver_cache = TTLCache(maxsize=get_swift_setting('RESOLVER_CACHE_SIZE', RESOLVER_CACHE_SIZE),
+                                   ttl=get_swift_setting('RESOLVER_CACHE_TTL', RESOLVER_CACHE_TTL))
+    return _resolver_cache
+
+
+def _get_shared_resolver_cache():
+    """Return the Django cache used to share resolved targets between processes (or None)."""
+    alias = get_swift_setting('RESOLVER_CACHE', 'default')
+    if alias is None:
+        return None
+    return caches[alias]
+
+
+#
+# Server validation cache
+#
+# When a user fixes one field of a form and validates (or submits) it again, only that
+# Swift_TOO changes. The outcomes of Swift_TOO.server_validate() are remembered (briefly)
+# by too_fingerprint(), so that validating an unchanged Swift_TOO again does not go back
+# to the Swift TOO API. Outcomes caused by failing to talk to the API are not remembered.
+#
+# Settings (in settings.FACILITIES['SWIFT']):
+#   'SERVER_VALIDATE_CACHE_TTL': seconds to remember a server validation outcome (default 5 minutes)
+#   'SERVER_VALIDATE_CACHE_SIZE': maximum number of outcomes remembered in-process (default 256)
+#
+SERVER_VALIDATE_CACHE_TTL = 5 * 60
+SERVER_VALIDATE_CACHE_SIZE = 256
+
+# swifttools Swift_TOO.status.errors that mean the API could not be reached (or did not answer)
+TRANSIENT_VALIDATION_ERRORS = (
+    'HTTP Submit failed',
+    'Failed to decode JSON',
+    'Queued job timed out',
+    'Failed to queue job',
+)
+
+_server_validate_cache = None
+
+
+class ServerValidation(NamedTuple):
+    """The outcome of a Swift_TOO.server_validate()"""
+    is_valid: bool
+    errors: tuple
+    warnings: tuple
+
+
+def get_server_validate_cache() -> TTLCache:
+    """Return the process-wide cache of server validation outcomes (creating it if necessary).
+
+    Its stats() method reports the cache hits and misses.
+    """
+    global _server_validate_cache
+    if _server_validate_cache is None:
+        _server_validate_cache = TTLCache(
+            maxsize=get_swift_setting('SERVER_VALIDATE_CACHE_SIZE', SERVER_VALIDATE_CACHE_SIZE),
+            ttl=get_swift_setting('SERVER_VALIDATE_CACHE_TTL', SERVER_VALIDATE_CACHE_TTL))
+    return _server_validate_cache
+
+
+#
+# TOO status
+#
+# The ObservationRecord.status of a Swift TOO comes from its TOO request (see too_request_status()):
+# 'Completed' once Swift considers the TOO done, otherwise the decision on the TOO (e.g. 'Approved'
+# or 'Rejected'), or 'Pending' until there is one. A TOO in the submission queue (see
+# tom_swift.submission) is 'Pending submission' until it is submitted (or 'Failed', if it can't be).
+#
+SWIFT_COMPLETED_STATE = 'Completed'
+SWIFT_PENDING_STATE = 'Pending'
+SWIFT_PENDING_SUBMISSION_STATE = 'Pending submission'
+SWIFT_FAILED_STATES = ['Rejected', 'Failed', 'Canceled']
+SWIFT_TERMINAL_STATES = [SWIFT_COMPLETED_STATE] + SWIFT_FAILED_STATES
+
+# maximum number of TOO requests to ask for in one TOORequests query
+# (settings.FACILITIES['SWIFT']['STATUS_QUERY_LIMIT'])
+STATUS_QUERY_LIMIT = 1000
+
+
+def as_utc(value):
+    """Return a swifttools (naive, UTC) datetime as a plain, timezone-aware datetime (or None)."""
+    if value is None:
+        return None
+    return datetime(value.year, value.month, value.day, value.hour, value.minute, value.second,
+                    value.microsecond, tzinfo=timezone.utc)
+
+
+def too_request_status(too_request) -> dict:
+    """Return the status of a swifttools Swift_TOO_Request (an entry of a TOORequests query).
+
+    The dictionary has the state, scheduled_start, and scheduled_end keys that
+    ObservationRecords are updated from.
+    """
+    if too_request.done:
+        state = SWIFT_COMPLETED_STATE
+    else:
+        state = too_request.decision or SWIFT_PENDING_STATE
+    return {
+        'state': state,
+        'scheduled_start': as_utc(too_request.date_begin),
+        'scheduled_end': as_utc(too_request.date_end),
+    }
+
+
+#
+# Data products
+#
+# The data of a TOO are the files of the observations (obsids) made of its Swift target.
+# They are listed by SwiftAPI.get_too_data_files() and downloaded by tom_swift.downloads.
+#
+# Settings (in settings.FACILITIES['SWIFT']):
+#   'DOWNLOAD_DIR': directory for downloads in progress (default: a tom_swift directory in the temporary directory)
+#   'DOWNLOAD_WORKERS': how many files of an observation to download at once (default 4)
+#
+class SwiftDataFile(NamedTuple):
+    """A data file of a Swift observation, as listed by the Swift TOO API's Swift_Data."""
+    obsid: str
+    begin: datetime  # of the observation
+    path: str  # e.g. '00012345001/xrt/event'
+    filename: str
+    url: str
+    type: str  # a description, e.g. 'Event file'
+
+    @property
+    def product_id(self):
+        return f'{self.path}/{self.filename}'
 
 
 class SwiftAPI:
@@ -31,45 +570,276 @@ class SwiftAPI:
     the SwiftFacility from the swifttools.swift_too classes.
     """
     def __init__(self, debug=True):
-        self.too = TOO()
-        self.too_request = TOORequests()
+        # NB: there are no shared swifttools objects here: see new_too(). That way, one SwiftAPI
+        # (and one SwiftFacility) can safely be used by concurrent requests, and making one
+        # doesn't import swifttools (see _swift_too()).
+        pass
+
+    def new_too(self, too_parameters: Mapping):
+        """Return a new swifttools Swift_TOO whose attributes are set from too_parameters.
+
+        too_parameters is typically made by too_parameters_from_payload(). Its items are set
+        in order, so that (for example) username is set before shared_secret.
+
+        Setting the source_name of a Swift_TOO normally makes swifttools resolve the name with
+        the Swift TOO API (uncached, and outside swift_api_call()). Here, it is set without that:
+        the ra and dec come from the Target. Only if they are missing is the name resolved, through
+        the target resolution cache (see resolve_name()).
+        """
+        too = _swift_too().TOO()
+        for attribute, value in too_parameters.items():
+            if attribute == 'source_name':
+                # what swifttools' TOOAPI_AutoResolve source_name setter does, less the Swift_Resolve
+                too._name = too._source_name = value
+            else:
+                setattr(too, attribute, value)
+
+        if too.source_name and (too.ra is None or too.dec is None):
+            resolved_target = self.resolve_name(too.source_name)
+            if resolved_target is not None:
+                too.ra, too.dec = resolved_target.ra, resolved_target.dec
+            else:
+                too.status.error('Could not resolve name.')  # as swifttools has it
+        return too
 
     def get_credentials(self) -> (str, str):
         """returns username and password from settings.py
 
         Use username and password to set the too.username and too.shared_secret respectively.
+        They are read from the settings once (see get_swift_credentials()).
+        """
+        return get_swift_credentials()
+
+    def get_too_request_statuses(self, too_ids, since: datetime) -> dict:
+        """Return {too_id: too_request_status()} for those of the too_ids submitted since the given time.
+
+        This makes one TOORequests query, for all of the TOO requests made since then, however
+        many too_ids there are. TOO requests that the query does not return (e.g. the fake too_ids
+        of debug submissions) are left out of the returned dictionary.
+        """
+        too_ids = set(too_ids)
+        username, shared_secret = self.get_credentials()
+        now = datetime.now(timezone.utc)
+        begin = min(since, now) - timedelta(days=1)  # allow for clock and time zone differences
+        limit = get_swift_setting('STATUS_QUERY_LIMIT', STATUS_QUERY_LIMIT)
+
+        with swift_api_call('status'):
+            too_requests = _swift_too().TOORequests(
+                username=username, shared_secret=shared_secret, detail=True,
+                begin=begin.astimezone(timezone.utc).replace(tzinfo=None),  # swifttools wants naive UTC
+                length=(now - begin).total_seconds() / 86400 + 1,
+                limit=limit,
+            )
+            _raise_if_unavailable(too_requests.status, 'status')
+        if too_requests.status.errors:
+            raise SwiftAPIError(f'TOORequests query failed: {too_requests.status.errors}')
+        if len(too_requests) >= limit:
+            logger.warning(f'get_too_request_statuses: TOORequests query returned {limit} (the limit) TOO requests;'
+                           f' some statuses may be missing. Consider raising STATUS_QUERY_LIMIT.')
+
+        return {entry.too_id: too_request_status(entry) for entry in too_requests if entry.too_id in too_ids}
+
+    def get_too_requests(self, begin: datetime, end: datetime, limit: int) -> list:
+        """Return the Swift_TOORequests (anyone's, without the details only their requesters may see)
+        made between begin and end, at most limit of them.
+        """
+        username, shared_secret = self.get_credentials()
+        with swift_api_call('status'):
+            too_requests = _swift_too().TOORequests(
+                username=username, shared_secret=shared_secret,
+                begin=begin.astimezone(timezone.utc).replace(tzinfo=None),  # swifttools wants naive UTC
+                length=(end - begin).total_seconds() / 86400,
+                limit=limit,
+            )
+            _raise_if_unavailable(too_requests.status, 'status')
+        if too_requests.status.errors:
+            raise SwiftAPIError(f'TOORequests query failed: {too_requests.status.errors}')
+        return list(too_requests)
+
+    def get_timeline(self, planned: bool, ra: float, dec: float, radius: float, begin: datetime, end: datetime):
+        """Return the observations in Swift's planned (PlanQuery) or as-flown (ObsQuery) science timeline
+        within radius degrees of (ra, dec), between begin and end, and when that timeline runs until.
+
+        The observations are swifttools Swift_PPSTEntries (or Swift_AFSTEntries). The as-flown
+        timeline is only complete up to when it runs until (its afstmax), and the plan (its ppstmax)
+        may be revised before then.
+        """
+        username, shared_secret = self.get_credentials()
+        query = _swift_too().PlanQuery if planned else _swift_too().ObsQuery
+        with swift_api_call('status'):
+            timeline = query(username=username, shared_secret=shared_secret, ra=ra, dec=dec, radius=radius,
+                             begin=begin.astimezone(timezone.utc).replace(tzinfo=None),  # swifttools wants naive UTC
+                             end=end.astimezone(timezone.utc).replace(tzinfo=None))
+            _raise_if_unavailable(timeline.status, 'status')
+        if timeline.status.errors:
+            raise SwiftAPIError(f'{"PlanQuery" if planned else "ObsQuery"} failed: {timeline.status.errors}')
+        runs_until = as_utc(timeline.ppstmax if planned else timeline.afstmax)
+        trace(logger, 'get_timeline', planned=planned, ra=ra, dec=dec, observations=len(timeline.entries),
+              runs_until=runs_until)
+        return list(timeline.entries), runs_until
+
+    def get_too_request(self, too_id: int):
+        """Return the (detailed) Swift_TOORequest with the given too_id."""
+        username, shared_secret = self.get_credentials()
+        with swift_api_call('status'):
+            too_requests = _swift_too().TOORequests(username=username, shared_secret=shared_secret,
+                                                    detail=True, too_id=too_id)
+            _raise_if_unavailable(too_requests.status, 'status')
+        if too_requests.status.errors:
+            raise SwiftAPIError(f'TOORequests query failed: {too_requests.status.errors}')
+        for entry in too_requests:
+            if entry.too_id == too_id:
+                return entry
+        raise SwiftAPIError(f'No Swift TOO request found with too_id {too_id}')
+
+    def get_too_request_status(self, too_id: int) -> dict:
+        """Return the too_request_status() of the TOO request with the given too_id."""
+        return too_request_status(self.get_too_request(too_id))
+
+    def get_too_data_files(self, too_id: int) -> list['SwiftDataFile']:
+        """Return the XRT, UVOT, and BAT data files of the observations made for the TOO request with too_id.
+
+        The TOO request gives its Swift target ID, the target ID gives the observations (obsids) made
+        of the target (from the As-Flown Science Timeline), and each observation gives its data files.
+        Only the list of files is fetched here; see tom_swift.downloads for downloading them.
+        """
+        target_id = self.get_too_request(too_id).target_id
+        if target_id is None:
+            return []  # the TOO request has not been assigned a target ID (yet)
+
+        username, shared_secret = self.get_credentials()
+        data_files = []
+        with swift_api_call('data'):
+            observations = _swift_too().ObsQuery(username=username, shared_secret=shared_secret, targetid=target_id)
+            _raise_if_unavailable(observations.status, 'data')
+            if observations.status.errors:
+                raise SwiftAPIError(f'ObsQuery for target ID {target_id} failed: {observations.status.errors}')
+
+            for obsid, observation in observations.observations.items():
+                data = _swift_too().Swift_Data(username=username, shared_secret=shared_secret, obsid=obsid,
+                                               xrt=True, uvot=True, bat=True, auxil=False, fetch=False, quiet=True)
+                _raise_if_unavailable(data.status, 'data')
+                if data.status.errors:
+                    # e.g. an observation that has not been processed yet
+                    logger.warning(f'get_too_data_files: no data for obsid {obsid}: {data.status.errors}')
+                    continue
+                data_files.extend(SwiftDataFile(obsid=obsid, begin=as_utc(observation.begin), path=entry.path,
+                                                filename=entry.filename, url=entry.url, type=entry.type)
+                                  for entry in data.entries)
+        trace(logger, 'get_too_data_files', too_id=too_id, data_files=len(data_files))
+        return data_files
+
+    def server_validate(self, too, fingerprint: str) -> bool:
+        """Return too.server_validate(), or the remembered outcome for an identical Swift_TOO.
+
+        fingerprint is the too_fingerprint() of the parameters the too was configured with.
+        When the outcome is remembered, the too.status errors and warnings are set from it,
+        just as if too.server_validate() had been called.
+
+        If the Swift TOO API is unavailable (see swift_api_call()), this returns False, and the
+        too.status errors say why.
         """
+        cache = get_server_validate_cache()
+        outcome = cache.get(fingerprint)
+        if outcome is not None:
+            trace(logger, 'server_validate', cached_outcome=outcome, cache_stats=Lazy(cache.stats))
+            too.status.errors = list(outcome.errors)
+            too.status.warnings = list(outcome.warnings)
+            return outcome.is_valid
+
+        outcome = None
         try:
-            username = settings.FACILITIES['SWIFT'].get('SWIFT_USERNAME', 'SWIFT_USERNAME not configured')
-            shared_secret = settings.FACILITIES['SWIFT'].get('SWIFT_SHARED_SECRET',
-                                                             'SWIFT_SHARED_SECRET not configured')
+            with swift_api_call('validate', urgency=too.urgency, instrument=too.instrument):
+                outcome = ServerValidation(is_valid=too.server_validate(),
+                                           errors=tuple(too.status.errors),
+                                           warnings=tuple(too.status.warnings))
+                _raise_if_unavailable(too.status, 'validate')
+        except SwiftAPIUnavailable as err:
+            # don't remember this outcome: the API didn't validate the TOO
+            logger.error(f'server_validate: {err}')
+            if outcome is None:
+                too.status.errors = [*too.status.errors, str(err)]
+            return False
+
+        cache.set(fingerprint, outcome)
+        trace(logger, 'server_validate', outcome=outcome, cache_stats=Lazy(cache.stats))
+        return outcome.is_valid
 
-            logger.info(f'swift username: {username}')
-        except KeyError:
-            logger.error("'SWIFT' configuration dictionary not defined in settings.FACILITIES")
-            raise ImproperlyConfigured
-        return username, shared_secret
+    def submit(self, too) -> bool:
+        """Submit the Swift_TOO, and return whether it was accepted.
 
-    def resolve_target(self, target: Target):
+        If the Swift TOO API is unavailable (see swift_api_call()), this returns False, and the
+        too.status errors say why. NB: if the budget ran out after the TOO was queued, the TOO
+        may yet be accepted.
         """
+        submitted = False
+        try:
+            with swift_api_call('submit', urgency=too.urgency, instrument=too.instrument):
+                too.submit()
+                submitted = True
+                _raise_if_unavailable(too.status, 'submit')
+        except SwiftAPIUnavailable as err:
+            logger.error(f'submit: {err}')
+            if not submitted:
+                too.status.errors = [*too.status.errors, str(err)]
+            return False
+        return too.status.status == 'Accepted'
+
+    def resolve_target(self, target: 'Target') -> ResolvedTarget:
+        """Return the Swift TOO API's resolution of the target name, or None if it could not be resolved.
+
+        Results (including "not resolved") are cached; see the target resolution cache above.
+        """
+        return self.resolve_name(target.name)
+
+    def resolve_name(self, name: str) -> ResolvedTarget:
+        """Return the Swift TOO API's resolution of the name, or None if it could not be resolved.
+
+        Results (including "not resolved") are cached; see the target resolution cache above.
         """
-        logger.info(f'resolve_target: {target.name}')
+        key = normalize_target_name(name)
+        local_cache = get_resolver_cache()
+        shared_cache = _get_shared_resolver_cache()
+        shared_key = 'tom_swift:resolve:' + hashlib.sha256(key.encode()).hexdigest()
 
+        resolved_target = local_cache.get(key)
+        if resolved_target is None and shared_cache is not None:
+            shared_entry = shared_cache.get(shared_key)
+            if shared_entry is not None:
+                resolved_target = ResolvedTarget(*shared_entry)
+                local_cache.set(key, resolved_target)
+
+        cached = resolved_target is not None
+        if not cached:
+            resolved_target = self._resolve_target_name(name)
+            if resolved_target is None:
+                return None  # the API could not be reached; don't remember that
+            if resolved_target.is_resolved:
+                ttl = get_swift_setting('RESOLVER_CACHE_TTL', RESOLVER_CACHE_TTL)
+            else:
+                ttl = get_swift_setting('RESOLVER_CACHE_NEGATIVE_TTL', RESOLVER_CACHE_NEGATIVE_TTL)
+            local_cache.set(key, resolved_target, ttl=ttl)
+            if shared_cache is not None:
+                shared_cache.set(shared_key, tuple(resolved_target), timeout=ttl)
+
+        trace(logger, 'resolve_name', name=name, cached=cached, resolved_target=resolved_target)
+        return resolved_target if resolved_target.is_resolved else None
+
+    def _resolve_target_name(self, name: str) -> ResolvedTarget:
+        """Ask the Swift TOO API to resolve name. Returns None if the API could not be reached."""
         try:
-            resolved_target: Swift_Resolve = Resolve(target.name)  # this calls the API
-            # <class 'swifttools.swift_too.api_resolve.Swift_Resolve'>
-        except ConnectionError as err:
-            logger.error(f'ConnectionError: {err}')
-            resolved_target = None
+            with swift_api_call('resolve'):
+                resolved_target = _swift_too().Resolve(name)  # this calls the API
+                # <class 'swifttools.swift_too.api_resolve.Swift_Resolve'>
+                _raise_if_unavailable(resolved_target.status, 'resolve')
+        except SwiftAPIUnavailable as err:
+            logger.error(f'_resolve_target_name: {err}')
+            return None
 
-        logger.info(f'resolved_target: {resolved_target}')
-        logger.debug(f'type(resolved_target): {type(resolved_target)}')
-        logger.debug(f'dir(resolved_target): {dir(resolved_target)}')
-        if resolved_target is not None:
-            for key, value in resolved_target.__dict__.items():
-                logger.debug(f'resolved_target.{key}): {value}')
+        dump(logger, '_resolve_target_name', lambda: vars(resolved_target), name=name)
 
-        return resolved_target
+        return ResolvedTarget(name=resolved_target.name, ra=resolved_target.ra,
+                              dec=resolved_target.dec, resolver=resolved_target.resolver)
 
 
 # define OTHER_CHOICE so it can be used consistently and tested against
@@ -101,6 +871,38 @@ SWIFT_TARGET_CLASSIFICATION_CHOICES = [
 ]
 
 
+#
+# Choices from the swifttools TOO object
+#
+# The valid observation types, GRB detectors, and monitoring units are properties of
+# the swifttools TOO object. The get_*_choices() functions below build their choices from
+# a TOO() the first time they are called and remember them for the life of the process.
+# SwiftObservationForm passes the functions themselves (not their return values) as field
+# choices, so nothing is computed (or imported) until a form is actually instantiated.
+#
+# If settings.FACILITIES['SWIFT']['CHOICES_FROM_SNAPSHOT'] is True, the choices come from
+# this snapshot of swifttools 3.0 instead, and swifttools is not consulted at all. They also
+# come from the snapshot if swifttools can't make a TOO(), so the form can still be shown.
+#
+SWIFT_TOO_CHOICES_SNAPSHOT = {
+    'obs_types': ['Spectroscopy', 'Light Curve', 'Position', 'Timing'],
+    'mission_names': ['Fermi/LAT', 'Swift/BAT', 'INTEGRAL', 'MAXI', 'IPN', 'Fermi/GBM',
+                      'IceCube', 'LVC', 'ANTARES', 'ZTF', 'ASAS-SN'],
+    'monitoring_units': ['second', 'minute', 'hour', 'day', 'week', 'month', 'year', 'orbit'],
+}
+
+
+def _get_too_property(name: str) -> list:
+    """Return the named list-valued property of a swifttools TOO object (or of the snapshot)."""
+    if get_swift_setting('CHOICES_FROM_SNAPSHOT', False):
+        return SWIFT_TOO_CHOICES_SNAPSHOT[name]
+    try:
+        return list(getattr(_swift_too().TOO(), name))
+    except Exception as ex:
+        logger.warning(f'Could not get the TOO {name} from swifttools ({ex!r}); using those of the snapshot')
+        return SWIFT_TOO_CHOICES_SNAPSHOT[name]
+
+
 #
 # Observation Types
 #
@@ -108,6 +910,7 @@ SWIFT_TARGET_CLASSIFICATION_CHOICES = [
 # >>> TOO().obs_types
 # ['Spectroscopy', 'Light Curve', 'Position', 'Timing']
 #
+@functools.cache
 def get_observation_type_choices():
     """Returns a list of tuples for the observation type choices.
 
@@ -116,7 +919,7 @@ def get_observation_type_choices():
     'Light Curve'), ...]).
     """
     observation_type_choices = []
-    for obs_type in TOO().obs_types:
+    for obs_type in _get_too_property('obs_types'):
         observation_type_choices.append((obs_type, obs_type))
     return observation_type_choices
 
@@ -137,6 +940,7 @@ SWIFT_INSTRUMENT_CHOICES = [
 #
 
 
+@functools.cache
 def get_grb_detector_choices():
     """Returns a list of tuples for the GRB detector choices.
 
@@ -145,7 +949,7 @@ def get_grb_detector_choices():
     'Fermi/LAT'), ...]).
     """
     grb_detector_choices = []
-    for mission in TOO().mission_names:
+    for mission in _get_too_property('mission_names'):
         if mission != 'ANTARES':
             grb_detector_choices.append((mission, mission))
 
@@ -212,6 +1016,7 @@ SWIFT_UVOT_FILTER_MODE_CHOICES = [
 #
 # Monitoring
 #
+@functools.cache
 def get_monitoring_unit_choices():
     """Returns a list of tuples for the monitoring frequency unit choices.
 
@@ -219,6 +1024,201 @@ def get_monitoring_unit_choices():
     use that to create the choices list of tuples (e.g. [('day', 'day'), ('week', 'week'), ...]).
     """
     monitoring_unit_choices = []
-    for unit in TOO().monitoring_units:
+    for unit in _get_too_property('monitoring_units'):
         monitoring_unit_choices.append((unit, f'{unit}(s)'))
     return monitoring_unit_choices
+
+
+#
+# Observation payload -> Swift_TOO parameters
+#
+def too_parameters_from_payload(observation_payload: dict, username: str, shared_secret: str) -> Mapping:
+    """Return the Swift_TOO attributes for an observation payload as a new, read-only mapping.
+
+    For the SwiftFacility, the observation_payload is the serialized form.cleaned_data
+    plus the target information (which doesn't come from the form).
+    See SwiftObservationForm.observation_payload() for details.
+
+    This has no side effects: it neither changes nor depends on any Swift_TOO, so every
+    attribute that applies to some requests but not others (tiling, GI proposal, instrument
+    modes, ...) is given explicitly, as None if it does not apply to this request. Pass the
+    result to SwiftAPI.new_too() to get a Swift_TOO to validate() or submit().
+
+    Reference Documentation:
+     * https://www.swift.psu.edu/too_api/
+     * https://www.swift.psu.edu/too_api/index.php?md=TOO parameters.md
+    """
+    too = {}  # insertion order matters; see SwiftAPI.new_too()
+
+    #
+    # User identification
+    #
+    too['username'] = username
+    too['shared_secret'] = shared_secret
+
+    #
+    # Source name, type, location, position_error
+    #
+    too['source_name'] = observation_payload['source_name']
+    too['ra'] = observation_payload['ra']
+    too['dec'] = observation_payload['dec']
+    too['poserr'] = observation_payload['poserr']
+
+    # Get the source_type from target_classification_choices or target_classification
+    # depending on if they selected "Other (please specify)" in the drop-down menu
+    if observation_payload['target_classification_choices'] == SWIFT_OTHER_CHOICE:
+        # they specified a custom target classification. So, use that.
+        too['source_type'] = observation_payload['target_classification']
+    else:
+        # use the value from the drop-down menu
+        too['source_type'] = observation_payload['target_classification_choices']
+
+    #
+    # TOO Request details
+    #
+    too['instrument'] = observation_payload['instrument']
+    too['urgency'] = observation_payload['urgency']
+
+    #
+    # Observation Type
+    #     What is driving the exposure time? (Spectroscopy, Light Curve, Position, Timing)
+    too['obs_type'] = observation_payload['obs_type']
+
+    #
+    # Description of the source brightness for various instruments
+    #
+    # Object Brightness
+    too['opt_mag'] = observation_payload['optical_magnitude']
+    too['opt_filt'] = observation_payload['optical_filter']
+    too['xrt_countrate'] = observation_payload['xrt_countrate']  # counts/second
+    too['bat_countrate'] = observation_payload['bat_countrate']  # counts/second
+    too['other_brightness'] = observation_payload['other_brightness']
+    # TODO: validation - answer at least one of these questions
+
+    #
+    # GRB stuff
+    #
+    # If they specified GRB for the target_classification,
+    #     then set the grb_detector and grb_triggertime.
+    # And, if they specified SWIFT_OTHER_CHOICE for the GRB detector,
+    #     then set grb_detector from their text.
+    #
+    if observation_payload['target_classification_choices'] == 'GRB':
+        too['grb_triggertime'] = observation_payload['grb_triggertime']
+        if observation_payload['grb_detector_choices'] == SWIFT_OTHER_CHOICE:
+            # they specified a custom GRB detector. So, use that.
+            too['grb_detector'] = observation_payload['grb_detector']
+        else:
+            too['grb_detector'] = observation_payload['grb_detector_choices']
+    else:
+        too['grb_triggertime'] = None
+        too['grb_detector'] = None
+
+    #
+    # Science Justification
+    #
+    too['immediate_objective'] = observation_payload['immediate_objective']
+    too['science_just'] = observation_payload['science_just']
+
+    #
+    # Exposure requested time (total)
+    #
+    too['exposure'] = observation_payload['exposure']
+    too['exp_time_just'] = observation_payload['exp_time_just']
+
+    #
+    # Monitoring requests
+    #
+    too['num_of_visits'] = observation_payload['num_of_visits']
+    if too['num_of_visits'] > 1:
+        too['exp_time_per_visit'] = observation_payload['exp_time_per_visit']
+        # construct monitoring_freq from monitoring_freq and monitoring_units e.g '1 hour'
+        too['monitoring_freq'] = f"{observation_payload['monitoring_freq']} {observation_payload['monitoring_units']}"
+    else:
+        too['exp_time_per_visit'] = None
+        too['monitoring_freq'] = None
+
+    #
+    # Swift Guest Investigator program parameters
+    #
+    # TODO: Guest InvestigatorI Program Support
+    # Are you triggering a GI program? (yes/no)
+    # if yes, then
+    #   GI Program Details: Proposal ID; Proposal PI; Trigger Justification
+    # Since "this will count against the number of awarded triggers", show
+    # triggers used / total number triggers awarded. (and trigger remaining?)..
+    if observation_payload['proposal']:
+        # this is a Swift Guest Investigator request, so set it's too attributes
+        too['proposal'] = observation_payload['proposal']
+        too['proposal_id'] = observation_payload['proposal_id']
+        too['proposal_pi'] = observation_payload['proposal_pi']
+        too['proposal_trigger_just'] = observation_payload['proposal_trigger_just']
+    else:
+        too['proposal'] = False
+        too['proposal_id'] = None
+        too['proposal_pi'] = None
+        too['proposal_trigger_just'] = None
+
+    #
+    # Instrument mode
+    #
+    # Set and unset too attributes according to the instrument selected.
+    if too['instrument'] == 'BAT':
+        # not sure what to do here!  TODO: find out
+        too['xrt_mode'] = None
+        too['uvot_mode'] = None
+        too['uvot_just'] = None
+    elif too['instrument'] == 'UVOT':
+        too['xrt_mode'] = None
+        if observation_payload['uvot_mode_choices'] == SWIFT_OTHER_CHOICE:
+            # use the value from the uvot_mode text field
+            too['uvot_mode'] = observation_payload['uvot_mode']
+        else:
+            # use the value from the drop-down menu
+            too['uvot_mode'] = observation_payload['uvot_mode_choices']
+        too['uvot_just'] = observation_payload['uvot_just']
+    else:
+        # XRT mode
+        too['xrt_mode'] = observation_payload['xrt_mode']
+        too['uvot_mode'] = None
+        too['uvot_just'] = None
+
+    # WARNING: Setting too.slew_in_place to False causes a timeout error in too.server_validate() !!!
+    if observation_payload['slew_in_place']:
+        too['slew_in_place'] = observation_payload['slew_in_place']
+    else:
+        too['slew_in_place'] = None  # do NOT slew_in_place to False!!!
+
+    #
+    # Tiling request
+    #
+    if observation_payload['tiling']:
+        # this is a tiling request to set tiling too attributes
+        too['tiling'] = observation_payload['tiling']
+        too['number_of_tiles'] = observation_payload['number_of_tiles']
+        too['exposure_time_per_tile'] = observation_payload['exposure_time_per_tile']
+        # TODO: validation, if exposure_time_per_tile is unset, position_error should be set
+        too['tiling_justification'] = observation_payload['tiling_justification']
+    else:
+        too['tiling'] = False
+        too['number_of_tiles'] = None
+        too['exposure_time_per_tile'] = None
+        too['tiling_justification'] = None
+
+    #
+    # Debug parameter
+    #
+    too['debug'] = observation_payload['debug']
+
+    return MappingProxyType(too)
+
+
+def too_fingerprint(too_parameters: Mapping) -> str:
+    """Return a digest that identifies the content of too_parameters (see too_parameters_from_payload()).
+
+    Two observation payloads that configure the same Swift_TOO have the same fingerprint. The
+    shared secret is left out, so the fingerprint can be logged or used as a cache key.
+    """
+    canonical = json.dumps({key: value for key, value in too_parameters.items() if key != 'shared_secret'},
+                           sort_keys=True, default=str)
+    return hashlib.sha256(canonical.encode()).hexdigest()
@@ -0,0 +1,49 @@
+import logging
+
+from django_tasks import task
+
+from tom_swift import mirror, polling, submission, timeline
+
+logger = logging.getLogger(__name__)
+
+
+@task
+def poll_swift_observations(limit=None):
+    """Update the status of the Swift observation requests that are due to be polled.
+
+    Enqueue this periodically (see tom_swift.polling). Returns the (observation_id, error)
+    tuples of the records that couldn't be updated.
+    """
+    failed_records = polling.poll_due_observations(limit=limit)
+    return [list(failed_record) for failed_record in failed_records]  # task results must be JSON serializable
+
+
+@task
+def submit_swift_observations(limit=None):
+    """Submit the queued Swift TOO requests that are due, the most urgent first.
+
+    Enqueue this frequently when the SUBMISSION_QUEUE setting is on (see tom_swift.submission).
+    Returns the number of submissions that were {'submitted', 'retrying', 'failed'}.
+    """
+    return submission.process_submission_queue(limit=limit)
+
+
+@task
+def sync_swift_too_requests():
+    """Bring the local mirror of the recent Swift TOO requests up to date.
+
+    Enqueue this periodically (see tom_swift.mirror). Returns the number of TOO requests
+    added or updated.
+    """
+    return mirror.sync_too_requests()
+
+
+@task
+def sync_swift_timelines(limit=None):
+    """Bring the Swift timelines of the targets that are due to be synced up to date.
+
+    Enqueue this periodically (see tom_swift.timeline). Returns the (target name, error)
+    tuples of the targets whose timeline couldn't be synced.
+    """
+    failed_targets = timeline.sync_due_timelines(limit=limit)
+    return [list(failed_target) for failed_target in failed_targets]  # task results must be JSON serializable
@@ -0,0 +1,16 @@
+from django import template
+
+from tom_swift.timeline import timeline_context
+from tom_swift.visibility import visibility_context
+
+register = template.Library()
+
+
+def target_visibility_tab(context) -> dict:
+    """Context of the Swift Visibility tab of the target detail page (see TomSwiftConfig.target_detail_tabs())."""
+    return visibility_context(context['target'])
+
+
+def target_timeline_tab(context) -> dict:
+    """Context of the Swift Timeline tab of the target detail page (see TomSwiftConfig.target_detail_tabs())."""
+    return timeline_context(context['target'])
@@ -0,0 +1,92 @@
+"""Minimal Django settings for running the tom_swift tests (and benchmarks, see benchmarks/settings.py) outside a TOM:
+
+    python -m django test --settings=tom_swift.test_settings
+
+These are not suitable for anything else.
+"""
+import tempfile
+
+from tom_common.default_settings import *  # noqa: F401,F403
+from tom_common.default_settings import (TOMTOOLKIT_AUTHENTICATION_BACKENDS, TOMTOOLKIT_INSTALLED_APPS,
+                                         TOMTOOLKIT_MIDDLEWARE)
+
+SECRET_KEY = 'tom_swift tests'
+DEBUG = False
+ALLOWED_HOSTS = ['*']
+SITE_ID = 1
+
+INSTALLED_APPS = TOMTOOLKIT_INSTALLED_APPS + ['tom_swift']
+MIDDLEWARE = TOMTOOLKIT_MIDDLEWARE
+AUTHENTICATION_BACKENDS = TOMTOOLKIT_AUTHENTICATION_BACKENDS
+ROOT_URLCONF = 'tom_common.urls'
+TEMPLATES = [
+    {
+        'BACKEND': 'django.template.backends.django.DjangoTemplates',
+        'DIRS': [],
+        'APP_DIRS': True,
+        'OPTIONS': {
+            'context_processors': [
+                'django.template.context_processors.request',
+                'django.contrib.auth.context_processors.auth',
+                'django.contrib.messages.context_processors.messages',
+            ],
+        },
+    },
+]
+CRISPY_TEMPLATE_PACK = 'bootstrap5'
+
+DATABASES = {
+    'default': {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': ':memory:',
+        'OPTIONS': {'timeout': 60},
+    }
+}
+DEFAULT_AUTO_FIELD = 'django.db.models.AutoField'
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    }
+}
+TASKS = {
+    'default': {
+        'BACKEND': 'django_tasks.backends.immediate.ImmediateBackend'
+    }
+}
+
+USE_TZ = True
+TIME_ZONE = 'UTC'
+STATIC_URL = '/static/'
+MEDIA_URL = '/data/'
+MEDIA_ROOT = tempfile.mkdtemp(prefix='tom_swift_tests_')
+LOGIN_URL = '/accounts/login/'
+
+TARGET_TYPE = 'SIDEREAL'
+TARGET_PERMISSIONS_ONLY = True
+TARGET_DEFAULT_PERMISSION = 'PUBLIC'
+TARGET_LIST_COLUMNS = ['name', 'type']
+EXTRA_FIELDS = []
+SELECTION_EXTRA_FIELDS = []
+GENERAL_SEARCH_FUNCTIONS = {}
+MATCH_MANAGERS = {}
+HOOKS = {}
+DATA_PRODUCT_TYPES = {
+    'fits_file': ('fits_file', 'FITS File'),
+    'image_file': ('image_file', 'Image File'),
+}
+DATA_PROCESSORS = {}
+AUTO_THUMBNAILS = False
+THUMBNAIL_MAX_SIZE = (0, 0)
+THUMBNAIL_DEFAULT_SIZE = (200, 200)
+HINTS_ENABLED = False
+HINT_LEVEL = 20
+AUTH_STRATEGY = 'READ_ONLY'
+OPEN_URLS = []
+
+FACILITIES = {
+    'SWIFT': {
+        'SWIFT_USERNAME': 'anonymous',
+        'SWIFT_SHARED_SECRET': 'anonymous',
+    },
+}
+TOM_FACILITY_CLASSES = ['tom_swift.swift.SwiftFacility']
@@ -1,4 +1,25 @@
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, datetime, timedelta, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import logging
+import os
+import tempfile
+import threading
+import time
+from types import SimpleNamespace
 import unittest
+from unittest import mock
+
+import requests
+
+from tom_swift import async_api, metrics, swift_api, tracing, visibility
+from tom_swift.cache import TTLCache
+from tom_swift.downloads import PARTIAL_SUFFIX, download_file, download_files
+from tom_swift.s3 import HEASARC_ARCHIVE_URL, download_s3_files, get_s3_client
+from tom_swift.swift_api import (SWIFT_OTHER_CHOICE, SwiftAPI, too_fingerprint, too_parameters_from_payload,
+                                 too_request_status)
+from tom_swift.testing import make_observation_payload
 
 
 class SwiftFacilityTest(unittest.TestCase):
@@ -9,5 +30,812 @@ class SwiftFacilityTest(unittest.TestCase):
         self.assertEqual(expected, actual)
 
 
+class TTLCacheTest(unittest.TestCase):
+
+    def setUp(self):
+        self.now = 0.0
+        self.cache = TTLCache(maxsize=2, ttl=10, timer=lambda: self.now)
+
+    def test_entries_expire_after_ttl(self):
+        self.cache.set('a', 1)
+        self.now = 9.9
+        self.assertEqual(self.cache.get('a'), 1)
+        self.now = 10.0
+        self.assertIsNone(self.cache.get('a'))
+
+    def test_per_entry_ttl(self):
+        self.cache.set('a', 1, ttl=1)
+        self.now = 2
+        self.assertIsNone(self.cache.get('a'))
+
+    def test_least_recently_used_entry_is_evicted(self):
+        self.cache.set('a', 1)
+        self.cache.set('b', 2)
+        self.cache.get('a')  # 'b' is now the least recently used
+        self.cache.set('c', 3)
+        self.assertEqual(self.cache.get('a'), 1)
+        self.assertIsNone(self.cache.get('b'))
+        self.assertEqual(self.cache.get('c'), 3)
+
+    def test_expired_entries_are_evicted_before_live_ones(self):
+        self.cache.set('a', 1)  # the least recently used, but live
+        self.cache.set('b', 2, ttl=1)
+        self.now = 5
+        self.cache.set('c', 3)
+        self.assertEqual(self.cache.stats()['size'], 2)
+        self.assertEqual(self.cache.get('a'), 1)
+        self.assertEqual(self.cache.get('c'), 3)
+
+    def test_stats(self):
+        self.cache.set('a', 1)
+        self.cache.get('a')
+        self.cache.get('missing')
+        self.assertEqual(self.cache.stats(), {'hits': 1, 'misses': 1, 'size': 1, 'maxsize': 2})
+
+
+class TOOParametersFromPayloadTest(unittest.TestCase):
+
+    def test_parameters_are_read_only(self):
+        too_parameters = too_parameters_from_payload(make_observation_payload(), 'user', 'secret')
+        with self.assertRaises(TypeError):
+            too_parameters['urgency'] = 0
+
+    def test_credentials_are_set_first(self):
+        too_parameters = too_parameters_from_payload(make_observation_payload(), 'user', 'secret')
+        # the Swift_TOO needs its username before its shared_secret can be set
+        self.assertEqual(list(too_parameters)[:2], ['username', 'shared_secret'])
+
+    def test_unused_sections_are_explicitly_unset(self):
+        too_parameters = too_parameters_from_payload(make_observation_payload(), 'user', 'secret')
+        for attribute in ['uvot_mode', 'uvot_just', 'grb_detector', 'grb_triggertime', 'proposal_id',
+                          'number_of_tiles', 'tiling_justification', 'monitoring_freq', 'slew_in_place']:
+            self.assertIn(attribute, too_parameters)
+            self.assertIsNone(too_parameters[attribute])
+
+    def test_other_choices(self):
+        payload = make_observation_payload(target_classification_choices=SWIFT_OTHER_CHOICE,
+                                           target_classification='Magnetar',
+                                           instrument='UVOT', uvot_mode_choices=SWIFT_OTHER_CHOICE,
+                                           uvot_mode='0x30ed', num_of_visits=3, monitoring_freq=2)
+        too_parameters = too_parameters_from_payload(payload, 'user', 'secret')
+        self.assertEqual(too_parameters['source_type'], 'Magnetar')
+        self.assertEqual(too_parameters['uvot_mode'], '0x30ed')
+        self.assertIsNone(too_parameters['xrt_mode'])
+        self.assertEqual(too_parameters['monitoring_freq'], '2 day')
+
+    def test_fingerprint_ignores_shared_secret(self):
+        payload = make_observation_payload()
+        self.assertEqual(too_fingerprint(too_parameters_from_payload(payload, 'user', 'secret')),
+                         too_fingerprint(too_parameters_from_payload(payload, 'user', 'other secret')))
+        self.assertNotEqual(too_fingerprint(too_parameters_from_payload(payload, 'user', 'secret')),
+                            too_fingerprint(too_parameters_from_payload(dict(payload, urgency=0), 'user', 'secret')))
+
+
+@mock.patch.object(swift_api, 'get_swift_setting', lambda key, default=None: default)
+class TOOChoicesTest(unittest.TestCase):
+    choices_functions = (swift_api.get_observation_type_choices, swift_api.get_grb_detector_choices,
+                         swift_api.get_monitoring_unit_choices)
+
+    def setUp(self):
+        for choices_function in self.choices_functions:
+            choices_function.cache_clear()
+            self.addCleanup(choices_function.cache_clear)
+
+    def test_snapshot_is_used_if_swifttools_fails(self):
+        failing_swift_too = SimpleNamespace(TOO=mock.Mock(side_effect=requests.ConnectionError('unreachable')))
+        with mock.patch.object(swift_api, '_swift_too', return_value=failing_swift_too), \
+                self.assertLogs(swift_api.logger, logging.WARNING):
+            choices = swift_api.get_observation_type_choices()
+        self.assertEqual(choices, [(obs_type, obs_type)
+                                   for obs_type in swift_api.SWIFT_TOO_CHOICES_SNAPSHOT['obs_types']])
+
+    def test_choices_are_memoized(self):
+        swift_too = SimpleNamespace(TOO=mock.Mock(return_value=SimpleNamespace(obs_types=['Light Curve'])))
+        with mock.patch.object(swift_api, '_swift_too', return_value=swift_too):
+            self.assertEqual(swift_api.get_observation_type_choices(), [('Light Curve', 'Light Curve')])
+            self.assertIs(swift_api.get_observation_type_choices(), swift_api.get_observation_type_choices())
+        self.assertEqual(swift_too.TOO.call_count, 1)
+
+
+class FakeTOO:
+    """Stands in for a swifttools Swift_TOO whose server_validate() returns the given outcome"""
+    urgency = 3
+    instrument = 'XRT'
+
+    def __init__(self, is_valid=True, errors=(), warnings=()):
+        self.outcome = (is_valid, list(errors), list(warnings))
+        self.status = SimpleNamespace(errors=[], warnings=[])
+        self.server_validate_calls = 0
+
+    def server_validate(self):
+        self.server_validate_calls += 1
+        is_valid, self.status.errors, self.status.warnings = self.outcome
+        return is_valid
+
+
+@mock.patch.object(swift_api, '_server_validate_cache', None)
+@mock.patch.object(swift_api, '_circuit_breaker', None)
+@mock.patch.object(swift_api, 'get_swift_setting', lambda key, default=None: default)
+class ServerValidateCacheTest(unittest.TestCase):
+
+    def setUp(self):
+        self.swift_api = SwiftAPI()
+
+    def test_identical_too_is_not_validated_again(self):
+        self.assertTrue(self.swift_api.server_validate(FakeTOO(warnings=['INFO: corrected']), 'fingerprint'))
+        too = FakeTOO(is_valid=False)
+        self.assertTrue(self.swift_api.server_validate(too, 'fingerprint'))
+        self.assertEqual(too.server_validate_calls, 0)
+        self.assertEqual(too.status.warnings, ['INFO: corrected'])
+        self.assertEqual(swift_api.get_server_validate_cache().stats()['hits'], 1)
+
+    def test_rejections_are_remembered(self):
+        self.swift_api.server_validate(FakeTOO(is_valid=False, errors=['Exposure too long']), 'fingerprint')
+        too = FakeTOO()
+        self.assertFalse(self.swift_api.server_validate(too, 'fingerprint'))
+        self.assertEqual(too.status.errors, ['Exposure too long'])
+
+    def test_transient_failures_are_not_remembered(self):
+        self.swift_api.server_validate(FakeTOO(is_valid=False, errors=['Queued job timed out.']), 'fingerprint')
+        too = FakeTOO()
+        self.assertTrue(self.swift_api.server_validate(too, 'fingerprint'))
+        self.assertEqual(too.server_validate_calls, 1)
+
+    def test_unavailable_api_is_not_asked(self):
+        for _ in range(swift_api.CIRCUIT_BREAKER_THRESHOLD):
+            self.swift_api.server_validate(FakeTOO(is_valid=False, errors=['HTTP Submit failed with error code 502']),
+                                           'fingerprint')
+        self.assertTrue(swift_api.swift_api_degraded())
+        too = FakeTOO()
+        self.assertFalse(self.swift_api.server_validate(too, 'fingerprint'))
+        self.assertEqual(too.server_validate_calls, 0)
+        self.assertTrue(too.status.errors[0].startswith('The Swift TOO API has been failing'))
+
+
+class MetricsTest(unittest.TestCase):
+
+    def setUp(self):
+        patcher = mock.patch.object(metrics, '_metrics_registry', metrics.MetricsRegistry(buckets=(0.1, 1.0)))
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_calls_are_counted_and_timed(self):
+        registry = metrics.get_metrics_registry()
+        metrics.record_call('submit', metrics.SUCCESS, 0.5, urgency=2, instrument='XRT')
+        metrics.record_call('submit', metrics.SUCCESS, 2.0, urgency=2, instrument='XRT')
+        metrics.record_call('resolve', metrics.UNAVAILABLE, 0.05)
+        self.assertEqual(registry.calls(operation='submit'), 2)
+        self.assertEqual(registry.calls(outcome=metrics.UNAVAILABLE), 1)
+
+        text = registry.render_prometheus()
+        labels = 'operation="submit",outcome="success",urgency="2",instrument="XRT"'
+        self.assertIn(f'tom_swift_api_calls_total{{{labels}}} 2\n', text)
+        self.assertIn(f'tom_swift_api_call_duration_seconds_bucket{{{labels},le="0.1"}} 0\n', text)
+        self.assertIn(f'tom_swift_api_call_duration_seconds_bucket{{{labels},le="1.0"}} 1\n', text)
+        self.assertIn(f'tom_swift_api_call_duration_seconds_bucket{{{labels},le="+Inf"}} 2\n', text)
+        self.assertIn(f'tom_swift_api_call_duration_seconds_sum{{{labels}}} 2.5\n', text)
+
+    def test_signal_is_sent_and_broken_receivers_are_ignored(self):
+        calls = []
+
+        def receiver(sender, **kwargs):
+            calls.append(kwargs)
+
+        def broken_receiver(sender, **kwargs):
+            raise RuntimeError('broken')
+
+        metrics.swift_api_call_finished.connect(receiver)
+        metrics.swift_api_call_finished.connect(broken_receiver)
+        self.addCleanup(metrics.swift_api_call_finished.disconnect, receiver)
+        self.addCleanup(metrics.swift_api_call_finished.disconnect, broken_receiver)
+        with self.assertRaises(ValueError):
+            with metrics.timed('validate_local', urgency=1, instrument='UVOT'):
+                raise ValueError
+        self.assertEqual(len(calls), 1)
+        self.assertEqual(calls[0]['outcome'], metrics.ERROR)
+        self.assertEqual((calls[0]['urgency'], calls[0]['instrument']), (1, 'UVOT'))
+
+    @mock.patch.object(swift_api, '_circuit_breaker', None)
+    @mock.patch.object(swift_api, 'get_swift_setting', lambda key, default=None: default)
+    def test_swift_api_calls_are_recorded(self):
+        with swift_api.swift_api_call('status'):
+            pass
+        with self.assertRaises(swift_api.SwiftAPIUnavailable):
+            with swift_api.swift_api_call('submit', urgency=1, instrument='XRT'):
+                raise requests.ConnectionError('refused')
+        registry = metrics.get_metrics_registry()
+        self.assertEqual(registry.calls(operation='status', outcome=metrics.SUCCESS), 1)
+        self.assertEqual(registry.calls(operation='submit', outcome=metrics.UNAVAILABLE, urgency=1), 1)
+
+
+class SwiftCredentialsTest(unittest.TestCase):
+
+    def setUp(self):
+        self.settings = SimpleNamespace(FACILITIES={'SWIFT': {'SWIFT_USERNAME': 'alice', 'SWIFT_SHARED_SECRET': 's'}})
+        for patcher in (mock.patch.object(swift_api, 'settings', self.settings),
+                        mock.patch.object(swift_api, '_swift_credentials', None)):
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def test_credentials_are_read_once(self):
+        self.assertEqual(SwiftAPI().get_credentials(), ('alice', 's'))
+        self.settings.FACILITIES = {}
+        self.assertEqual(SwiftAPI().get_credentials(), ('alice', 's'))
+
+    def test_credentials_are_read_again_when_the_settings_change(self):
+        swift_api.get_swift_credentials()
+        self.settings.FACILITIES = {'SWIFT': {'SWIFT_USERNAME': 'bob'}}
+        swift_api.setting_changed.send(sender=None, setting='FACILITIES', value=None, enter=True)
+        self.assertEqual(swift_api.get_swift_credentials().username, 'bob')
+        self.settings.FACILITIES = {}
+        swift_api.setting_changed.send(sender=None, setting='FACILITIES', value=None, enter=False)
+        with self.assertRaises(swift_api.ImproperlyConfigured):
+            swift_api.get_swift_credentials()
+
+
+class SlowSwiftAPI:
+    """Stands in for a SwiftAPI whose operations each take a while."""
+    def __init__(self, seconds):
+        self.seconds = seconds
+        self.threads = set()
+
+    def submit(self, too):
+        self.threads.add(threading.current_thread().name)
+        time.sleep(self.seconds)
+        if too is None:
+            raise swift_api.SwiftAPIError('no TOO')
+        return True
+
+
+class AsyncSwiftAPITest(unittest.IsolatedAsyncioTestCase):
+
+    def setUp(self):
+        executor = ThreadPoolExecutor(max_workers=4, thread_name_prefix='tom_swift')
+        self.addCleanup(executor.shutdown)
+        for patcher in (mock.patch.object(async_api, '_swift_executor', executor),
+                        mock.patch('django.db.close_old_connections')):  # there is no database here
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    async def test_operations_run_concurrently_in_the_swift_threads(self):
+        api = SlowSwiftAPI(0.2)
+        start = time.monotonic()
+        results = await asyncio.gather(*(async_api.AsyncSwiftAPI(api).submit(FakeTOO()) for _ in range(4)))
+        self.assertEqual(results, [True] * 4)
+        self.assertLess(time.monotonic() - start, 0.6)
+        self.assertTrue(all(name.startswith('tom_swift') for name in api.threads))
+
+    async def test_errors_are_raised_to_the_caller(self):
+        with self.assertRaises(swift_api.SwiftAPIError):
+            await async_api.AsyncSwiftAPI(SlowSwiftAPI(0)).submit(None)
+
+    async def test_cached_resolutions_dont_need_a_thread(self):
+        resolver_cache = TTLCache(maxsize=10, ttl=60)
+        resolver_cache.set('ngc 1566', swift_api.ResolvedTarget('NGC 1566', 65.0017, -54.9379, 'Simbad'))
+        with mock.patch.object(async_api, 'get_resolver_cache', lambda: resolver_cache), \
+                mock.patch.object(async_api, 'run_in_swift_executor') as run_in_swift_executor:
+            resolved_target = await async_api.AsyncSwiftAPI(SwiftAPI()).resolve_target(SimpleNamespace(name='NGC 1566'))
+        self.assertEqual(resolved_target.ra, 65.0017)
+        run_in_swift_executor.assert_not_called()
+
+
+class TracingTest(unittest.TestCase):
+
+    def setUp(self):
+        self.logger = logging.getLogger('tom_swift.test_tracing')
+        self.logger.propagate = False
+        self.addCleanup(setattr, self.logger, 'propagate', True)
+        self.payloads = []
+
+    def payload(self):
+        self.payloads.append(1)
+        return 'the payload'
+
+    def test_nothing_is_formatted_unless_the_logger_is_enabled(self):
+        self.logger.setLevel(logging.INFO)
+        self.addCleanup(self.logger.setLevel, logging.NOTSET)
+        tracing.trace(self.logger, 'event', value=tracing.Lazy(self.payload))
+        tracing.dump(self.logger, 'event', self.payload, sample_rate=1.0)
+        self.assertEqual(self.payloads, [])
+
+    def test_records_are_structured(self):
+        with self.assertLogs(self.logger, logging.DEBUG) as logs:
+            tracing.trace(self.logger, 'submit_observation', too_id=20000)
+            tracing.dump(self.logger, 'configure_too', self.payload, sample_rate=1.0, source_name='NGC 1566')
+        self.assertEqual(logs.output[0], 'DEBUG:tom_swift.test_tracing:submit_observation too_id=20000')
+        self.assertEqual(logs.output[1], 'DEBUG:tom_swift.test_tracing:configure_too source_name=NGC 1566\n'
+                                         'the payload')
+        self.assertEqual(getattr(logs.records[0], tracing.TRACE_ATTRIBUTE), {'event': 'submit_observation',
+                                                                             'too_id': 20000})
+
+    def test_dumps_are_sampled(self):
+        with self.assertLogs(self.logger, logging.DEBUG) as logs:
+            for _ in range(100):
+                tracing.dump(self.logger, 'configure_too', self.payload, sample_rate=0.0)
+            tracing.trace(self.logger, 'done')
+        self.assertEqual(len(logs.records), 1)
+        self.assertEqual(self.payloads, [])
+
+
+class CircuitBreakerTest(unittest.TestCase):
+
+    def setUp(self):
+        self.now = 0.0
+        self.breaker = swift_api.CircuitBreaker(threshold=3, reset=30, timer=lambda: self.now)
+
+    def fail(self, times=1):
+        for _ in range(times):
+            self.assertTrue(self.breaker.allow())
+            self.breaker.record_failure()
+
+    def test_opens_after_threshold_failures_in_a_row(self):
+        self.fail(2)
+        self.breaker.allow()
+        self.breaker.record_success()
+        self.fail(2)
+        self.assertEqual(self.breaker.state, swift_api.CircuitBreaker.CLOSED)
+        self.fail()
+        self.assertEqual(self.breaker.state, swift_api.CircuitBreaker.OPEN)
+        self.assertFalse(self.breaker.allow())
+        self.now = 20.0
+        self.assertEqual(self.breaker.retry_after(), 10.0)
+
+    def test_lets_one_trial_through_after_reset(self):
+        self.fail(3)
+        self.now = 30.0
+        self.assertTrue(self.breaker.allow())
+        self.assertFalse(self.breaker.allow())  # only one trial at a time
+        self.breaker.record_success()
+        self.assertEqual(self.breaker.state, swift_api.CircuitBreaker.CLOSED)
+        self.assertTrue(self.breaker.allow())
+
+    def test_failed_trial_opens_again(self):
+        self.fail(3)
+        self.now = 30.0
+        self.fail()
+        self.assertEqual(self.breaker.state, swift_api.CircuitBreaker.OPEN)
+        self.now = 59.0
+        self.assertFalse(self.breaker.allow())
+
+    def test_released_trial_leaves_the_breaker_open(self):
+        self.fail(3)
+        self.now = 30.0
+        self.assertTrue(self.breaker.allow())
+        self.breaker.release()
+        self.assertEqual(self.breaker._failures, 3)
+        self.assertTrue(self.breaker.allow())  # the next operation is the trial
+        self.breaker.record_success()
+        self.assertEqual(self.breaker.state, swift_api.CircuitBreaker.CLOSED)
+
+
+@mock.patch.object(swift_api, '_circuit_breaker', None)
+@mock.patch.object(swift_api, 'get_swift_setting', lambda key, default=None: default)
+class SwiftAPICallTest(unittest.TestCase):
+
+    def test_requests_share_the_budget(self):
+        self.assertEqual(swift_api._budgeted_timeout((5, 60)), (5, 60))
+        with mock.patch.dict(swift_api.API_TIMEOUTS, {'status': 10}):
+            with swift_api.swift_api_call('status'):
+                connect, read = swift_api._budgeted_timeout((5, 60))
+                self.assertEqual(connect, 5)
+                self.assertLessEqual(read, 10)
+                with mock.patch.object(swift_api.time, 'monotonic', return_value=swift_api.time.monotonic() + 10):
+                    self.assertRaises(requests.Timeout, swift_api._budgeted_timeout, (5, 60))
+        self.assertEqual(swift_api._budgeted_timeout((5, 60)), (5, 60))
+
+    def test_request_failures_make_the_api_unavailable(self):
+        with self.assertRaises(swift_api.SwiftAPIUnavailable):
+            with swift_api.swift_api_call('resolve'):
+                raise requests.ConnectionError('refused')
+        with self.assertRaises(swift_api.SwiftAPIError):
+            with swift_api.swift_api_call('resolve'):
+                raise swift_api.SwiftAPIError('no such TOO')  # the API answered
+        self.assertEqual(swift_api.get_circuit_breaker()._failures, 0)
+
+    def test_local_errors_are_not_api_outcomes(self):
+        breaker = swift_api.get_circuit_breaker()
+        for _ in range(breaker.threshold - 1):
+            breaker.record_failure()
+        with self.assertRaises(KeyError):
+            with swift_api.swift_api_call('status'):
+                raise KeyError('decision')  # parsing the answer went wrong, here
+        self.assertEqual((breaker.state, breaker._failures), (swift_api.CircuitBreaker.CLOSED, breaker.threshold - 1))
+
+    def test_half_open_trial_with_a_local_error_does_not_close_the_breaker(self):
+        breaker = swift_api.get_circuit_breaker()
+        for _ in range(breaker.threshold):
+            breaker.record_failure()
+        with mock.patch.object(breaker, 'timer', return_value=breaker._opened + breaker.reset):
+            for error in (TypeError('parsing'), KeyboardInterrupt()):
+                with self.assertRaises(type(error)):
+                    with swift_api.swift_api_call('status'):
+                        self.assertEqual(breaker.state, swift_api.CircuitBreaker.HALF_OPEN)
+                        raise error
+                # the trial was given up: the breaker isn't closed, and lets the next trial through
+                self.assertEqual(breaker.state, swift_api.CircuitBreaker.HALF_OPEN)
+                self.assertEqual(breaker._failures, breaker.threshold)
+            with swift_api.swift_api_call('status'):
+                pass
+        self.assertEqual(breaker.state, swift_api.CircuitBreaker.CLOSED)
+
+
+class TOORequestStatusTest(unittest.TestCase):
+
+    def make_too_request(self, **attributes):
+        too_request = SimpleNamespace(done=False, decision=None, date_begin=None, date_end=None)
+        too_request.__dict__.update(attributes)
+        return too_request
+
+    def test_undecided_request_is_pending(self):
+        self.assertEqual(too_request_status(self.make_too_request())['state'], 'Pending')
+
+    def test_decision_is_the_state(self):
+        self.assertEqual(too_request_status(self.make_too_request(decision='Rejected'))['state'], 'Rejected')
+
+    def test_done_request_is_completed(self):
+        status = too_request_status(self.make_too_request(done=True, decision='Approved',
+                                                          date_begin=datetime(2024, 5, 1, 12, 30)))
+        self.assertEqual(status['state'], 'Completed')
+        self.assertEqual(status['scheduled_start'], datetime(2024, 5, 1, 12, 30, tzinfo=timezone.utc))
+        self.assertIsNone(status['scheduled_end'])
+
+
+class FakeTOORequests(list):
+
+    def __init__(self, entries, status):
+        super().__init__(entries)
+        self.status = status
+
+
+@mock.patch.object(swift_api, '_circuit_breaker', None)
+@mock.patch.object(swift_api, 'get_swift_setting', lambda key, default=None: default)
+class GetTOORequestsTest(unittest.TestCase):
+
+    def get_too_requests(self, errors=()):
+        queries = []
+
+        def too_requests(**params):
+            queries.append(params)
+            return FakeTOORequests([SimpleNamespace(too_id=1)], SimpleNamespace(status='Accepted', errors=list(errors)))
+
+        with mock.patch.object(swift_api, '_swift_too', return_value=SimpleNamespace(TOORequests=too_requests)), \
+                mock.patch.object(SwiftAPI, 'get_credentials', return_value=('alice', 's')):
+            begin = datetime(2024, 5, 1, 14, tzinfo=timezone(timedelta(hours=2)))
+            return SwiftAPI().get_too_requests(begin, begin + timedelta(hours=36), 100), queries
+
+    def test_queries_the_time_range_in_naive_utc(self):
+        too_requests, queries = self.get_too_requests()
+        self.assertEqual([too_request.too_id for too_request in too_requests], [1])
+        self.assertEqual(queries[0]['begin'], datetime(2024, 5, 1, 12))
+        self.assertEqual(queries[0]['length'], 1.5)
+        self.assertEqual(queries[0]['limit'], 100)
+        self.assertNotIn('detail', queries[0])  # everyone's TOO requests, not just ours
+
+    def test_errors_raise(self):
+        with self.assertRaises(swift_api.SwiftAPIError):
+            self.get_too_requests(errors=['bad begin'])
+
+
+@mock.patch.object(swift_api, '_circuit_breaker', None)
+@mock.patch.object(swift_api, 'get_swift_setting', lambda key, default=None: default)
+class GetTimelineTest(unittest.TestCase):
+
+    def get_timeline(self, planned):
+        queries = []
+
+        def query(name, runs_until):
+            def timeline_query(**params):
+                queries.append((name, params))
+                return SimpleNamespace(entries=[SimpleNamespace(obsid='00012345001')], ppstmax=runs_until,
+                                       afstmax=runs_until, status=SimpleNamespace(errors=[]))
+            return timeline_query
+
+        swift_too = SimpleNamespace(PlanQuery=query('PlanQuery', datetime(2024, 5, 8)),
+                                    ObsQuery=query('ObsQuery', datetime(2024, 5, 1, 6)))
+        with mock.patch.object(swift_api, '_swift_too', return_value=swift_too), \
+                mock.patch.object(SwiftAPI, 'get_credentials', return_value=('alice', 's')):
+            begin = datetime(2024, 5, 1, tzinfo=timezone.utc)
+            return SwiftAPI().get_timeline(planned, 65.0, -54.9, 0.2, begin, begin + timedelta(days=1)), queries
+
+    def test_as_flown_timeline_runs_until_its_afstmax(self):
+        (entries, runs_until), queries = self.get_timeline(planned=False)
+        self.assertEqual([entry.obsid for entry in entries], ['00012345001'])
+        self.assertEqual(runs_until, datetime(2024, 5, 1, 6, tzinfo=timezone.utc))
+        name, params = queries[0]
+        self.assertEqual(name, 'ObsQuery')
+        self.assertEqual((params['begin'], params['end']), (datetime(2024, 5, 1), datetime(2024, 5, 2)))
+        self.assertEqual((params['ra'], params['dec'], params['radius']), (65.0, -54.9, 0.2))
+
+    def test_plan_runs_until_its_ppstmax(self):
+        (_, runs_until), queries = self.get_timeline(planned=True)
+        self.assertEqual(queries[0][0], 'PlanQuery')
+        self.assertEqual(runs_until, datetime(2024, 5, 8, tzinfo=timezone.utc))
+
+
+class DataFileHandler(BaseHTTPRequestHandler):
+    """Serves the server's files, honouring Range requests (unless the server's ranges is False)
+    and sending only the first truncate_at bytes of a response (if the server's truncate_at is set).
+
+    With paths of the form /bucket/key, it also stands in for S3 (for unsigned, path-style requests).
+    """
+    def do_HEAD(self):
+        data = self.server.files.get(self.path)
+        if data is None:
+            self.send_error(404)
+            return
+        self.send_response(200)
+        self.send_header('Content-Length', str(len(data)))
+        self.send_header('ETag', f'"{hash(data):x}"')
+        self.end_headers()
+
+    def do_GET(self):
+        self.server.requests.append((self.path, self.headers.get('Range')))
+        data = self.server.files.get(self.path)
+        if data is None:
+            self.send_error(404)
+            return
+        start, end, status = 0, len(data) - 1, 200
+        range_header = self.headers.get('Range')
+        if range_header and self.server.ranges:
+            first, _, last = range_header.removeprefix('bytes=').partition('-')
+            start, end = int(first), min(int(last), end) if last else end
+            if start >= len(data):
+                self.send_response(416)
+                self.send_header('Content-Range', f'bytes */{len(data)}')
+                self.end_headers()
+                return
+            status = 206
+        self.send_response(status)
+        self.send_header('Content-Length', str(end + 1 - start))
+        if status == 206:
+            self.send_header('Content-Range', f'bytes {start}-{end}/{len(data)}')
+        self.end_headers()
+        body = data[start:end + 1]
+        if self.server.truncate_at is not None:
+            body = body[:self.server.truncate_at]
+            self.server.truncate_at = None  # only once
+            self.close_connection = True
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class DataFileServerTestCase(unittest.TestCase):
+    """A TestCase with a DataFileHandler server running, and a temporary download directory"""
+    handler_class = DataFileHandler
+
+    def setUp(self):
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), self.handler_class)
+        self.server.files = {f'/sw{n}.evt': os.urandom(100_000 + n) for n in range(5)}
+        self.server.ranges = True
+        self.server.truncate_at = None
+        self.server.requests = []
+        self.server.connections = 0
+        threading.Thread(target=self.server.serve_forever, kwargs={'poll_interval': 0.05}, daemon=True).start()
+        self.addCleanup(self.server.server_close)
+        self.addCleanup(self.server.shutdown)
+
+        download_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(download_dir.cleanup)
+        self.download_dir = download_dir.name
+
+    def url(self, name):
+        return f'http://127.0.0.1:{self.server.server_port}/{name}'
+
+    def read(self, path):
+        with open(path, 'rb') as data_file:
+            return data_file.read()
+
+
+class DownloadTest(DataFileServerTestCase):
+
+    def test_download_is_written_in_chunks(self):
+        path = os.path.join(self.download_dir, '00012345001', 'xrt', 'sw0.evt')
+        self.assertEqual(download_file(self.url('sw0.evt'), path, chunk_size=4096), 100_000)
+        self.assertEqual(self.read(path), self.server.files['/sw0.evt'])
+        self.assertFalse(os.path.exists(path + PARTIAL_SUFFIX))
+
+    def test_interrupted_download_is_resumed(self):
+        path = os.path.join(self.download_dir, 'sw1.evt')
+        self.server.truncate_at = 30_000
+        with self.assertRaises(requests.RequestException):
+            download_file(self.url('sw1.evt'), path, chunk_size=4096)
+        self.assertFalse(os.path.exists(path))
+        downloaded = os.path.getsize(path + PARTIAL_SUFFIX)
+        self.assertTrue(0 < downloaded <= 30_000)
+
+        download_file(self.url('sw1.evt'), path, chunk_size=4096)
+        self.assertEqual(self.read(path), self.server.files['/sw1.evt'])
+        self.assertEqual(self.server.requests[-1], ('/sw1.evt', f'bytes={downloaded}-'))
+
+    def test_download_restarts_if_the_server_ignores_the_range(self):
+        path = os.path.join(self.download_dir, 'sw2.evt')
+        with open(path + PARTIAL_SUFFIX, 'wb') as partial_file:
+            partial_file.write(b'stale')
+        self.server.ranges = False
+        download_file(self.url('sw2.evt'), path)
+        self.assertEqual(self.read(path), self.server.files['/sw2.evt'])
+
+    def test_complete_partial_file_is_not_downloaded_again(self):
+        path = os.path.join(self.download_dir, 'sw3.evt')
+        with open(path + PARTIAL_SUFFIX, 'wb') as partial_file:
+            partial_file.write(self.server.files['/sw3.evt'])
+        download_file(self.url('sw3.evt'), path)
+        self.assertEqual(self.read(path), self.server.files['/sw3.evt'])
+
+    def test_files_are_downloaded_in_parallel(self):
+        names = sorted(name.lstrip('/') for name in self.server.files) + ['missing.evt']
+        downloads = download_files([(self.url(name), os.path.join(self.download_dir, name)) for name in names],
+                                   max_workers=3)
+        self.assertEqual([download.path for download in downloads],
+                         [os.path.join(self.download_dir, name) for name in names])
+        self.assertTrue(all(download.ok for download in downloads[:-1]))
+        self.assertIn('404', downloads[-1].error)
+        for download, name in zip(downloads[:-1], names):
+            self.assertEqual(self.read(download.path), self.server.files['/' + name])
+
+
+class S3DownloadTest(DataFileServerTestCase):
+    """Downloads from the DataFileHandler standing in for the HEASARC S3 bucket"""
+
+    def setUp(self):
+        super().setUp()
+        self.endpoint_url = f'http://127.0.0.1:{self.server.server_port}'
+        self.server.files = {f'/nasa-heasarc/swift/data/obs/00012345001/sw{n}.evt': os.urandom(100_000 + n)
+                             for n in range(3)}
+
+    def archive_url(self, n):
+        return f'{HEASARC_ARCHIVE_URL}swift/data/obs/00012345001/sw{n}.evt'
+
+    def test_one_client_per_process(self):
+        self.assertIs(get_s3_client(endpoint_url=self.endpoint_url), get_s3_client(endpoint_url=self.endpoint_url))
+
+    def test_archive_files_are_downloaded_in_parts(self):
+        paths = [os.path.join(self.download_dir, f'sw{n}.evt') for n in range(3)]
+        downloads = download_s3_files([(self.archive_url(n), path) for n, path in enumerate(paths)],
+                                      endpoint_url=self.endpoint_url, max_concurrency=4,
+                                      multipart_threshold=64 * 1024, multipart_chunksize=32 * 1024)
+        self.assertTrue(all(download.ok for download in downloads))
+        for n, path in enumerate(paths):
+            self.assertEqual(self.read(path), self.server.files[f'/nasa-heasarc/swift/data/obs/00012345001/sw{n}.evt'])
+            self.assertFalse(os.path.exists(path + PARTIAL_SUFFIX))
+        ranges = [range_header for _, range_header in self.server.requests]
+        self.assertIn('bytes=32768-65535', ranges)
+
+    def test_missing_archive_file(self):
+        path = os.path.join(self.download_dir, 'sw9.evt')
+        download, = download_s3_files([(self.archive_url(9), path)], endpoint_url=self.endpoint_url)
+        self.assertFalse(download.ok)
+        self.assertFalse(os.path.exists(path))
+
+    def test_files_outside_the_archive_are_downloaded_over_http(self):
+        self.server.files['/quicklook/sw0.evt'] = b'quicklook data'
+        path = os.path.join(self.download_dir, 'quicklook.evt')
+        download, = download_s3_files([(self.url('quicklook/sw0.evt'), path)], endpoint_url=self.endpoint_url)
+        self.assertTrue(download.ok)
+        self.assertEqual(self.read(path), b'quicklook data')
+
+
+class VisibilityTest(unittest.TestCase):
+    def setUp(self):
+        patcher = mock.patch.object(visibility, '_visibility_cache', TTLCache(maxsize=100, ttl=60))
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def sun_ra_dec(self, when):
+        x, y, z = visibility.sun_vector(visibility.julian_date([when]))[0]
+        return visibility.np.degrees(visibility.np.arctan2(y, x)) % 360, visibility.np.degrees(visibility.np.arcsin(z))
+
+    def test_sun_position(self):
+        ra, dec = self.sun_ra_dec(datetime(2025, 3, 20, 9, 1, tzinfo=timezone.utc))  # the March equinox
+        # (J2000 coordinates, which the equinox of date has precessed about 0.35 degrees along the ecliptic from)
+        self.assertAlmostEqual(dec, 0.0, delta=0.2)
+        self.assertLess(min(ra, 360 - ra), 0.4)
+        ra, dec = self.sun_ra_dec(datetime(2025, 6, 21, 2, 42, tzinfo=timezone.utc))  # the June solstice
+        self.assertAlmostEqual(dec, 23.44, delta=0.05)
+        self.assertAlmostEqual(ra, 90.0, delta=0.4)
+
+    def test_sun_constraint(self):
+        when = datetime(2025, 6, 21, tzinfo=timezone.utc)
+        ra, dec = self.sun_ra_dec(when)
+        jd = visibility.julian_date([when])
+        self.assertFalse(visibility.sun_moon_observable(ra, dec, jd)[0])
+        self.assertTrue(visibility.sun_moon_observable((ra + 180) % 360, -dec, jd)[0])
+
+    def test_earth_limb_fraction(self):
+        equatorial = visibility.earth_limb_fraction(0.0, 0.0)
+        self.assertAlmostEqual(equatorial, 0.46, delta=0.02)
+        # the north pole is never more than 21 degrees from the pole of Swift's orbit, so is blocked for longer
+        self.assertLess(visibility.earth_limb_fraction(0.0, 90.0), equatorial)
+
+    def test_windows_are_joined_across_days(self):
+        # a target 90 degrees from the ecliptic is never near the Sun or the Moon
+        windows = visibility.get_visibility_windows(270.0, 66.56, start=date(2025, 1, 1), days=3)
+        self.assertEqual(len(windows), 1)
+        self.assertEqual(windows[0].start, datetime(2025, 1, 1, tzinfo=timezone.utc))
+        self.assertEqual(windows[0].end, datetime(2025, 1, 4, tzinfo=timezone.utc))
+        self.assertEqual(windows[0].duration, timedelta(days=3))
+
+    def test_windows_are_cached_per_day(self):
+        with mock.patch.object(visibility, 'sun_moon_observable', wraps=visibility.sun_moon_observable) as observable:
+            first = visibility.get_visibility_windows(10.0, 20.0, start=date(2025, 1, 1), days=7)
+            self.assertEqual(observable.call_count, 1)
+            self.assertEqual(visibility.get_visibility_windows(10.0, 20.0, start=date(2025, 1, 1), days=7), first)
+            self.assertEqual(observable.call_count, 1)
+            # only the day not yet cached is computed
+            visibility.get_visibility_windows(10.0, 20.0, start=date(2025, 1, 2), days=7)
+            self.assertEqual(observable.call_count, 2)
+            self.assertEqual(observable.call_args.args[2].shape, (24 * 6,))
+
+    def test_sun_avoidance_window(self):
+        # the Sun passes RA 0 at the March equinox
+        self.assertEqual(visibility.get_visibility_windows(0.0, 0.0, start=date(2025, 3, 15), days=10), [])
+        self.assertTrue(visibility.get_visibility_windows(180.0, 0.0, start=date(2025, 3, 15), days=10))
+
+    def test_bulk_windows_match_single_target_windows(self):
+        coordinates = [(0.0, 0.0), (180.0, 0.0), (270.0, 66.56), (65.0017, -54.9379)]
+        start = datetime(2025, 3, 15, tzinfo=timezone.utc)
+        bulk = visibility.get_bulk_visibility_windows(coordinates, start=start, days=10, chunk_size=3, processes=1)
+        self.assertEqual(len(bulk), len(coordinates))
+        self.assertEqual(bulk[0], [])
+        for (ra, dec), windows in zip(coordinates, bulk):
+            self.assertEqual(windows, visibility.get_visibility_windows(ra, dec, start=start.date(), days=10))
+
+    def test_bulk_windows_in_processes(self):
+        coordinates = [(ra, -30.0) for ra in range(0, 360, 30)]
+        start = datetime(2025, 3, 15, tzinfo=timezone.utc)
+        self.assertEqual(visibility.get_bulk_visibility_windows(coordinates, start=start, days=2, chunk_size=5,
+                                                                processes=2),
+                         visibility.get_bulk_visibility_windows(coordinates, start=start, days=2, processes=1))
+
+
+class KeepAliveDataFileHandler(DataFileHandler):
+    """A DataFileHandler that keeps connections alive, and counts them."""
+    protocol_version = 'HTTP/1.1'
+
+    def setup(self):
+        super().setup()
+        self.server.connections += 1
+
+
+@mock.patch.object(swift_api, 'get_swift_setting', lambda key, default=None: default)
+class SwiftSessionTest(DataFileServerTestCase):
+    handler_class = KeepAliveDataFileHandler
+
+    def setUp(self):
+        super().setUp()
+        patcher = mock.patch.object(swift_api, '_swift_session', None)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_requests_reuse_connections(self):
+        swift_requests = swift_api._SessionRequests(swift_api.get_swift_session(), swift_api.HTTP_TIMEOUT)
+        for n in range(3):
+            response = swift_requests.get(self.url(f'sw{n}.evt'))
+            self.assertEqual(response.content, self.server.files[f'/sw{n}.evt'])
+        self.assertEqual(self.server.connections, 1)
+
+    def test_requests_have_a_timeout(self):
+        session = mock.Mock()
+        swift_requests = swift_api._SessionRequests(session, (1, 2))
+        swift_requests.post(url='https://example.com', data={'jwt': 'x'})
+        session.post.assert_called_once_with('https://example.com', data={'jwt': 'x'}, timeout=(1, 2))
+        swift_requests.get('https://example.com', timeout=10)
+        session.get.assert_called_once_with('https://example.com', timeout=10)
+        self.assertIs(swift_requests.exceptions, requests.exceptions)
+
+    def test_session_is_installed_into_swifttools(self):
+        from swifttools.swift_too import api_common, swift_data
+        for module in (api_common, swift_data):
+            patcher = mock.patch.object(module, 'requests', requests)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        swift_api._swift_too()
+        self.assertIsInstance(api_common.requests, swift_api._SessionRequests)
+        self.assertIs(api_common.requests.session, swift_api.get_swift_session())
+        self.assertIs(swift_data.requests.session, swift_api.get_swift_session())
+
+
 if __name__ == '__main__':
     unittest.main()
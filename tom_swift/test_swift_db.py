@@ -0,0 +1,1106 @@
+"""Tests of tom_swift that need Django: its settings, a (test) database, and the TOM Toolkit apps.
+
+Django's test runner sets them up, with the settings of tom_swift.test_settings:
+
+    python -m django test --settings=tom_swift.test_settings
+
+They send their Swift TOO API requests to the in-process fake of tom_swift.fake_swift_api,
+which counts them, so what is tested is how many requests tom_swift makes, as well as what it does.
+"""
+from datetime import datetime, timedelta, timezone
+import functools
+import hashlib
+import io
+import os
+import tempfile
+from types import SimpleNamespace
+from unittest import mock
+
+import requests
+from django.conf import settings
+from django.core.management import CommandError, call_command
+from django.contrib.auth.models import AnonymousUser, Group, User
+from django.core.cache import caches
+from django.test import RequestFactory, TestCase, override_settings
+from django.urls import reverse
+from django.utils.timezone import now as timezone_now
+
+from tom_dataproducts.models import DataProduct
+from tom_observations.models import ObservationGroup, ObservationRecord
+from tom_targets.models import Target, TargetList
+
+from tom_swift import bulk, mirror, polling, store, submission, swift_api, timeline, tracing, visibility
+from tom_swift.cache import TTLCache
+from tom_swift.downloads import Download
+from tom_swift.fake_swift_api import FakeSession, FakeSwiftTOOAPI
+from tom_swift.models import (SwiftDataFile, SwiftPollState, SwiftStoredFile, SwiftSubmission,
+                              SwiftTimelineEntry, SwiftTimelineSync, SwiftTOORequestMirror)
+from tom_swift.swift import SwiftFacility, SwiftObservationForm
+from tom_swift.testing import FORM_DATA
+from tom_swift.views import MetricsView
+
+
+def swift_settings(**swift_settings):
+    """Return override_settings() of the test settings, with the swift_settings in FACILITIES['SWIFT']."""
+    return override_settings(FACILITIES={**settings.FACILITIES,
+                                         'SWIFT': {**settings.FACILITIES['SWIFT'], **swift_settings}})
+
+
+class SwiftTestCase(TestCase):
+    """Sends the Swift TOO API requests to a new FakeSwiftTOOAPI (self.api), with tom_swift's caches empty."""
+
+    def setUp(self):
+        from swifttools.swift_too import api_common, swift_data
+        swift_api._swift_too()  # installs the Swift session into swifttools, to be patched here
+        self.api = FakeSwiftTOOAPI()
+        session = FakeSession(self.api)
+        for owner, attribute, value in ((swift_api, '_swift_session', session),
+                                        (api_common.requests, 'session', session),
+                                        (swift_data.requests, 'session', session),
+                                        (swift_api, '_resolver_cache', None),
+                                        (swift_api, '_server_validate_cache', None),
+                                        (swift_api, '_circuit_breaker', None)):
+            patcher = mock.patch.object(owner, attribute, value)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        caches['default'].clear()
+
+        self.target = Target.objects.create(name='NGC 1566', type=Target.SIDEREAL, ra=65.0017, dec=-54.9379)
+        self.facility = SwiftFacility()
+
+    def use_api(self, api, session_class=FakeSession):
+        """Send the Swift TOO API requests to api (through a session_class) instead of self.api."""
+        from swifttools.swift_too import api_common, swift_data
+        self.api = api
+        session = session_class(api)
+        for owner, attribute in ((swift_api, '_swift_session'), (api_common.requests, 'session'),
+                                 (swift_data.requests, 'session')):
+            patcher = mock.patch.object(owner, attribute, session)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        return session
+
+    def observation_record(self, observation_id, status='Pending', **fields):
+        """Create and return a Swift ObservationRecord of self.target."""
+        return ObservationRecord.objects.create(**{'target': self.target, 'facility': 'Swift', 'parameters': {},
+                                                   'observation_id': str(observation_id), 'status': status,
+                                                   **fields})
+
+    def observation_payload(self, target=None, **overrides):
+        """Return the observation payload of the observation form, filled in with FORM_DATA (and overrides)."""
+        target = target or self.target
+        form = SwiftObservationForm({**FORM_DATA, 'target_id': target.id, **overrides}, facility=self.facility)
+        self.assertFalse(form.errors)
+        return form.observation_payload()
+
+
+class ConfigureTOOTest(SwiftTestCase):
+
+    def test_validating_asks_the_api_once(self):
+        payload = self.observation_payload()
+        self.assertEqual(self.facility.validate_observation(payload), [])
+        # the ra and dec come from the Target: the source name isn't resolved
+        self.assertEqual(self.api.requests, {'Swift_TOO_Request': 1})
+        self.assertEqual(self.facility.validate_observation(payload), [])
+        self.assertEqual(self.api.requests, {'Swift_TOO_Request': 1})  # remembered (see SwiftAPI.server_validate())
+
+    def test_too_has_the_target_position_and_name(self):
+        too = self.facility._configure_too(self.observation_payload())
+        self.assertEqual((too.source_name, too.ra, too.dec), ('NGC 1566', 65.0017, -54.9379))
+        self.assertEqual(self.api.requests, {})
+
+
+class ObservationFormChoicesTest(SwiftTestCase):
+
+    def setUp(self):
+        super().setUp()
+        for choices_function in (swift_api.get_observation_type_choices, swift_api.get_grb_detector_choices,
+                                 swift_api.get_monitoring_unit_choices):
+            choices_function.cache_clear()
+            self.addCleanup(choices_function.cache_clear)
+
+    def test_snapshot_choices_are_used_lazily_if_swifttools_fails(self):
+        failing_swift_too = SimpleNamespace(TOO=mock.Mock(side_effect=requests.ConnectionError('unreachable')))
+        with mock.patch.object(swift_api, '_swift_too', return_value=failing_swift_too), \
+                self.assertLogs(swift_api.logger, 'WARNING'):
+            form = SwiftObservationForm({**FORM_DATA, 'target_id': self.target.id}, facility=self.facility)
+            failing_swift_too.TOO.assert_not_called()  # not until the choices are wanted
+
+            self.assertEqual([value for value, _ in form.fields['monitoring_units'].choices],
+                             swift_api.SWIFT_TOO_CHOICES_SNAPSHOT['monitoring_units'])
+            self.assertFalse(form.errors)
+        self.assertEqual(failing_swift_too.TOO.call_count, 3)  # once for each of the choices
+
+
+class CircuitBreakerOpenTest(SwiftTestCase):
+
+    def setUp(self):
+        super().setUp()
+        breaker = swift_api.get_circuit_breaker()
+        for _ in range(breaker.threshold):
+            breaker.record_failure()
+        self.assertEqual(breaker.state, swift_api.CircuitBreaker.OPEN)
+
+    def test_validating_sends_no_requests(self):
+        errors = self.facility.validate_observation(self.observation_payload())
+        self.assertTrue(any('has been failing' in error for error in errors))
+        self.assertEqual(self.api.requests, {})
+
+    def test_resolving_sends_no_requests(self):
+        too = self.facility._configure_too({**self.observation_payload(), 'ra': None, 'dec': None})
+        self.assertIn('Could not resolve name.', too.status.errors)
+        self.assertEqual(self.api.requests, {})
+
+    def test_submitting_sends_no_requests(self):
+        self.assertEqual(self.facility.submit_observation(self.observation_payload()), [None])
+        self.assertEqual(self.api.requests, {})
+
+
+class UnresolvingSwiftTOOAPI(FakeSwiftTOOAPI):
+    """A FakeSwiftTOOAPI that can't resolve any name."""
+
+    def resolve(self, data):
+        return self._response('Swift_Resolve', {
+            'ra': None, 'dec': None, 'resolver': None,
+            'status': {'api_name': 'Swift_TOO_Status',
+                       'api_data': self._status('Rejected', ['Could not resolve name.'])},
+        })
+
+
+class UnreachableSession(FakeSession):
+    """A FakeSession whose requests fail to connect while self.unreachable is true."""
+    unreachable = True
+
+    def post(self, url, data=None, **kwargs):
+        if self.unreachable:
+            raise requests.ConnectionError('Connection refused')
+        return super().post(url, data, **kwargs)
+
+
+class ResolverCacheTest(SwiftTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.now = 0.0
+        patcher = mock.patch.object(swift_api, '_resolver_cache', TTLCache(timer=lambda: self.now))
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_resolved_name_is_cached(self):
+        resolved_target = swift_api.SwiftAPI().resolve_name('NGC 1566')
+        self.assertTrue(resolved_target.is_resolved)
+        self.assertEqual(swift_api.SwiftAPI().resolve_name(' ngc  1566 '), resolved_target)
+        self.assertEqual(self.api.requests, {'Swift_Resolve': 1})
+
+        self.now += swift_api.RESOLVER_CACHE_TTL + 1
+        caches['default'].clear()
+        swift_api.SwiftAPI().resolve_name('NGC 1566')
+        self.assertEqual(self.api.requests, {'Swift_Resolve': 2})
+
+    def test_cache_hit_is_traced_once(self):
+        swift_api.SwiftAPI().resolve_name('NGC 1566')
+        with self.assertLogs(swift_api.logger, 'DEBUG') as logs:
+            swift_api.SwiftAPI().resolve_name('NGC 1566')
+        traces = [getattr(record, tracing.TRACE_ATTRIBUTE) for record in logs.records
+                  if getattr(record, tracing.TRACE_ATTRIBUTE, {}).get('event') == 'resolve_name']
+        self.assertEqual(len(traces), 1)
+        self.assertTrue(traces[0]['cached'])
+
+    def test_unresolved_name_is_cached_briefly(self):
+        self.use_api(UnresolvingSwiftTOOAPI())
+        with swift_settings(RESOLVER_CACHE=None):
+            self.assertIsNone(swift_api.SwiftAPI().resolve_name('Nowhere'))
+            self.now += swift_api.RESOLVER_CACHE_NEGATIVE_TTL - 1
+            self.assertIsNone(swift_api.SwiftAPI().resolve_name('Nowhere'))
+            self.assertEqual(self.api.requests, {'Swift_Resolve': 1})
+            self.now += 2
+            self.assertIsNone(swift_api.SwiftAPI().resolve_name('Nowhere'))
+            self.assertEqual(self.api.requests, {'Swift_Resolve': 2})
+
+    def test_resolved_name_is_shared_through_the_django_cache(self):
+        resolved_target = swift_api.SwiftAPI().resolve_name('NGC 1566')
+        with mock.patch.object(swift_api, '_resolver_cache', None):  # as in another process
+            self.assertEqual(swift_api.SwiftAPI().resolve_name('NGC 1566'), resolved_target)
+        self.assertEqual(self.api.requests, {'Swift_Resolve': 1})
+
+    def test_unreachable_api_is_not_cached(self):
+        session = self.use_api(FakeSwiftTOOAPI(), UnreachableSession)
+        self.assertIsNone(swift_api.SwiftAPI().resolve_name('NGC 1566'))
+        self.assertEqual(self.api.requests, {})
+
+        session.unreachable = False
+        self.assertTrue(swift_api.SwiftAPI().resolve_name('NGC 1566').is_resolved)
+        self.assertEqual(self.api.requests, {'Swift_Resolve': 1})
+
+    def test_too_without_a_position_is_resolved_through_the_cache(self):
+        payload = {**self.observation_payload(), 'ra': None, 'dec': None}
+        resolved_target = swift_api.SwiftAPI().resolve_name('NGC 1566')
+        too = self.facility._configure_too(payload)
+        self.assertEqual((too.ra, too.dec), (resolved_target.ra, resolved_target.dec))
+        self.assertEqual(self.api.requests, {'Swift_Resolve': 1})
+
+
+class ValidatedTOOReuseTest(SwiftTestCase):
+
+    def test_submit_reuses_the_validated_too(self):
+        payload = self.observation_payload()
+        with mock.patch.object(self.facility, '_configure_too', wraps=self.facility._configure_too) as configure_too:
+            self.assertEqual(self.facility.validate_observation(payload), [])
+            self.assertEqual(self.facility.submit_observation(payload), [20000])
+        self.assertEqual(configure_too.call_count, 1)
+        # one Swift_TOO_Request to validate, and one to submit
+        self.assertEqual(self.api.requests, {'Swift_TOO_Request': 2})
+        self.assertEqual(len(self.facility._validated_toos), 0)
+
+    @swift_settings(SUBMISSION_QUEUE=True)
+    def test_queued_submission_drops_the_validated_too(self):
+        payload = self.observation_payload()
+        self.assertEqual(self.facility.validate_observation(payload), [])
+        self.assertEqual(len(self.facility._validated_toos), 1)
+        [observation_id] = self.facility.submit_observation(payload)
+        self.assertTrue(submission.is_queued_observation_id(observation_id))
+        self.assertEqual(len(self.facility._validated_toos), 0)
+
+    def test_changed_payload_is_validated_again(self):
+        payload = self.observation_payload()
+        changed_payload = self.observation_payload(exposure=2000.0)
+        self.assertEqual(self.facility.validate_observation(payload), [])
+        self.assertEqual(self.facility.validate_observation(changed_payload), [])
+        self.assertEqual(self.api.requests, {'Swift_TOO_Request': 2})
+
+        with mock.patch.object(self.facility, '_configure_too', wraps=self.facility._configure_too) as configure_too:
+            self.facility.submit_observation(self.observation_payload(exposure=3000.0))
+        self.assertEqual(configure_too.call_count, 1)  # not the TOO validated with another exposure
+        self.assertEqual(self.api.toos[20000]['exposure'], 3000.0)
+
+
+class UpdateObservationStatusesTest(SwiftTestCase):
+
+    def test_changed_records_are_saved_with_one_query(self):
+        start, end = datetime(2026, 1, 2, tzinfo=timezone.utc), datetime(2026, 1, 3, tzinfo=timezone.utc)
+        approved = self.observation_record(1)
+        rescheduled = self.observation_record(2, status='Approved')
+        unchanged = self.observation_record(3, status='Approved', scheduled_start=start, scheduled_end=end)
+        not_submitted = self.observation_record(None)
+        statuses = {
+            1: {'state': 'Approved', 'scheduled_start': None, 'scheduled_end': None},
+            2: {'state': 'Approved', 'scheduled_start': start, 'scheduled_end': end},
+            3: {'state': 'Approved', 'scheduled_start': start, 'scheduled_end': end},
+        }
+        with mock.patch.object(self.facility.swift_api, 'get_too_request_statuses', return_value=statuses), \
+                mock.patch('tom_swift.swift.run_hook') as run_hook, \
+                mock.patch.object(ObservationRecord, 'save') as save:
+            with self.assertNumQueries(1):
+                errors = self.facility.update_observation_statuses([approved, rescheduled, unchanged, not_submitted])
+        self.assertEqual(errors, [])
+        save.assert_not_called()
+        run_hook.assert_called_once_with('observation_change_state', approved, 'Pending')
+
+        modified = unchanged.modified
+        for record in (approved, rescheduled, unchanged, not_submitted):
+            record.refresh_from_db()
+        self.assertEqual((approved.status, approved.scheduled_start), ('Approved', None))
+        self.assertEqual((rescheduled.scheduled_start, rescheduled.scheduled_end), (start, end))
+        self.assertEqual(unchanged.modified, modified)
+        self.assertEqual(not_submitted.status, 'Pending')
+
+    def test_nothing_is_saved_when_nothing_changed(self):
+        record = self.observation_record(1, status='Approved')
+        statuses = {1: {'state': 'Approved', 'scheduled_start': None, 'scheduled_end': None}}
+        with mock.patch.object(self.facility.swift_api, 'get_too_request_statuses', return_value=statuses), \
+                mock.patch('tom_swift.swift.run_hook') as run_hook:
+            with self.assertNumQueries(0):
+                self.assertEqual(self.facility.update_observation_statuses([record]), [])
+        run_hook.assert_not_called()
+
+
+class PollingTest(SwiftTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.now = datetime(2026, 1, 1, tzinfo=timezone.utc)
+        self.statuses = {}  # {observation_id: the status the next poll finds}
+        patcher = mock.patch.object(self.facility, 'update_observation_statuses', side_effect=self.update_statuses)
+        self.update_observation_statuses = patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def update_statuses(self, records):
+        for record in records:
+            record.status = self.statuses.get(record.observation_id, record.status)
+        return []
+
+    def poll(self, after=timedelta(0), **kwargs):
+        self.now += after
+        return polling.poll_due_observations(facility=self.facility, now=self.now, **kwargs)
+
+    def poll_state(self, record):
+        return SwiftPollState.objects.get(observation_record=record)
+
+    def test_only_open_swift_too_requests_are_scheduled(self):
+        open_record = self.observation_record(1, parameters={'urgency': 1})
+        for observation_id, status, parameters in ((2, 'Completed', {}),
+                                                   ('queued-1', 'Pending submission', {}),
+                                                   (None, 'Pending', {}),
+                                                   ('debug', 'Pending', {}),
+                                                   (20000, 'Pending', {'debug': True})):
+            self.observation_record(observation_id, status, parameters=parameters)
+        self.assertEqual(polling.schedule_open_observations(self.facility, self.now), (1, 0))
+        self.assertEqual([(poll_state.observation_record, poll_state.urgency, poll_state.next_poll)
+                          for poll_state in SwiftPollState.objects.all()], [(open_record, 1, self.now)])
+
+    def test_unchanged_status_backs_off(self):
+        record = self.observation_record(1, parameters={'urgency': 2})
+        self.poll()
+        self.assertEqual(self.poll_state(record).next_poll, self.now + polling.poll_interval(2, 1))
+        self.assertEqual(polling.poll_interval(2, 1), timedelta(hours=1))
+
+        self.poll(timedelta(minutes=59))  # not due yet
+        self.assertEqual(self.update_observation_statuses.call_count, 1)
+        self.poll(timedelta(minutes=1))
+        self.assertEqual(self.poll_state(record).unchanged_polls, 2)
+        self.assertEqual(self.poll_state(record).next_poll, self.now + timedelta(hours=2))
+
+        for _ in range(5):
+            self.poll(timedelta(days=1))
+        self.assertEqual(self.poll_state(record).next_poll, self.now + timedelta(hours=3))  # the maximum
+
+    def test_changed_status_resets_the_interval(self):
+        record = self.observation_record(1, parameters={'urgency': 2})
+        self.poll()
+        self.poll(timedelta(hours=1))
+        self.statuses['1'] = 'Approved'
+        self.poll(timedelta(hours=2))
+        self.assertEqual(self.poll_state(record).unchanged_polls, 0)
+        self.assertEqual(self.poll_state(record).next_poll, self.now + timedelta(minutes=30))
+
+    def test_terminal_records_are_no_longer_polled(self):
+        record = self.observation_record(1)
+        self.statuses['1'] = 'Completed'
+        self.poll()
+        self.assertFalse(SwiftPollState.objects.filter(observation_record=record).exists())
+
+    def test_most_urgent_records_are_polled_first(self):
+        self.observation_record(1, parameters={'urgency': 3})
+        urgent = self.observation_record(2, parameters={'urgency': 0})
+        self.poll(limit=1)
+        self.assertEqual(self.update_observation_statuses.call_args.args[0], [urgent])
+
+    def test_records_without_a_too_id_are_no_longer_polled(self):
+        record = self.observation_record(None)
+        SwiftPollState.objects.create(observation_record=record, next_poll=self.now)  # e.g. scheduled before
+        self.assertEqual(self.poll(), [])
+        self.update_observation_statuses.assert_not_called()
+        self.assertFalse(SwiftPollState.objects.exists())
+
+
+def listed_file(obsid, filename, url=None):
+    """Return a swift_api.SwiftDataFile, as SwiftAPI.get_too_data_files() lists it."""
+    return swift_api.SwiftDataFile(obsid=obsid, begin=None, path=f'{obsid}/xrt/event', filename=filename,
+                                   url=url or f'https://swift.example/{obsid}/xrt/event/{filename}', type='Event file')
+
+
+class GetDataFilesTest(SwiftTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.now = datetime(2026, 1, 1, tzinfo=timezone.utc)
+        self.swift_api = mock.Mock()
+        self.swift_api.get_too_data_files.return_value = [listed_file('00012345001', 'a.evt.gz'),
+                                                          listed_file('00012345001', 'b.evt.gz')]
+
+    def get_data_files(self, too_id=1, after=timedelta(0), **kwargs):
+        self.now += after
+        return store.get_data_files(too_id, self.swift_api, max_age=60, now=self.now, **kwargs)
+
+    def test_listing_is_indexed(self):
+        data_files = self.get_data_files()
+        self.assertEqual([(data_file.product_id, data_file.instrument) for data_file in data_files],
+                         [('00012345001/xrt/event/a.evt.gz', 'xrt'), ('00012345001/xrt/event/b.evt.gz', 'xrt')])
+        self.assertEqual(self.get_data_files(after=timedelta(seconds=59)), data_files)
+        self.assertEqual(self.swift_api.get_too_data_files.call_count, 1)
+
+        self.get_data_files(after=timedelta(seconds=2))  # older than max_age
+        self.assertEqual(self.swift_api.get_too_data_files.call_count, 2)
+
+    def test_listing_is_kept_while_nothing_new_is_observed(self):
+        self.get_data_files()
+        self.get_data_files(after=timedelta(hours=1), observed_obsids={'00012345001'})
+        self.assertEqual(self.swift_api.get_too_data_files.call_count, 1)
+        self.get_data_files(observed_obsids={'00012345001', '00012345002'})
+        self.assertEqual(self.swift_api.get_too_data_files.call_count, 2)
+
+    def test_files_of_overlapping_toos_are_indexed_once(self):
+        self.get_data_files(1)
+        self.get_data_files(2)
+        self.assertEqual(SwiftDataFile.objects.count(), 2)
+
+    def test_moved_file_forgets_its_checksum(self):
+        data_file = self.get_data_files()[0]
+        SwiftDataFile.objects.filter(pk=data_file.pk).update(sha256='0' * 64, size=1)
+        self.swift_api.get_too_data_files.return_value = [listed_file('00012345001', 'a.evt.gz', 'https://elsewhere')]
+        moved_file, = self.get_data_files(after=timedelta(hours=1))
+        self.assertEqual((moved_file.url, moved_file.sha256, moved_file.size), ('https://elsewhere', '', None))
+
+
+class DataFileStoreTest(SwiftTestCase):
+
+    def setUp(self):
+        super().setUp()
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.directory = directory.name
+        self.store = store.DataFileStore(root=os.path.join(self.directory, 'store'), max_size=10)
+        self.swift_api = mock.Mock()
+        self.swift_api.get_too_data_files.return_value = [listed_file('00012345001', f'{name}.evt.gz')
+                                                          for name in 'abc']
+        self.data_files = store.get_data_files(1, self.swift_api)
+
+    def download(self, content: bytes) -> str:
+        """Return the path of a downloaded file with the content."""
+        with tempfile.NamedTemporaryFile(dir=self.directory, delete=False) as downloaded_file:
+            downloaded_file.write(content)
+        return downloaded_file.name
+
+    def test_same_content_is_stored_once(self):
+        a, b, _ = self.data_files
+        path = self.store.add(a, self.download(b'12345'))
+        downloaded = self.download(b'12345')
+        self.assertEqual(self.store.add(b, downloaded), path)
+        self.assertFalse(os.path.exists(downloaded))
+        self.assertEqual(SwiftStoredFile.objects.count(), 1)
+        self.assertEqual(self.store.size(), 5)
+        self.assertEqual((self.store.get(a), self.store.get(b)), (path, path))
+
+    def test_file_with_a_known_checksum_is_found(self):
+        a, b, _ = self.data_files
+        path = self.store.add(a, self.download(b'12345'))
+        b.sha256 = a.sha256  # e.g. the same file, listed again under another name
+        self.assertEqual(self.store.get(b), path)
+        self.assertEqual(SwiftDataFile.objects.get(pk=b.pk).stored_file, a.stored_file)
+
+    def test_least_recently_used_files_are_evicted(self):
+        a, b, c = self.data_files
+        paths = []
+        for minutes, (data_file, content) in enumerate(((a, b'aaaa'), (b, b'bbbb'), (c, b'cccc'))):
+            paths.append(self.store.add(data_file, self.download(content)))
+            SwiftStoredFile.objects.filter(pk=data_file.stored_file.pk).update(
+                last_used=datetime(2026, 1, 1, 0, minutes, tzinfo=timezone.utc))
+        self.store.get(a)  # now used after b
+        self.assertEqual(self.store.evict(), 1)
+        self.assertEqual([os.path.exists(path) for path in paths], [True, False, True])
+        self.assertEqual(self.store.size(), 8)
+        b.refresh_from_db()
+        self.assertIsNone(self.store.get(b))
+        self.assertEqual(b.sha256, hashlib.sha256(b'bbbb').hexdigest())  # the index keeps the checksum
+        self.assertEqual(self.store.evict(), 0)
+
+    def test_missing_file_is_forgotten(self):
+        a = self.data_files[0]
+        os.remove(self.store.add(a, self.download(b'12345')))
+        self.assertIsNone(self.store.get(a))
+        self.assertFalse(SwiftStoredFile.objects.exists())
+
+
+class RejectingSwiftTOOAPI(FakeSwiftTOOAPI):
+    """A FakeSwiftTOOAPI that rejects every TOO submitted to it."""
+
+    def too_request(self, data):
+        if data.get('validate_only'):
+            return super().too_request(data)
+        return self._response('Swift_TOO_Status', self._status('Rejected', ['Too faint.']))
+
+
+@swift_settings(SUBMISSION_QUEUE=True)
+class SubmissionQueueTest(SwiftTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.now = timezone_now() + timedelta(seconds=1)  # when the submissions queued in the test are due
+
+    def enqueue(self, **overrides):
+        """Queue the observation payload (with overrides), as the view does, and return its SwiftSubmission."""
+        observation_id, = self.facility.submit_observation(self.observation_payload(**overrides))
+        return SwiftSubmission.objects.get(observation_id=observation_id)
+
+    def test_payload_without_json_values_is_queued(self):
+        group = Group.objects.create(name='Swift observers')
+        with override_settings(TARGET_PERMISSIONS_ONLY=False):
+            form = SwiftObservationForm({**FORM_DATA, 'target_id': self.target.id, 'groups': [group.id]},
+                                        facility=self.facility)
+            form.fields['groups'].queryset = Group.objects.all()  # as the view does, with the user's groups
+            self.assertFalse(form.errors)
+            self.assertEqual(list(form.observation_payload()['groups']), [group])
+            observation_id, = self.facility.submit_observation(form.observation_payload())
+
+        queued = SwiftSubmission.objects.get(observation_id=observation_id)
+        self.assertNotIn('groups', queued.payload)
+        self.assertEqual(queued.payload['exposure'], FORM_DATA['exposure'])
+        self.assertEqual(self.api.requests, {})
+
+        self.assertEqual(submission.process_submission_queue(facility=self.facility), {'submitted': 1, 'retrying': 0,
+                                                                                       'failed': 0})
+        self.assertEqual(self.api.toos[20000]['source_name'], 'NGC 1566')
+
+    def test_most_urgent_submission_is_claimed_once(self):
+        later = self.enqueue(urgency=3)
+        urgent = self.enqueue(urgency=0)
+        not_due = self.enqueue(urgency=0)
+        SwiftSubmission.objects.filter(pk=not_due.pk).update(next_attempt=self.now + timedelta(minutes=1))
+
+        claimed = submission._claim_next_submission(self.now)
+        self.assertEqual((claimed, claimed.state, claimed.claimed), (urgent, SwiftSubmission.SUBMITTING, self.now))
+        self.assertEqual(SwiftSubmission.objects.get(pk=urgent.pk).state, SwiftSubmission.SUBMITTING)
+        self.assertEqual(submission._claim_next_submission(self.now), later)
+        self.assertIsNone(submission._claim_next_submission(self.now))
+
+    def test_submission_claimed_meanwhile_is_not_claimed_again(self):
+        first, second = self.enqueue(), self.enqueue()
+        filter_submissions = SwiftSubmission.objects.filter
+        lookups = []
+
+        def claimed_by_another_worker(*args, **kwargs):
+            lookups.append(kwargs)
+            if len(lookups) == 2:
+                # another worker claims the first submission between this one finding it and claiming it
+                filter_submissions(pk=first.pk).update(state=SwiftSubmission.SUBMITTING)
+            return filter_submissions(*args, **kwargs)
+        with mock.patch.object(SwiftSubmission.objects, 'filter', side_effect=claimed_by_another_worker):
+            self.assertEqual(submission._claim_next_submission(self.now), second)
+
+    def test_accepted_submission_links_its_record(self):
+        queued = self.enqueue()
+        record = self.observation_record(queued.observation_id)  # the view creates it after queueing
+        self.assertEqual(ObservationRecord.objects.get(pk=record.pk).status, swift_api.SWIFT_PENDING_SUBMISSION_STATE)
+
+        submitted = submission.submit_queued(submission._claim_next_submission(self.now), self.facility, self.now)
+        self.assertEqual((submitted.state, submitted.too_id, submitted.submitted, submitted.attempts),
+                         (SwiftSubmission.SUBMITTED, 20000, self.now, 1))
+        record.refresh_from_db()
+        self.assertEqual((record.observation_id, record.status), ('20000', swift_api.SWIFT_PENDING_STATE))
+
+    def test_record_created_after_submission_gets_its_outcome(self):
+        queued = self.enqueue()
+        submission.submit_queued(submission._claim_next_submission(self.now), self.facility, self.now)
+        record = self.observation_record(queued.observation_id)
+        self.assertEqual((record.observation_id, record.status), ('20000', swift_api.SWIFT_PENDING_STATE))
+        self.assertEqual(SwiftSubmission.objects.get(pk=queued.pk).observation_record, record)
+
+    def test_unreachable_api_is_tried_again(self):
+        self.enqueue()
+        from swifttools.swift_too import api_common
+        with mock.patch.object(api_common.requests, 'session', UnreachableSession(self.api)):
+            retrying = submission.submit_queued(submission._claim_next_submission(self.now), self.facility, self.now)
+        self.assertEqual((retrying.state, retrying.attempts), (SwiftSubmission.QUEUED, 1))
+        self.assertEqual(retrying.next_attempt, self.now + submission.retry_delay(1))
+
+    def test_rejected_submission_fails(self):
+        queued = self.enqueue()
+        record = self.observation_record(queued.observation_id)
+        self.use_api(RejectingSwiftTOOAPI())
+        failed = submission.submit_queued(submission._claim_next_submission(self.now), self.facility, self.now)
+        self.assertEqual((failed.state, failed.errors), (SwiftSubmission.FAILED, ['Too faint.']))
+        record.refresh_from_db()
+        self.assertEqual(record.status, submission.FAILED_STATE)
+
+    def test_submissions_are_spaced_by_the_interval(self):
+        for _ in range(3):
+            self.enqueue()
+        sleep = mock.Mock()
+        with swift_settings(SUBMISSION_QUEUE=True, SUBMISSION_INTERVAL=10):
+            counts = submission.process_submission_queue(limit=2, facility=self.facility, sleep=sleep)
+        self.assertEqual(counts, {'submitted': 2, 'retrying': 0, 'failed': 0})
+        self.assertEqual(self.api.requests, {'Swift_TOO_Request': 2})
+        (seconds,), _ = sleep.call_args
+        self.assertEqual(sleep.call_count, 1)  # between the two submissions, not before the first
+        self.assertTrue(9 < seconds <= 10)
+
+    def test_open_circuit_breaker_leaves_the_queue(self):
+        queued = self.enqueue()
+        breaker = swift_api.get_circuit_breaker()
+        for _ in range(breaker.threshold):
+            breaker.record_failure()
+        self.assertEqual(submission.process_submission_queue(facility=self.facility),
+                         {'submitted': 0, 'retrying': 0, 'failed': 0})
+        self.assertEqual(SwiftSubmission.objects.get(pk=queued.pk).state, SwiftSubmission.QUEUED)
+        self.assertEqual(self.api.requests, {})
+
+    def test_stale_claim_fails(self):
+        stale, recent = self.enqueue(), self.enqueue()
+        record = self.observation_record(stale.observation_id)
+        SwiftSubmission.objects.filter(pk=stale.pk).update(state=SwiftSubmission.SUBMITTING,
+                                                           claimed=self.now - timedelta(minutes=11))
+        SwiftSubmission.objects.filter(pk=recent.pk).update(state=SwiftSubmission.SUBMITTING,
+                                                            claimed=self.now - timedelta(minutes=9))
+        self.assertEqual(submission.process_submission_queue(facility=self.facility),
+                         {'submitted': 0, 'retrying': 0, 'failed': 0})
+        self.assertEqual(SwiftSubmission.objects.get(pk=stale.pk).state, SwiftSubmission.FAILED)
+        self.assertEqual(SwiftSubmission.objects.get(pk=recent.pk).state, SwiftSubmission.SUBMITTING)
+        record.refresh_from_db()
+        self.assertEqual(record.status, submission.FAILED_STATE)
+        self.assertEqual(self.api.requests, {})  # not submitted again
+
+
+class PickySwiftTOOAPI(UnresolvingSwiftTOOAPI, RejectingSwiftTOOAPI):
+    """A FakeSwiftTOOAPI that can't resolve names starting 'Unknown', and rejects TOOs of sources named 'Faint ...'."""
+
+    def resolve(self, data):
+        if data.get('name', '').startswith('Unknown'):
+            return super().resolve(data)
+        return FakeSwiftTOOAPI.resolve(self, data)
+
+    def too_request(self, data):
+        if data.get('source_name', '').startswith('Faint'):
+            return super().too_request(data)
+        return FakeSwiftTOOAPI.too_request(self, data)
+
+
+class BulkSubmitTest(SwiftTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.use_api(PickySwiftTOOAPI())
+        self.faint = Target.objects.create(name='Faint 1', type=Target.SIDEREAL, ra=10.0, dec=20.0)
+        self.unknown = Target.objects.create(name='Unknown 1', type=Target.NON_SIDEREAL)
+        self.form_data = {key: value for key, value in FORM_DATA.items() if key != 'facility'}
+
+    def submit_bulk(self, targets, **kwargs):
+        return bulk.submit_bulk(targets, self.form_data, facility=self.facility, **kwargs)
+
+    def outcomes(self, results):
+        return [(result.target, result.outcome, result.errors) for result in results]
+
+    def test_each_target_is_validated(self):
+        results = self.submit_bulk([self.target, self.unknown], validate_only=True)
+        self.assertEqual(self.outcomes(results), [(self.target, bulk.VALID, ()),
+                                                  (self.unknown, bulk.INVALID, ('Missing key: ra',))])
+        self.assertEqual(self.api.requests, {'Swift_Resolve': 1})
+        self.assertFalse(ObservationRecord.objects.exists())
+
+    def test_invalid_form_data_is_reported_for_each_target(self):
+        self.form_data['exposure'] = ''
+        results = self.submit_bulk([self.target, self.faint])
+        self.assertEqual([result.outcome for result in results], [bulk.INVALID, bulk.INVALID])
+        self.assertTrue(all(result.errors[0].startswith('exposure: ') for result in results))
+        self.assertEqual(self.api.requests, {})
+
+    def test_outcomes_are_reported_in_the_order_of_the_targets(self):
+        results = self.submit_bulk([self.faint, self.unknown, self.target], group_name='GW campaign')
+        self.assertEqual(self.outcomes(results), [(self.faint, bulk.REJECTED, ('Too faint.',)),
+                                                  (self.unknown, bulk.INVALID, ('Missing key: ra',)),
+                                                  (self.target, bulk.SUBMITTED, ())])
+        self.assertEqual(self.api.requests, {'Swift_Resolve': 1, 'Swift_TOO_Request': 2})
+
+        record = results[2].observation_record
+        self.assertEqual((record.target, record.observation_id, results[2].observation_id),
+                         (self.target, '20000', '20000'))
+        self.assertEqual(record.parameters['exposure'], FORM_DATA['exposure'])
+        self.assertEqual(list(ObservationGroup.objects.get(name='GW campaign').observation_records.all()), [record])
+
+    @override_settings(TARGET_PERMISSIONS_ONLY=False)
+    def test_permissions_are_assigned_as_by_the_observation_form(self):
+        user = User.objects.create(username='bulk')
+        group, other_group = Group.objects.create(name='GW team'), Group.objects.create(name='Others')
+        results = self.submit_bulk([self.target], user=user, group_name='GW campaign', groups=[group])
+        record = results[0].observation_record
+        member, outsider = User.objects.create(username='member'), User.objects.create(username='outsider')
+        member.groups.add(group)
+        outsider.groups.add(other_group)
+
+        for permission in ('view', 'change', 'delete'):
+            self.assertTrue(user.has_perm(f'tom_observations.{permission}_observationgroup',
+                                          ObservationGroup.objects.get(name='GW campaign')))
+            self.assertTrue(member.has_perm(f'tom_observations.{permission}_observationrecord', record))
+            self.assertFalse(outsider.has_perm(f'tom_observations.{permission}_observationrecord', record))
+
+    @swift_settings(SUBMISSION_QUEUE=True)
+    @override_settings(TARGET_PERMISSIONS_ONLY=False)  # so the form has groups
+    def test_queued_targets_are_submitted_later(self):
+        results = self.submit_bulk([self.target, self.faint])
+        self.assertEqual([result.outcome for result in results], [bulk.QUEUED, bulk.QUEUED])
+        self.assertEqual(self.api.requests, {})
+        for result in results:
+            queued = SwiftSubmission.objects.get(observation_id=result.observation_id)
+            self.assertEqual(queued.observation_record, result.observation_record)
+            self.assertEqual(result.observation_record.status, swift_api.SWIFT_PENDING_SUBMISSION_STATE)
+            self.assertNotIn('groups', queued.payload)
+
+        self.assertEqual(submission.process_submission_queue(facility=self.facility, sleep=lambda seconds: None),
+                         {'submitted': 1, 'retrying': 0, 'failed': 1})
+        self.assertEqual([ObservationRecord.objects.get(pk=result.observation_record.pk).status for result in results],
+                         [swift_api.SWIFT_PENDING_STATE, submission.FAILED_STATE])
+
+
+class FakeTOORequestsAPI:
+    """Stands in for SwiftAPI.get_too_requests(), with the TOO requests in self.too_requests."""
+
+    def __init__(self):
+        self.too_requests = {}  # {too_id: Swift_TOORequest-like SimpleNamespace}
+        self.queries = []  # (begin, end, limit)
+
+    def request(self, too_id, timestamp, source_name='NGC 1566', ra=65.0, dec=-55.0, decision='', **attributes):
+        self.too_requests[too_id] = SimpleNamespace(too_id=too_id, timestamp=timestamp, source_name=source_name,
+                                                    ra=ra, dec=dec, instrument='XRT', urgency=2, decision=decision,
+                                                    done=False, **attributes)
+
+    def get_too_requests(self, begin, end, limit):
+        self.queries.append((begin, end, limit))
+        return sorted((too_request for too_request in self.too_requests.values()
+                       if begin <= too_request.timestamp < end), key=lambda too_request: too_request.timestamp)[:limit]
+
+
+class SyncTOORequestsTest(SwiftTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.now = datetime(2026, 3, 1, tzinfo=timezone.utc)
+        self.swift_api = FakeTOORequestsAPI()
+
+    def sync(self, after=timedelta(0)):
+        self.now += after
+        return mirror.sync_too_requests(self.swift_api, self.now)
+
+    def mirrored(self):
+        return {too_request.too_id: too_request.decision for too_request in SwiftTOORequestMirror.objects.all()}
+
+    def test_first_sync_goes_back_mirror_days(self):
+        self.swift_api.request(1, self.now - timedelta(days=31))
+        self.swift_api.request(2, self.now - timedelta(days=29))
+        self.assertEqual(self.sync(), 1)
+        self.assertEqual(self.mirrored(), {2: ''})
+        self.assertEqual(self.swift_api.queries, [(self.now - timedelta(days=30), self.now + timedelta(hours=1),
+                                                   mirror.MIRROR_QUERY_LIMIT)])
+        self.assertEqual(mirror.high_water_mark(), self.now - timedelta(days=29))
+
+    def test_sync_asks_from_the_high_water_mark(self):
+        self.swift_api.request(1, self.now - timedelta(days=4))
+        self.swift_api.request(2, self.now - timedelta(days=2))
+        self.sync()
+        self.swift_api.request(3, self.now + timedelta(hours=1))
+        for too_request in self.swift_api.too_requests.values():
+            too_request.decision = 'Approved'
+        # only the TOO requests made since MIRROR_OVERLAP before the newest one are asked for again
+        self.assertEqual(self.sync(timedelta(hours=2)), 2)
+        self.assertEqual(self.swift_api.queries[-1][0], self.now - timedelta(hours=2, days=3))
+        self.assertEqual(self.mirrored(), {1: '', 2: 'Approved', 3: 'Approved'})
+        self.assertEqual(mirror.high_water_mark(), self.now - timedelta(hours=1))
+
+    def test_changed_requests_are_updated_in_place(self):
+        self.swift_api.request(1, self.now - timedelta(hours=1), source_name='GRB 260301A')
+        self.sync()
+        self.swift_api.too_requests[1].decision = 'Approved'
+        self.swift_api.too_requests[1].source_name = 'GRB 260301B'
+        self.assertEqual(self.sync(timedelta(hours=1)), 1)
+        too_request, = SwiftTOORequestMirror.objects.all()
+        self.assertEqual((too_request.decision, too_request.normalized_name, too_request.synced),
+                         ('Approved', 'grb 260301b', self.now))
+
+    def test_old_requests_are_dropped(self):
+        self.swift_api.request(1, self.now - timedelta(days=29))
+        self.swift_api.request(2, self.now - timedelta(days=1))
+        self.sync()
+        del self.swift_api.too_requests[1]  # (no longer asked for, anyway)
+        self.sync(timedelta(days=2))
+        self.assertEqual(self.mirrored(), {2: ''})
+
+    def test_queries_that_hit_the_limit_are_split(self):
+        for too_id in range(5):
+            self.swift_api.request(too_id, self.now - timedelta(days=too_id + 1))
+        with swift_settings(MIRROR_QUERY_LIMIT=2):
+            self.assertEqual(self.sync(), 5)
+        self.assertEqual(set(self.mirrored()), {0, 1, 2, 3, 4})
+        self.assertTrue(all(end - begin < timedelta(days=31) for begin, end, _ in self.swift_api.queries[1:]))
+
+    def test_recent_requests_are_found_by_name_and_position(self):
+        self.swift_api.request(1, self.now - timedelta(hours=1), source_name='ngc  1566', ra=None, dec=None)
+        self.swift_api.request(2, self.now - timedelta(hours=2), source_name='Swift J0418.0-5455', ra=65.01, dec=-54.94)
+        self.swift_api.request(3, self.now - timedelta(hours=3), source_name='Elsewhere', ra=10.0, dec=20.0)
+        self.swift_api.request(4, self.now - timedelta(days=3))
+        self.sync()
+        self.assertEqual([too_request.too_id for too_request in mirror.recent_too_requests(self.target, now=self.now)],
+                         [1, 2])
+
+
+class FakeTimelineAPI:
+    """Stands in for SwiftAPI.get_timeline(), with Swift's timeline in self.flown and self.planned."""
+
+    def __init__(self):
+        self.flown, self.afstmax = [], None
+        self.planned, self.ppstmax = [], None
+        self.queries = []  # (planned, begin, end)
+
+    def observation(self, obsid, begin, hours=1):
+        return SimpleNamespace(obsid=obsid, targname='NGC1566', begin=begin, end=begin + timedelta(hours=hours),
+                               exposure=timedelta(hours=hours), ra=65.0, dec=-54.9, roll=10.0, xrt_mode=7,
+                               uvot_mode='0x30ed')
+
+    def get_timeline(self, planned, ra, dec, radius, begin, end):
+        self.queries.append((planned, begin, end))
+        entries = self.planned if planned else self.flown
+        return ([entry for entry in entries if entry.end > begin and entry.begin < end],
+                self.ppstmax if planned else self.afstmax)
+
+
+class SyncTimelineTest(SwiftTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.now = datetime(2026, 3, 1, tzinfo=timezone.utc)
+        self.swift_api = FakeTimelineAPI()
+
+    def sync(self, after=timedelta(0)):
+        self.now += after
+        return timeline.sync_timeline(self.target, self.swift_api, self.now)
+
+    def entries(self, kind):
+        return [(entry.obsid, entry.begin) for entry in SwiftTimelineEntry.objects.filter(kind=kind)]
+
+    def test_timeline_is_merged_incrementally(self):
+        api, now = self.swift_api, self.now
+        old = api.observation('00012345001', now - timedelta(days=31))
+        spanning = api.observation('00012345002', now - timedelta(hours=4), hours=2)  # spans the afstmax
+        unconfirmed = api.observation('00012345003', now - timedelta(hours=1))  # flown, after the afstmax
+        planned = api.observation('00012345004', now + timedelta(hours=2))
+        api.flown, api.afstmax = [old, spanning, unconfirmed], now - timedelta(hours=3)
+        api.planned, api.ppstmax = [unconfirmed, planned], now + timedelta(days=2)
+
+        sync = self.sync()
+        self.assertEqual((sync.flown_from, sync.flown_until, sync.planned_until),
+                         (now - timedelta(days=30), now - timedelta(hours=3), now + timedelta(days=2)))
+        self.assertEqual(self.entries(SwiftTimelineEntry.FLOWN), [('00012345002', spanning.begin)])
+        self.assertEqual(self.entries(SwiftTimelineEntry.PLANNED), [('00012345003', unconfirmed.begin),
+                                                                    ('00012345004', planned.begin)])
+
+        # an hour later, the as-flown timeline has caught up, and the plan has changed
+        replanned = api.observation('00012345005', now + timedelta(hours=3))
+        api.afstmax = now + timedelta(minutes=30)
+        api.planned = [replanned]
+        sync = self.sync(timedelta(hours=1))
+        self.assertEqual(api.queries[-2], (False, now - timedelta(hours=3), self.now))  # from the last flown_until
+        self.assertEqual((sync.flown_from, sync.flown_until), (now - timedelta(days=30), now + timedelta(minutes=30)))
+        self.assertEqual(self.entries(SwiftTimelineEntry.FLOWN), [('00012345002', spanning.begin),
+                                                                  ('00012345003', unconfirmed.begin)])
+        self.assertEqual(self.entries(SwiftTimelineEntry.PLANNED), [('00012345005', replanned.begin)])
+        self.assertEqual(SwiftTimelineSync.objects.count(), 1)
+
+        self.assertEqual(timeline.observed_obsids(self.target, now - timedelta(hours=2)), {'00012345003'})
+        self.assertIsNone(timeline.observed_obsids(self.target, now - timedelta(days=31)))
+
+    def test_afstmax_before_the_last_sync_does_not_go_back(self):
+        self.swift_api.afstmax = self.now - timedelta(hours=1)
+        self.sync()
+        self.swift_api.afstmax = None
+        self.assertEqual(self.sync(timedelta(hours=1)).flown_until, self.now - timedelta(hours=2))
+
+    def test_status_of_a_finished_too_is_local(self):
+        self.observation_record(20000)
+        too_request = SwiftTOORequestMirror.objects.create(too_id=20000, source_name='NGC 1566', done=True,
+                                                           timestamp=self.now - timedelta(days=2),
+                                                           synced=self.now - timedelta(hours=1))
+        observed = self.swift_api.observation('00012345001', self.now - timedelta(days=1), hours=2)
+        self.swift_api.flown, self.swift_api.afstmax = [observed], self.now
+        self.sync()
+
+        with mock.patch.object(self.facility.swift_api, 'get_too_request_status') as get_too_request_status:
+            self.assertEqual(self.facility.get_observation_status('20000'),
+                             {'state': swift_api.SWIFT_COMPLETED_STATE,
+                              'scheduled_start': observed.begin, 'scheduled_end': observed.end})
+        get_too_request_status.assert_not_called()
+
+        # not (as far as the mirror knows) finished, or requested before the timeline was synced from
+        too_request.done = False
+        too_request.decision = 'Approved'
+        too_request.save()
+        self.assertIsNone(timeline.local_too_request_status(20000, self.target))
+        too_request.done = True
+        too_request.timestamp = self.now - timedelta(days=31)
+        too_request.save()
+        self.assertIsNone(timeline.local_too_request_status(20000, self.target))
+
+    def test_command_syncs_only_sidereal_targets(self):
+        comet = Target.objects.create(name='C/2026 A1', type=Target.NON_SIDEREAL)
+        with self.assertRaisesRegex(CommandError, 'no fixed position'):
+            call_command('syncswifttimeline', target=comet.name)
+        self.assertFalse(SwiftTimelineSync.objects.exists())
+
+
+class SaveDataProductsTest(SwiftTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.data_file = SwiftDataFile.objects.create(product_id='00012345001/xrt/event/a.evt.gz', obsid='00012345001',
+                                                      instrument='xrt', path='00012345001/xrt/event',
+                                                      filename='a.evt.gz', url='https://swift.example/a.evt.gz')
+        patcher = mock.patch.object(self.facility, '_data_files', return_value=[self.data_file])
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def save_failing(self, record):
+        """Save the data products of the record, with every download failing."""
+        def failed_downloads(downloads):
+            return [Download(url, path, error='Connection refused') for url, path in downloads]
+        with mock.patch.object(self.facility, '_download', side_effect=failed_downloads):
+            return self.facility.save_data_products(record)
+
+    def test_failed_download_leaves_no_data_product(self):
+        self.assertEqual(self.save_failing(self.observation_record(20000)), [])
+        self.assertFalse(DataProduct.objects.exists())
+
+    def test_failed_download_keeps_another_records_data_product(self):
+        other_record = self.observation_record(20001)
+        data_product = DataProduct.objects.create(product_id=self.data_file.product_id, target=self.target,
+                                                  observation_record=other_record)
+        self.assertEqual(self.save_failing(self.observation_record(20000)), [])
+        self.assertEqual(DataProduct.objects.get().observation_record, other_record)
+        self.assertEqual(DataProduct.objects.get().pk, data_product.pk)
+
+
+class TargetResolveViewTest(SwiftTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.user = User.objects.create_user('alice')
+        self.url = reverse('tom_swift:resolve-target', kwargs={'pk': self.target.pk})
+
+    def test_anonymous_user_is_redirected_to_log_in(self):
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 302)
+        self.assertIn(settings.LOGIN_URL, response['Location'])
+        self.assertEqual(self.api.requests, {})
+
+    def test_target_the_user_cannot_view_is_not_found(self):
+        private = Target.objects.create(name='Secret', type=Target.SIDEREAL, ra=1.0, dec=2.0,
+                                        permissions=Target.Permissions.PRIVATE)
+        self.client.force_login(self.user)
+        response = self.client.get(reverse('tom_swift:resolve-target', kwargs={'pk': private.pk}))
+        self.assertEqual(response.status_code, 404)
+        self.assertEqual(self.api.requests, {})
+
+    def test_resolution_is_cached(self):
+        self.client.force_login(self.user)
+        first = self.client.get(self.url).json()
+        self.assertEqual((first['resolved'], first['name']), (True, 'NGC 1566'))
+        self.assertEqual(self.client.get(self.url).json(), first)
+        self.assertEqual(self.api.requests, {'Swift_Resolve': 1})
+
+
+class FacilityContextTest(SwiftTestCase):
+
+    def setUp(self):
+        super().setUp()
+        patcher = mock.patch.object(visibility, '_visibility_cache', TTLCache(maxsize=100, ttl=60))
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.user = User.objects.create_user('alice')
+
+    def test_context_is_from_the_cache_only(self):
+        with mock.patch.object(visibility, 'sun_moon_observable') as sun_moon_observable, self.assertNumQueries(0):
+            context = self.facility.get_facility_context_data(target=self.target)
+        sun_moon_observable.assert_not_called()
+        self.assertTrue(context['visibility_pending'])
+        self.assertNotIn('recent_too_requests', context)
+        self.assertNotIn('swift_timeline', context)
+
+        windows = visibility.get_visibility_windows(self.target.ra, self.target.dec)
+        context = self.facility.get_facility_context_data(target=self.target)
+        self.assertFalse(context['visibility_pending'])
+        self.assertEqual(context['visibility_windows'], windows)
+
+    def test_the_rest_is_fetched_later(self):
+        SwiftTOORequestMirror.objects.create(too_id=20000, source_name='NGC 1566', ra=65.0017, dec=-54.9379,
+                                             timestamp=timezone_now(), synced=timezone_now())
+        url = self.facility.get_facility_context_data(target=self.target)['swift_context_url']
+        self.client.force_login(self.user)
+
+        sections = self.client.get(url).json()
+        self.assertEqual(set(sections), {'swift_recent_too_requests', 'swift_timeline'})
+        self.assertIn('too_id 20000', sections['swift_recent_too_requests'])
+        self.assertIn("hasn't been synced yet", sections['swift_timeline'])
+
+        sections = self.client.get(url, {'visibility': 1}).json()
+        self.assertIn('Clear of the Earth limb', sections['swift_visibility'])
+        self.assertFalse(self.facility.get_facility_context_data(target=self.target)['visibility_pending'])
+
+    def test_target_the_user_cannot_view_is_not_found(self):
+        private = Target.objects.create(name='Secret', type=Target.SIDEREAL, ra=1.0, dec=2.0,
+                                        permissions=Target.Permissions.PRIVATE)
+        self.client.force_login(self.user)
+        response = self.client.get(reverse('tom_swift:target-swift-context', kwargs={'pk': private.pk}))
+        self.assertEqual(response.status_code, 404)
+
+
+class MetricsViewTest(SwiftTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.url = reverse('tom_swift:metrics')
+
+    def assertMetrics(self, response):
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Content-Type'], 'text/plain; version=0.0.4; charset=utf-8')
+        self.assertIn('# TYPE tom_swift_api_calls_total counter', response.content.decode())
+
+    def get_view(self, user):
+        """Return the MetricsView's own response to the user (without the TOM's middleware)."""
+        request = RequestFactory().get(self.url)
+        request.user = user
+        return MetricsView.as_view()(request)
+
+    @swift_settings(METRICS_TOKEN='s3cret')
+    def test_token_is_required(self):
+        self.assertMetrics(self.client.get(self.url, HTTP_AUTHORIZATION='Bearer s3cret'))
+        for authorization in ('Bearer wrong', 's3cret', ''):
+            response = self.client.get(self.url, HTTP_AUTHORIZATION=authorization)
+            self.assertEqual((response.status_code, response['WWW-Authenticate']), (401, 'Bearer'))
+        # with a token set, being staff isn't enough
+        self.client.force_login(User.objects.create_user('admin', is_staff=True))
+        self.assertEqual(self.client.get(self.url).status_code, 401)
+
+    def test_staff_may_see_the_metrics_without_a_token(self):
+        self.assertEqual(self.get_view(AnonymousUser()).status_code, 403)
+        self.assertEqual(self.get_view(User.objects.create_user('alice')).status_code, 403)
+        # (which the TOM's Raise403Middleware turns into a redirect to the login page)
+        self.assertRedirects(self.client.get(self.url), f'{reverse("login")}?next={self.url}',
+                             fetch_redirect_response=False)
+        self.assertMetrics(self.get_view(User.objects.create_user('admin', is_staff=True)))
+        self.client.force_login(User.objects.get(username='admin'))
+        self.assertMetrics(self.client.get(self.url))
+
+
+class SwiftVisibilityCommandTest(SwiftTestCase):
+
+    def setUp(self):
+        super().setUp()
+        # (the ephemerides of the days from here, so the windows are always the same)
+        start = datetime(2025, 3, 15, tzinfo=timezone.utc)
+        patcher = mock.patch.object(visibility, 'get_bulk_visibility_windows',
+                                    functools.partial(visibility.get_bulk_visibility_windows, start=start))
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        # a target 90 degrees from the ecliptic is never near the Sun or the Moon; the Sun passes RA 0 in March
+        self.pole = Target.objects.create(name='Ecliptic pole', type=Target.SIDEREAL, ra=270.0, dec=66.56)
+        self.sunward = Target.objects.create(name='Sunward', type=Target.SIDEREAL, ra=0.0, dec=0.0)
+        Target.objects.create(name='Comet', type=Target.NON_SIDEREAL)
+
+    def swiftvisibility(self, *args):
+        stdout = io.StringIO()
+        call_command('swiftvisibility', '--days', '3', '--processes', '1', *args, stdout=stdout)
+        return stdout.getvalue().splitlines()
+
+    def test_visibility_of_all_targets(self):
+        self.assertEqual(self.swiftvisibility(), [
+            'Ecliptic pole: observable for 3\xa0days in 1 window from 2025-03-15 00:00 UTC (38% of each orbit)',
+            'NGC 1566: observable for 3\xa0days in 1 window from 2025-03-15 00:00 UTC (43% of each orbit)',
+            'Sunward: not observable',
+            '2 of 3 sidereal targets are observable by Swift in the next 3 days',
+        ])
+
+    def test_observable_targets_of_a_target_list(self):
+        TargetList.objects.create(name='Candidates').targets.add(self.pole, self.sunward)
+        self.assertEqual(self.swiftvisibility('--target_list', 'Candidates', '--observable'), [
+            'Ecliptic pole: observable for 3\xa0days in 1 window from 2025-03-15 00:00 UTC (38% of each orbit)',
+            '1 of 2 sidereal targets are observable by Swift in the next 3 days',
+        ])
+
+    def test_unknown_target_list(self):
+        with self.assertRaisesMessage(CommandError, 'There is no target list named Nowhere'):
+            self.swiftvisibility('--target_list', 'Nowhere')
@@ -0,0 +1,32 @@
+"""Observation form data and payloads shared by the tom_swift tests and benchmarks."""
+
+# what a user fills in on the Swift observation form (less the target_id, which the TOM adds)
+FORM_DATA = {
+    'facility': 'Swift', 'observation_type': 'OBSERVATION',
+    'target_classification_choices': 'AGN', 'target_classification': '', 'poserr': 0.0,
+    'instrument': 'XRT', 'urgency': 3, 'obs_type': 'Light Curve',
+    'optical_magnitude': 12.0, 'optical_filter': 'u', 'other_brightness': '',
+    'grb_detector_choices': 'Swift/BAT', 'grb_detector': '',
+    'immediate_objective': 'Monitor the flare.', 'science_just': 'Because.',
+    'exposure': 1000.0, 'exp_time_just': 'Enough counts.',
+    'num_of_visits': 1, 'monitoring_freq': 1, 'monitoring_units': 'day',
+    'xrt_mode': 6, 'uvot_mode_choices': 0x01aa, 'uvot_mode': '', 'uvot_just': '',
+    'debug': True,
+}
+
+
+def make_observation_payload(**overrides):
+    """Return the observation payload SwiftObservationForm.observation_payload() makes of FORM_DATA, for NGC 1566.
+
+    This needs no database: the fields the form leaves blank are filled in as its cleaned_data has them.
+    """
+    payload = {key: value for key, value in FORM_DATA.items() if key not in ('facility', 'observation_type')}
+    payload.update({
+        'source_name': 'NGC 1566', 'ra': 65.0017, 'dec': -54.9379,
+        'xrt_countrate': None, 'bat_countrate': None, 'grb_triggertime': None, 'exp_time_per_visit': None,
+        'proposal': False, 'proposal_id': '', 'proposal_pi': '', 'proposal_trigger_just': '',
+        'slew_in_place': False,
+        'tiling': False, 'number_of_tiles': None, 'exposure_time_per_tile': None, 'tiling_justification': '',
+    })
+    payload.update(overrides)
+    return payload
@@ -0,0 +1,194 @@
+"""Swift's planned and as-flown science timeline of the TOM's targets, kept in the database.
+
+Swift publishes its plan (the Pre-Planned Science Timeline) and what it actually observed
+(the As-Flown Science Timeline). Asking for them by position, on every page that shows them,
+would be slow, so the observations of each target with Swift observation records are kept
+as SwiftTimelineEntries, and shown on the observation form and the Swift Timeline tab of the
+target detail page (see timeline_context()).
+
+sync_timeline() brings the timeline of a target up to date incrementally: the as-flown
+timeline is complete up to some time (its afstmax), which is kept in the target's
+SwiftTimelineSync, and each sync only asks for what was observed since then (the first sync
+goes back TIMELINE_DAYS). The plan for after then is asked for afresh each time, as Swift
+revises it. sync_due_timelines() syncs the targets that haven't been synced for
+TIMELINE_SYNC_INTERVAL seconds; run it frequently: by `./manage.py syncswifttimeline` (from
+cron, say), or as the tom_swift.tasks.sync_swift_timelines background task.
+
+The as-flown timeline also tells which observations (obsids) of a target have been made since
+a TOO was requested (see observed_obsids()), so the data files of a TOO are only listed again
+(see tom_swift.store.get_data_files()) when there are new observations to list; and, with the
+mirror of the TOO requests (see tom_swift.mirror), when a finished TOO was observed, so its
+status needn't be asked for (see local_too_request_status()).
+"""
+from datetime import timedelta
+import logging
+
+from django.db import transaction
+from django.db.models import Max, Min, Q
+from django.utils import timezone
+
+from tom_observations.models import ObservationRecord
+from tom_targets.models import Target
+
+from tom_swift.models import SwiftTimelineEntry, SwiftTimelineSync, SwiftTOORequestMirror
+from tom_swift.polling import FACILITY_NAME
+from tom_swift.swift_api import (SWIFT_COMPLETED_STATE, SWIFT_TERMINAL_STATES, SwiftAPI, SwiftAPIError, as_utc,
+                                 get_swift_setting)
+from tom_swift.visibility import is_sidereal
+
+logger = logging.getLogger(__name__)
+
+#
+# Settings (in settings.FACILITIES['SWIFT']):
+#   'TIMELINE_DAYS': days of the as-flown timeline that the first sync of a target asks for, and shows (default 30)
+#   'TIMELINE_PLAN_DAYS': days ahead of now to ask for the plan of (default 7)
+#   'TIMELINE_RADIUS': degrees from a target within which Swift's observations are of the target
+#                      (default 11.6 arcminutes, the XRT field of view)
+#   'TIMELINE_SYNC_INTERVAL': seconds between syncs of the timeline of a target (default 1 hour)
+#
+TIMELINE_DAYS = 30
+TIMELINE_PLAN_DAYS = 7
+TIMELINE_RADIUS = 11.6 / 60
+TIMELINE_SYNC_INTERVAL = 60 * 60
+
+
+def _timeline_entry(target, kind, entry) -> SwiftTimelineEntry:
+    """Return the SwiftTimelineEntry of a swifttools Swift_PPSTEntry or Swift_AFSTEntry."""
+    exposure = getattr(entry, 'exposure', None)
+    return SwiftTimelineEntry(
+        target=target,
+        kind=kind,
+        obsid=str(entry.obsid),
+        targname=(getattr(entry, 'targname', None) or '')[:200],
+        begin=as_utc(entry.begin),
+        end=as_utc(entry.end),
+        exposure=exposure.total_seconds() if exposure is not None else None,
+        ra=getattr(entry, 'ra', None),
+        dec=getattr(entry, 'dec', None),
+        roll=getattr(entry, 'roll', None),
+        xrt_mode=str(entry.xrt_mode or '')[:32],
+        uvot_mode=str(entry.uvot_mode or '')[:32],
+    )
+
+
+def sync_timeline(target, swift_api=None, now=None) -> SwiftTimelineSync:
+    """Bring the Swift timeline of the (sidereal) target up to date, and return its SwiftTimelineSync.
+
+    Raises swift_api.SwiftAPIError if the Swift TOO API couldn't be asked.
+    """
+    swift_api = swift_api or SwiftAPI()
+    now = now or timezone.now()
+    radius = get_swift_setting('TIMELINE_RADIUS', TIMELINE_RADIUS)
+    sync = SwiftTimelineSync.objects.filter(target=target).first()
+    flown_from = sync.flown_until if sync else now - timedelta(days=get_swift_setting('TIMELINE_DAYS', TIMELINE_DAYS))
+
+    flown, afstmax = swift_api.get_timeline(False, target.ra, target.dec, radius, flown_from, now)
+    # (the as-flown timeline is complete up to its afstmax; anything after that is asked for again next time)
+    flown_until = min(max(afstmax or flown_from, flown_from), now)
+    planned, ppstmax = swift_api.get_timeline(True, target.ra, target.dec, radius, flown_until,
+                                              now + timedelta(days=get_swift_setting('TIMELINE_PLAN_DAYS',
+                                                                                     TIMELINE_PLAN_DAYS)))
+
+    flown_entries = [_timeline_entry(target, SwiftTimelineEntry.FLOWN, entry) for entry in flown
+                     if entry.begin is not None and as_utc(entry.begin) < flown_until]
+    planned_entries = [_timeline_entry(target, SwiftTimelineEntry.PLANNED, entry) for entry in planned
+                       if entry.begin is not None and as_utc(entry.end) > flown_until]
+    with transaction.atomic():
+        # an observation that spans flown_from has been mirrored already
+        SwiftTimelineEntry.objects.bulk_create(flown_entries, ignore_conflicts=True)
+        # the plan up to flown_until is superseded by the as-flown timeline, and the rest by the new plan
+        SwiftTimelineEntry.objects.filter(target=target, kind=SwiftTimelineEntry.PLANNED).delete()
+        SwiftTimelineEntry.objects.bulk_create(planned_entries)
+        sync, _ = SwiftTimelineSync.objects.update_or_create(
+            target=target, defaults={'flown_until': flown_until, 'planned_until': ppstmax, 'synced': now},
+            create_defaults={'flown_from': flown_from, 'flown_until': flown_until, 'planned_until': ppstmax,
+                             'synced': now})
+    logger.info(f'sync_timeline - {target}: {len(flown_entries)} observations made between '
+                f'{flown_from:%Y-%m-%d %H:%M} and {flown_until:%Y-%m-%d %H:%M}; {len(planned_entries)} planned')
+    return sync
+
+
+def timeline_targets(now=None):
+    """Return the (sidereal) targets whose Swift timeline is kept: those with Swift observation
+    records that are open, or were created in the last TIMELINE_DAYS.
+    """
+    now = now or timezone.now()
+    records = (ObservationRecord.objects.filter(facility=FACILITY_NAME)
+               .filter(~Q(status__in=SWIFT_TERMINAL_STATES)
+                       | Q(created__gte=now - timedelta(days=get_swift_setting('TIMELINE_DAYS', TIMELINE_DAYS)))))
+    targets = Target.objects.filter(pk__in=records.values('target_id'))
+    return [target for target in targets if is_sidereal(target)]
+
+
+def sync_due_timelines(limit=None, swift_api=None, now=None):
+    """Sync the Swift timelines of the timeline_targets() that haven't been synced for TIMELINE_SYNC_INTERVAL seconds.
+
+    The targets synced longest ago go first. Returns a list of (target name, error) tuples for
+    the targets whose timeline couldn't be synced.
+    """
+    swift_api = swift_api or SwiftAPI()
+    now = now or timezone.now()
+    due = now - timedelta(seconds=get_swift_setting('TIMELINE_SYNC_INTERVAL', TIMELINE_SYNC_INTERVAL))
+    synced = {sync.target_id: sync.synced for sync in SwiftTimelineSync.objects.all()}
+    targets = sorted((target for target in timeline_targets(now) if synced.get(target.pk, due) <= due),
+                     key=lambda target: synced.get(target.pk, due))
+    if limit:
+        targets = targets[:limit]
+
+    failed_targets = []
+    for target in targets:
+        try:
+            sync_timeline(target, swift_api, now)
+        except SwiftAPIError as err:
+            logger.error(f'sync_due_timelines - {target}: {err}')
+            failed_targets.append((target.name, str(err)))
+    logger.info(f'sync_due_timelines - synced {len(targets) - len(failed_targets)} timelines; '
+                f'{len(failed_targets)} failed')
+    return failed_targets
+
+
+def observed_obsids(target, since):
+    """Return the set of obsids of the target that, by its as-flown timeline, Swift observed after since;
+    or None if the target's as-flown timeline doesn't go back that far (or hasn't been synced).
+    """
+    sync = SwiftTimelineSync.objects.filter(target=target).first()
+    if sync is None or since < sync.flown_from:
+        return None
+    return set(SwiftTimelineEntry.objects.filter(target=target, kind=SwiftTimelineEntry.FLOWN, end__gt=since)
+               .values_list('obsid', flat=True))
+
+
+def local_too_request_status(too_id, target) -> dict:
+    """Return the status of the Swift TOO too_id, for the target, from the local mirror (see tom_swift.mirror)
+    and the target's as-flown timeline; or None if they can't tell it.
+
+    They can only tell the status of a TOO that the mirror has as done or failed: those states are final,
+    so the mirror can't be out of date about them. Its scheduled start and end are those of the observations
+    of the target that the as-flown timeline has from the TOO request to when the mirror last saw it (None,
+    if there are none), so the target's timeline must have been synced over all that time.
+    """
+    too_request = SwiftTOORequestMirror.objects.filter(too_id=too_id).first()
+    if too_request is None:
+        return None
+    state = SWIFT_COMPLETED_STATE if too_request.done else too_request.decision
+    if state not in SWIFT_TERMINAL_STATES:
+        return None
+    sync = SwiftTimelineSync.objects.filter(target=target).first()
+    if sync is None or too_request.timestamp < sync.flown_from or sync.flown_until < too_request.synced:
+        return None
+    observed = (SwiftTimelineEntry.objects
+                .filter(target=target, kind=SwiftTimelineEntry.FLOWN,
+                        begin__gte=too_request.timestamp, begin__lt=too_request.synced)
+                .aggregate(scheduled_start=Min('begin'), scheduled_end=Max('end')))
+    return {'state': state, **observed}
+
+
+def timeline_context(target, now=None) -> dict:
+    """Return the context of the tom_swift/partials/swift_timeline.html partial for the (TOM) target."""
+    now = now or timezone.now()
+    shown_from = now - timedelta(days=get_swift_setting('TIMELINE_DAYS', TIMELINE_DAYS))
+    return {
+        'swift_timeline': list(SwiftTimelineEntry.objects.filter(target=target, end__gte=shown_from)),
+        'swift_timeline_sync': SwiftTimelineSync.objects.filter(target=target).first(),
+        'swift_timeline_radius': get_swift_setting('TIMELINE_RADIUS', TIMELINE_RADIUS) * 60,  # arcminutes
+    }
@@ -0,0 +1,86 @@
+"""Structured, deferred tracing of what tom_swift does, through the standard logging module.
+
+tom_swift traces its work (the forms it validates, the Swift_TOOs it configures, what the
+Swift TOO API says) at DEBUG. It doesn't set the level of its loggers: whether any of that is
+emitted is up to the host project's LOGGING configuration, e.g.
+
+    LOGGING = {..., 'loggers': {'tom_swift': {'handlers': ['console'], 'level': 'DEBUG'}}}
+
+Nothing is formatted unless a record is emitted: trace() returns at once if its logger isn't
+enabled for the level, and the message (and any Lazy field) is only turned into a string by the
+handler that emits it. Each record has the event name and its fields as its `swift_trace`
+attribute, for structured (e.g. JSON) formatters.
+
+dump() traces verbose payloads (a whole Swift_TOO, a form's cleaned_data): only a fraction of
+them, TRACE_SAMPLE_RATE, of the calls are traced, so that DEBUG logging can be left on without
+writing every payload. Like tom_swift.metrics, this module does not need Django settings
+(except to read TRACE_SAMPLE_RATE, when a dump would be emitted).
+"""
+import logging
+import random
+
+#
+# Settings (in settings.FACILITIES['SWIFT']):
+#   'TRACE_SAMPLE_RATE': fraction of the verbose payload dumps that are traced, when DEBUG
+#                        logging is enabled (default 1.0)
+#
+TRACE_SAMPLE_RATE = 1.0
+TRACE_ATTRIBUTE = 'swift_trace'  # the LogRecord attribute with {'event': ..., **fields}
+
+
+class Lazy:
+    """A value that is only computed (by calling function) when it is formatted."""
+    __slots__ = ('function',)
+
+    def __init__(self, function):
+        self.function = function
+
+    def __str__(self):
+        return str(self.function())
+
+    __repr__ = __str__
+
+
+class _TraceMessage:
+    """The 'event key=value ...' message of a trace record, formatted when (and if) the record is emitted."""
+    __slots__ = ('event', 'fields')
+
+    def __init__(self, event, fields):
+        self.event = event
+        self.fields = fields
+
+    def __str__(self):
+        # payloads are often many lines (a Swift_TOO is a table), so they go after the other fields
+        payload = self.fields.get('payload')
+        fields = ' '.join(f'{key}={value}' for key, value in self.fields.items() if key != 'payload')
+        message = f'{self.event} {fields}' if fields else self.event
+        return message if payload is None else f'{message}\n{payload}'
+
+
+def trace(logger, event, level=logging.DEBUG, **fields):
+    """Log the event, and its fields, to logger, if it is enabled for level.
+
+    Neither the message nor the fields are formatted unless the record is emitted; wrap
+    values that are expensive to compute in Lazy.
+    """
+    if not logger.isEnabledFor(level):
+        return
+    logger.log(level, '%s', _TraceMessage(event, fields), extra={TRACE_ATTRIBUTE: {'event': event, **fields}},
+               stacklevel=2)
+
+
+def dump(logger, event, payload, level=logging.DEBUG, sample_rate=None, **fields):
+    """Trace a verbose payload (a function returning it, called only if it is emitted) for a sample of the calls.
+
+    sample_rate defaults to the TRACE_SAMPLE_RATE setting.
+    """
+    if not logger.isEnabledFor(level):
+        return
+    if sample_rate is None:
+        from tom_swift.swift_api import get_swift_setting
+        sample_rate = get_swift_setting('TRACE_SAMPLE_RATE', TRACE_SAMPLE_RATE)
+    if sample_rate < 1.0 and random.random() >= sample_rate:
+        return
+    fields['payload'] = Lazy(payload)
+    logger.log(level, '%s', _TraceMessage(event, fields), extra={TRACE_ATTRIBUTE: {'event': event, **fields}},
+               stacklevel=2)
@@ -0,0 +1,11 @@
+from django.urls import path
+
+from tom_swift.views import MetricsView, TargetResolveView, TargetSwiftContextView
+
+app_name = 'tom_swift'
+
+urlpatterns = [
+    path('targets/<int:pk>/resolve/', TargetResolveView.as_view(), name='resolve-target'),
+    path('targets/<int:pk>/swift-context/', TargetSwiftContextView.as_view(), name='target-swift-context'),
+    path('metrics/', MetricsView.as_view(), name='metrics'),
+]
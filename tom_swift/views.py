@@ -0,0 +1,84 @@
+import hmac
+import logging
+
+from django.contrib.auth.mixins import LoginRequiredMixin
+from django.http import HttpResponse, HttpResponseForbidden, JsonResponse
+from django.shortcuts import get_object_or_404
+from django.template.loader import render_to_string
+from django.views.generic import View
+
+from tom_targets.models import Target
+from tom_targets.permissions import targets_for_user
+
+from tom_swift.metrics import get_metrics_registry
+from tom_swift.mirror import recent_too_requests
+from tom_swift.swift_api import SwiftAPI, get_swift_setting
+from tom_swift.timeline import timeline_context
+from tom_swift.visibility import visibility_context
+
+logger = logging.getLogger(__name__)
+
+
+class TargetResolveView(LoginRequiredMixin, View):
+    """Return the Swift TOO API's resolution of a Target's name as JSON.
+
+    The observation form (tom_swift/observation_form.html) fetches this after the page
+    has been rendered, so that the form doesn't have to wait for the Swift resolver.
+    """
+    def get(self, request, *args, **kwargs):
+        targets = targets_for_user(request.user, Target.objects.all(), 'view_target')
+        target = get_object_or_404(targets, pk=kwargs['pk'])
+
+        resolved_target = SwiftAPI().resolve_target(target)
+        if resolved_target is None:
+            return JsonResponse({'resolved': False, 'name': 'Target not resolved'})
+
+        return JsonResponse({'resolved': True, **resolved_target._asdict()})
+
+
+class TargetSwiftContextView(LoginRequiredMixin, View):
+    """Return the parts of the observation form's page that take a while to make, rendered, as JSON.
+
+    These are the TOOs recently requested for the Target, Swift's timeline of it, and (with
+    ?visibility=1, if they weren't cached when the page was rendered) its visibility windows:
+    {element id: HTML}. The observation form (tom_swift/observation_form.html) fetches this
+    after the page has been rendered, so that the form doesn't have to wait for them.
+    """
+    def get(self, request, *args, **kwargs):
+        targets = targets_for_user(request.user, Target.objects.all(), 'view_target')
+        target = get_object_or_404(targets, pk=kwargs['pk'])
+
+        sections = {
+            'swift_recent_too_requests': render_to_string(
+                'tom_swift/partials/recent_too_requests.html',
+                {'target': target, 'recent_too_requests': recent_too_requests(target)}, request),
+            'swift_timeline': render_to_string('tom_swift/partials/swift_timeline.html',
+                                               timeline_context(target), request),
+        }
+        if request.GET.get('visibility'):
+            sections['swift_visibility'] = render_to_string('tom_swift/partials/visibility_windows.html',
+                                                            visibility_context(target), request)
+        return JsonResponse(sections)
+
+
+class MetricsView(View):
+    """Return the Swift TOO API metrics of this process (see tom_swift.metrics) for Prometheus to scrape.
+
+    If the METRICS_TOKEN setting is set, requests must send it as a bearer token
+    (Authorization: Bearer <token>), or get a 401; otherwise, only logged-in staff may see the
+    metrics. (A 401, unlike a 403, isn't turned into a redirect to the login page by the TOM's
+    Raise403Middleware, which would be no use to Prometheus.)
+    """
+    def get(self, request, *args, **kwargs):
+        token = get_swift_setting('METRICS_TOKEN')
+        if token:
+            authorization = request.headers.get('Authorization', '')
+            if not hmac.compare_digest(authorization.encode(), f'Bearer {token}'.encode()):
+                response = HttpResponse('Unauthorized', status=401, content_type='text/plain')
+                response['WWW-Authenticate'] = 'Bearer'
+                return response
+        elif not request.user.is_staff:
+            return HttpResponseForbidden()
+
+        return HttpResponse(get_metrics_registry().render_prometheus(),
+                            content_type='text/plain; version=0.0.4; charset=utf-8')
@@ -0,0 +1,314 @@
+"""When Swift can observe a (sidereal) target: its Sun, Moon, and Earth-limb constraints.
+
+The TOM Toolkit's visibility tools compute airmass from the latitude and longitude of
+ground-based sites (see SwiftFacility.get_observing_sites()), which means nothing for
+Swift. Instead, the windows in which a target satisfies Swift's Sun and Moon avoidance
+constraints are computed here, over a time grid, with vectorized low-precision
+ephemerides of the Sun and Moon (good to about 0.01 and 0.3 degrees; see the
+Astronomical Almanac, sections C and D). That is ample for constraints of tens of
+degrees, as is ignoring the Moon's parallax from Swift's orbit (up to a degree).
+
+Within those windows, the Earth blocks the target for part of each ~95 minute orbit.
+Without the orbital elements of the day, that part is given as the fraction of each
+orbit that the target is clear of the Earth limb, averaged over the precession of
+Swift's orbit (see earth_limb_fraction()).
+
+The windows of each (target, day) are cached, so showing the next few weeks of visibility
+on every form and target page costs very little. Whole target lists (from a survey, say)
+are done in bulk instead, by get_bulk_visibility_windows(): one vectorized pass over a
+(targets x times) array per chunk of targets, with the chunks shared among a pool of
+processes when there are many. Like tom_swift.cache, this module does not need Django.
+"""
+from concurrent.futures import ProcessPoolExecutor
+from datetime import date, datetime, time, timedelta, timezone
+import logging
+import os
+from typing import NamedTuple
+
+import numpy as np
+
+from tom_swift.cache import TTLCache
+
+logger = logging.getLogger(__name__)
+
+# Swift pointing constraints (degrees)
+SUN_AVOIDANCE = 46.0
+MOON_AVOIDANCE = 23.0
+EARTH_LIMB_AVOIDANCE = 28.0
+
+# Swift's (near-circular) orbit
+SWIFT_ALTITUDE = 500.0  # km
+SWIFT_INCLINATION = 20.6  # degrees
+EARTH_RADIUS = 6378.137  # km
+
+VISIBILITY_STEP = timedelta(minutes=10)  # resolution of the window start and end times
+VISIBILITY_DAYS = 14  # how far ahead the observation form and target page look
+
+BULK_VISIBILITY_DAYS = 7  # how far ahead get_bulk_visibility_windows() looks by default
+BULK_CHUNK_SIZE = 2000  # targets per (targets x times) array, and per process
+
+VISIBILITY_CACHE_SIZE = 4096  # (target, day)s
+VISIBILITY_CACHE_TTL = 7 * 24 * 60 * 60  # the windows of a (target, day) never change; this just ages them out
+
+_J2000 = 2451545.0  # Julian date of J2000.0
+_UNIX_EPOCH_JD = 2440587.5  # Julian date of 1970-01-01T00:00:00
+
+
+class VisibilityWindow(NamedTuple):
+    """A period in which a target satisfies Swift's Sun and Moon constraints."""
+    start: datetime
+    end: datetime
+    # the fraction of each orbit in which the target is clear of the Earth limb (see earth_limb_fraction())
+    orbit_fraction: float
+
+    @property
+    def duration(self) -> timedelta:
+        return self.end - self.start
+
+
+def julian_date(times) -> np.ndarray:
+    """Return the Julian dates of a sequence of timezone-aware datetimes."""
+    return _UNIX_EPOCH_JD + np.array([t.timestamp() for t in times]) / 86400.0
+
+
+def unit_vector(ra, dec) -> np.ndarray:
+    """Return the unit vectors (with x, y, z as the last axis) of equatorial coordinates in degrees."""
+    ra, dec = np.radians(ra), np.radians(dec)
+    return np.stack([np.cos(dec) * np.cos(ra), np.cos(dec) * np.sin(ra), np.sin(dec)], axis=-1)
+
+
+def _ecliptic_to_equatorial(jd, longitude, latitude) -> np.ndarray:
+    """Return the J2000 equatorial unit vectors of ecliptic coordinates (degrees) of the equinox of date.
+
+    Target coordinates are J2000, so the longitudes are first precessed back to J2000 (without
+    which the Sun and Moon would be about 0.35 degrees from their astropy GCRS positions in 2025).
+    """
+    longitude = np.radians(longitude - 1.396971 * (np.asarray(jd) - _J2000) / 36525.0)
+    latitude = np.radians(latitude)
+    obliquity = np.radians(23.4392911)  # of J2000
+    x = np.cos(latitude) * np.cos(longitude)
+    y = np.cos(latitude) * np.sin(longitude)
+    z = np.sin(latitude)
+    return np.stack([x,
+                     np.cos(obliquity) * y - np.sin(obliquity) * z,
+                     np.sin(obliquity) * y + np.cos(obliquity) * z], axis=-1)
+
+
+def sun_vector(jd) -> np.ndarray:
+    """Return the (geocentric, equatorial) unit vectors to the Sun at the Julian dates jd."""
+    n = np.asarray(jd) - _J2000
+    mean_longitude = 280.460 + 0.9856474 * n
+    mean_anomaly = np.radians(357.528 + 0.9856003 * n)
+    longitude = mean_longitude + 1.915 * np.sin(mean_anomaly) + 0.020 * np.sin(2 * mean_anomaly)
+    return _ecliptic_to_equatorial(jd, longitude, np.zeros_like(longitude))
+
+
+def moon_vector(jd) -> np.ndarray:
+    """Return the (geocentric, equatorial) unit vectors to the Moon at the Julian dates jd."""
+    t = (np.asarray(jd) - _J2000) / 36525.0  # Julian centuries
+
+    def sin(degrees):
+        return np.sin(np.radians(degrees))
+
+    longitude = (218.32 + 481267.881 * t
+                 + 6.29 * sin(135.0 + 477198.87 * t) - 1.27 * sin(259.3 - 413335.36 * t)
+                 + 0.66 * sin(235.7 + 890534.22 * t) + 0.21 * sin(269.9 + 954397.74 * t)
+                 - 0.19 * sin(357.5 + 35999.05 * t) - 0.11 * sin(186.5 + 966404.03 * t))
+    latitude = (5.13 * sin(93.3 + 483202.02 * t) + 0.28 * sin(228.2 + 960400.89 * t)
+                - 0.28 * sin(318.3 + 6003.15 * t) - 0.17 * sin(217.6 - 407332.21 * t))
+    return _ecliptic_to_equatorial(jd, longitude, latitude)
+
+
+def separation(vectors, vector) -> np.ndarray:
+    """Return the angles (degrees) between each of the unit vectors and the unit vector.
+
+    vector may also be an array of unit vectors (one per target, say), in which case the angles
+    are an array of (vectors, targets).
+    """
+    return np.degrees(np.arccos(np.clip(vectors @ np.asarray(vector).T, -1.0, 1.0)))
+
+
+def sun_moon_observable(ra, dec, jd) -> np.ndarray:
+    """Return whether the target at (ra, dec) satisfies the Sun and Moon constraints at each of the Julian dates.
+
+    ra and dec may also be arrays of targets, in which case the result is an array of (targets, times).
+    """
+    targets = unit_vector(ra, dec)
+    return ((separation(sun_vector(jd), targets) > SUN_AVOIDANCE)
+            & (separation(moon_vector(jd), targets) > MOON_AVOIDANCE)).T
+
+
+def earth_limb_fraction(ra, dec, nodes=72):
+    """Return the fraction of each Swift orbit in which the target at (ra, dec) is clear of the Earth limb,
+    averaged over the precessing orbit's longitude of the ascending node (an array of them, if ra and dec
+    are arrays of targets).
+
+    For a circular orbit whose plane the target is beta above, the angle between the target and the
+    center of the Earth is at least theta (the Earth's angular radius plus the Earth-limb constraint)
+    for a fraction arccos(-cos(theta) / cos(beta)) / pi of the orbit. theta is more than 90 degrees,
+    so Swift has no continuous viewing zone: targets near the poles of its orbit are always too
+    close to the Earth limb.
+    """
+    inclination = np.radians(SWIFT_INCLINATION)
+    node = np.linspace(0, 2 * np.pi, nodes, endpoint=False)
+    orbit_poles = np.stack([np.sin(inclination) * np.sin(node),
+                            -np.sin(inclination) * np.cos(node),
+                            np.full_like(node, np.cos(inclination))], axis=-1)
+    cos_beta = np.sqrt(1 - np.clip(unit_vector(ra, dec) @ orbit_poles.T, -1.0, 1.0) ** 2)
+
+    earth_radius = np.arcsin(EARTH_RADIUS / (EARTH_RADIUS + SWIFT_ALTITUDE))
+    theta = earth_radius + np.radians(EARTH_LIMB_AVOIDANCE)
+    with np.errstate(divide='ignore'):  # cos_beta is 0 at the poles of the orbit
+        fraction = np.arccos(np.clip(-np.cos(theta) / cos_beta, -1.0, 1.0)) / np.pi
+    fraction = fraction.mean(axis=-1)
+    return float(fraction) if fraction.ndim == 0 else fraction
+
+
+def _windows(times, observable, step):
+    """Return the (start, end) of each run of observable times (end is the time after the run's last one)."""
+    edges = np.diff(np.concatenate([[False], observable, [False]]).astype(np.int8))
+    starts, ends = np.flatnonzero(edges == 1), np.flatnonzero(edges == -1)
+    return [(times[start], times[end - 1] + step) for start, end in zip(starts, ends)]
+
+
+def _bulk_windows(times, observable, step):
+    """Return the (start, end) windows of each row (target) of the (targets, times) observable array."""
+    edges = np.diff(np.pad(observable, ((0, 0), (1, 1))).astype(np.int8), axis=1)
+    windows = [[] for _ in range(len(observable))]
+    starts, ends = np.nonzero(edges == 1), np.nonzero(edges == -1)
+    # np.nonzero goes row by row, and each row's windows start and end alternately
+    for row, start, end in zip(starts[0], starts[1], ends[1]):
+        windows[row].append((times[start], times[end - 1] + step))
+    return windows
+
+
+def _bulk_visibility_chunk(ras, decs, times, step) -> list[list[VisibilityWindow]]:
+    """Return the VisibilityWindows of each of a chunk of targets (one (targets x times) pass) at the times."""
+    observable = sun_moon_observable(np.asarray(ras), np.asarray(decs), julian_date(times))
+    orbit_fractions = earth_limb_fraction(np.asarray(ras), np.asarray(decs))
+    return [[VisibilityWindow(start, end, float(orbit_fraction)) for start, end in windows]
+            for windows, orbit_fraction in zip(_bulk_windows(times, observable, step), orbit_fractions)]
+
+
+def get_bulk_visibility_windows(coordinates, start: datetime = None, days=BULK_VISIBILITY_DAYS, step=VISIBILITY_STEP,
+                                chunk_size=BULK_CHUNK_SIZE, processes=None) -> list[list[VisibilityWindow]]:
+    """Return the VisibilityWindows of each of the (ra, dec) coordinates, in the days from start (default: now).
+
+    The targets are done chunk_size at a time, each chunk in one vectorized pass over a (targets x times)
+    array. If there is more than one chunk, they are shared among a pool of (at most) processes processes
+    (default: one per CPU); processes=1 does them all in this process. Unlike get_visibility_windows(),
+    nothing is cached: target lists are rarely asked about twice.
+    """
+    coordinates = [(float(ra), float(dec)) for ra, dec in coordinates]
+    if start is None:
+        start = datetime.now(timezone.utc)
+        start -= timedelta(seconds=start.timestamp() % step.total_seconds())
+    times = [start + n * step for n in range(int(timedelta(days=days) / step))]
+    chunks = [coordinates[index:index + chunk_size] for index in range(0, len(coordinates), chunk_size)]
+    if not chunks:
+        return []
+
+    processes = min(processes or os.cpu_count() or 1, len(chunks))
+    chunk_args = [([ra for ra, _ in chunk], [dec for _, dec in chunk], times, step) for chunk in chunks]
+    if processes == 1:
+        chunk_windows = [_bulk_visibility_chunk(*args) for args in chunk_args]
+    else:
+        with ProcessPoolExecutor(max_workers=processes) as executor:
+            chunk_windows = list(executor.map(_bulk_visibility_chunk, *zip(*chunk_args)))
+    logger.debug(f'get_bulk_visibility_windows: {len(coordinates)} targets x {len(times)} times '
+                 f'in {len(chunks)} chunks ({processes} processes)')
+    return [windows for chunk in chunk_windows for windows in chunk]
+
+
+_visibility_cache = None
+
+
+def get_visibility_cache() -> TTLCache:
+    """Return the in-process cache of the Sun and Moon windows of each (target, day)."""
+    global _visibility_cache
+    if _visibility_cache is None:
+        _visibility_cache = TTLCache(maxsize=VISIBILITY_CACHE_SIZE, ttl=VISIBILITY_CACHE_TTL)
+    return _visibility_cache
+
+
+def get_visibility_windows(ra, dec, start: date = None, days=VISIBILITY_DAYS,
+                           step=VISIBILITY_STEP, cached_only=False) -> list[VisibilityWindow]:
+    """Return the VisibilityWindows of the target at (ra, dec) in the days (UTC) from the start date
+    (by default, from now).
+
+    The windows of each day are cached; those of the days that aren't are computed together,
+    in one vectorized pass over a time grid with the given step. Windows that run from one day
+    into the next are joined. With cached_only, nothing is computed: if any of the days isn't
+    cached, None is returned.
+    """
+    now = None
+    if start is None:
+        now = datetime.now(timezone.utc)
+        now -= timedelta(seconds=now.timestamp() % step.total_seconds())  # the start of its step
+        start = now.date()
+    days = [start + timedelta(days=n) for n in range(days)]
+    cache = get_visibility_cache()
+    target_key = (round(float(ra), 4), round(float(dec), 4), step)
+
+    day_windows = {day: cache.get(target_key + (day,)) for day in days}
+    uncached_days = [day for day, windows in day_windows.items() if windows is None]
+    if uncached_days and cached_only:
+        return None
+    if uncached_days:
+        steps_per_day = int(timedelta(days=1) / step)
+        times = [datetime.combine(day, time(), tzinfo=timezone.utc) + n * step
+                 for day in uncached_days for n in range(steps_per_day)]
+        observable = sun_moon_observable(ra, dec, julian_date(times)).reshape(len(uncached_days), steps_per_day)
+        for index, day in enumerate(uncached_days):
+            day_times = times[index * steps_per_day:(index + 1) * steps_per_day]
+            day_windows[day] = _windows(day_times, observable[index], step)
+            cache.set(target_key + (day,), day_windows[day])
+        logger.debug(f'get_visibility_windows: computed {len(uncached_days)} days for ({ra}, {dec})')
+
+    orbit_fraction = earth_limb_fraction(ra, dec)
+    windows = []
+    for day in days:
+        for window_start, window_end in day_windows[day]:
+            if now is not None:
+                if window_end <= now:
+                    continue
+                window_start = max(window_start, now)
+            if windows and windows[-1].end == window_start:
+                windows[-1] = windows[-1]._replace(end=window_end)
+            else:
+                windows.append(VisibilityWindow(window_start, window_end, orbit_fraction))
+    return windows
+
+
+def is_sidereal(target) -> bool:
+    """Return whether the (TOM) target has the fixed coordinates that visibility windows need."""
+    return target.type == 'SIDEREAL' and target.ra is not None and target.dec is not None
+
+
+def get_targets_visibility_windows(targets, **kwargs) -> dict:
+    """Return {target: VisibilityWindows} for the sidereal ones of the (TOM) targets.
+
+    kwargs are passed on to get_bulk_visibility_windows().
+    """
+    targets = [target for target in targets if is_sidereal(target)]
+    windows = get_bulk_visibility_windows([(target.ra, target.dec) for target in targets], **kwargs)
+    return dict(zip(targets, windows))
+
+
+def visibility_context(target, cached_only=False) -> dict:
+    """Return the context of the tom_swift/partials/visibility_windows.html partial for the (TOM) target.
+
+    Only sidereal targets have visibility windows. With cached_only, they are only looked up in the
+    cache (see get_visibility_windows()); if they aren't all there, visibility_pending is True.
+    """
+    visibility_windows = None
+    if is_sidereal(target):
+        visibility_windows = get_visibility_windows(target.ra, target.dec, cached_only=cached_only)
+    return {
+        'visibility_windows': visibility_windows,
+        'visibility_pending': is_sidereal(target) and visibility_windows is None,
+        'visibility_days': VISIBILITY_DAYS,
+        'sun_avoidance': SUN_AVOIDANCE,
+        'moon_avoidance': MOON_AVOIDANCE,
+        'earth_limb_avoidance': EARTH_LIMB_AVOIDANCE,
+    }